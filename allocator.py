@@ -0,0 +1,67 @@
+from queries import reserve_ids
+
+"""
+Hands out new tweet and user ids from blocks reserved in the id_blocks table
+so that composing a tweet or signing up does not scan the whole table
+"""
+
+# Number of ids reserved per round trip
+BLOCK_SIZE = 10
+
+class IdAllocator:
+
+    def __init__(self, conn, table, block_size=BLOCK_SIZE, connect=None):
+        """Allocates unique ids for one table
+
+        :param conn: session connection (not cursor object)
+        :param table: table name ('tweets' or 'users')
+        :param block_size (optional): number of ids to reserve at once
+        :param connect (optional): function returning a new connection (or
+            None). Blocks are reserved and committed on a connection of the
+            allocator's own, so that the session's pending work is not
+            committed with them. Without one, blocks are reserved and 
+            committed at once on the session connection, which must not have
+            pending writes
+        """
+        self.conn = conn
+        self.table = table
+        self.block_size = block_size
+        self.connect = connect
+        self.own_conn = None
+        self.next = None
+        self.last = None
+
+    def reserve(self):
+        """Reserves a new block of ids and commits it, so that the id_blocks 
+        row stays locked for a single statement
+        Returns the first and last reserved id
+        """
+        if self.own_conn is None and self.connect is not None:
+            self.own_conn = self.connect()
+            self.connect = None
+
+        conn = self.own_conn
+        if conn is None:
+            # Committing the block must not commit the session's own writes
+            if getattr(self.conn, 'in_transaction', False):
+                raise RuntimeError("Cannot reserve %s ids during a pending write" % (self.table))
+            conn = self.conn
+
+        ids = reserve_ids(conn, self.table, self.block_size)
+        conn.commit()
+        return ids
+
+    def next_id(self):
+        """Returns a new unique id, reserving a new block when needed"""
+        if self.next is None or self.next > self.last:
+            self.next, self.last = self.reserve()
+
+        new_id = self.next
+        self.next += 1
+        return new_id
+
+    def close(self):
+        """Closes the allocator's own connection"""
+        if self.own_conn is not None:
+            self.own_conn.close()
+            self.own_conn = None
@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+
+"""
+Single-pass tweet text analysis. A tweet's text is tokenized once into its
+hashtags, its normalized words and its text without hashtags; line breaks
+for a display width are worked out on first use. Analyses are cached by
+text, so the screens, the search filter and the search index share them.
+"""
+
+# Number of analyzed texts kept in memory
+CACHE_SIZE = 4096
+
+# A hashtag is # followed by letters and digits; a word is letters and digits
+TOKEN = re.compile(r'#([^\W_]*)|([^\W_]+)')
+
+class TextAnalysis:
+
+    def __init__(self, text):
+        """Tokenizes a text in one pass
+
+        :param text: tweet text or search keyword
+        """
+        self.text = text
+        self.hashtags = []
+        self.words = []
+        nohash = []
+        end = 0
+
+        # Lowering can change the length of the text, so match offsets
+        # only apply to the lowered text
+        lowered = text.lower()
+        for match in TOKEN.finditer(lowered):
+            term, word = match.group(1), match.group(2)
+            if word is not None:
+                if word not in self.words:
+                    self.words.append(word)
+            elif len(term) > 0:
+                if term not in self.hashtags:
+                    self.hashtags.append(term)
+                nohash.append(lowered[end:match.start()])
+                end = match.end()
+
+        nohash.append(lowered[end:])
+        self.nohash = ''.join(nohash)
+        self.breaks = {}
+
+    def break_point(self, width):
+        """Returns the index of the space where the text is split into two
+        lines of about width characters, or -1 if it fits on one line
+
+        :param width: row width of text
+        """
+        if width not in self.breaks:
+            text = self.text + " "
+            index = -1
+            if len(text) > width:
+                index = text.find(' ', width - 5)
+            if index >= width:
+                index = text.rfind(' ', 0, width + 1)
+            self.breaks[width] = index
+        return self.breaks[width]
+
+    def split(self, width=65):
+        """Splits the text into 2 separate lines if too long
+        Returns the two lines (the second one may be empty)
+
+        :param width (optional): row width of text
+        """
+        text = self.text + " "
+        index = self.break_point(width)
+        if index > 0:
+            return (text[:index], text[index + 1:])
+        return (text, "")
+
+@lru_cache(maxsize=CACHE_SIZE)
+def analyze(text):
+    """Returns the (shared) TextAnalysis of a text"""
+    return TextAnalysis(text)
+
+def split_text(text, max_width=65):
+    """Splits up text into 2 separate lines if too long
+
+    :param text: text string
+    :param max_width: row width of text
+    """
+    return analyze(text).split(max_width)
+
+def substring_distance(pattern, text):
+    """Returns the smallest edit distance between a pattern and any substring
+    of a text (the number of typos in the best match)
+
+    :param pattern: keyword
+    :param text: string searched
+    """
+    # Sellers' algorithm: row[j] is the distance of the best match ending at j
+    row = [0] * (len(text) + 1)
+    for i, ch in enumerate(pattern, 1):
+        prev, row[0] = row[0], i
+        for j, other in enumerate(text, 1):
+            cost = 0 if ch == other else 1
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + cost)
+    return min(row)
+
+def text_words(text):
+    """Returns the distinct lowercase words of a text, skipping hashtags
+
+    :param text: tweet text or search keyword
+    """
+    return list(analyze(text).words)
+
+def word_patterns(keyword):
+    """Returns like patterns that the indexed words of a text must match for
+    the keyword to be a substring of the text without its hashtags. The words
+    inside the keyword must be whole words of the text, its first word may
+    end one and its last word may start one
+
+    :param keyword: lowercase search keyword (not a hashtag)
+    """
+    words = [match for match in TOKEN.finditer(keyword) if match.group(2) is not None]
+    patterns = []
+    for match in words:
+        pattern = match.group(2)
+        if match.start() == 0:
+            pattern = '%' + pattern
+        if match.end() == len(keyword):
+            pattern = pattern + '%'
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import sqlite3
+from datetime import datetime
+
+try:
+    import cx_Oracle
+except ImportError:
+    cx_Oracle = None
+
+"""
+Storage backends: the course Oracle database through cx_Oracle, or an
+embedded SQLite file loaded from table.sql and data.sql. Both run the same
+SQL; the SQLite connection provides nvl, dual and the user_tables,
+user_views and user_indexes dictionary views that the queries rely on.
+
+Usage:
+python backends.py load PATH   creates a SQLite database from table.sql and data.sql
+"""
+
+ORACLE_DSN = "gwynne.cs.ualberta.ca:1521/CRS"
+
+# Number of parsed statements kept per connection
+STATEMENT_CACHE = 100
+
+# Errors raised by the database drivers
+if cx_Oracle is None:
+    DATABASE_ERRORS = (sqlite3.DatabaseError,)
+else:
+    DATABASE_ERRORS = (sqlite3.DatabaseError, cx_Oracle.DatabaseError)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = [os.path.join(SCRIPT_DIR, 'table.sql'), os.path.join(SCRIPT_DIR, 'data.sql')]
+
+SQLITE_VIEWS = [
+    "create temp view if not exists dual as select 'X' as dummy",
+    "create temp view if not exists user_tables as "
+        "select upper(name) as table_name from sqlite_master where type = 'table'",
+    "create temp view if not exists user_views as "
+        "select upper(name) as view_name from sqlite_master where type = 'view'",
+    "create temp view if not exists user_indexes as "
+        "select upper(name) as index_name from sqlite_master where type = 'index'"
+]
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def sqlite_date(value):
+    """Store dates as sortable 'YYYY-MM-DD HH:MM:SS' strings"""
+    return value.strftime(DATE_FORMAT)
+
+def parse_date(value):
+    """Read a date column back into a datetime.datetime object"""
+    value = value.decode()
+    for fmt in (DATE_FORMAT, '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Unknown date format: %s" % (value))
+
+def oracle_date(match):
+    """Convert a 'DD-MON-YYYY' literal from data.sql to the SQLite format"""
+    return "'%s'" % (sqlite_date(datetime.strptime(match.group(1), '%d-%b-%Y')))
+
+def nvl(value, default):
+    """Oracle nvl for SQLite"""
+    return default if value is None else value
+
+sqlite3.register_adapter(datetime, sqlite_date)
+sqlite3.register_converter('date', parse_date)
+
+
+class OracleBackend:
+
+    name = 'oracle'
+
+    def connect(self, username, password):
+        """Connects to the course Oracle database
+
+        :param username: Oracle username
+        :param password: Oracle password
+        """
+        conn = cx_Oracle.connect(username, password, ORACLE_DSN)
+        conn.stmtcachesize = STATEMENT_CACHE
+        return conn
+
+
+class SQLiteBackend:
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        """Embedded single-user database stored in a file
+
+        :param path: database file (':memory:' for a throwaway database)
+        """
+        self.path = path
+
+    def connect(self):
+        """Opens the database file, creating it if it does not exist"""
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE)
+        conn.create_function('nvl', 2, nvl)
+        conn.execute('pragma foreign_keys = on')
+        for view in SQLITE_VIEWS:
+            conn.execute(view)
+        return conn
+
+    def translate(self, statement):
+        """Rewrites an Oracle statement from table.sql or data.sql for SQLite
+        char(n) columns get the rtrim collation so they compare blank-padded
+
+        :param statement: a single SQL statement
+        """
+        statement = re.sub(r'^drop table ', 'drop table if exists ', statement)
+        statement = re.sub(r'char\((\d+)\)', r'char(\1) collate rtrim', statement)
+        return re.sub(r"'(\d{1,2}-[A-Z]{3}-\d{4})'", oracle_date, statement)
+
+    def run_script(self, conn, path):
+        """Runs every statement of a SQL script, skipping rows that violate
+        constraints like sqlplus does
+        Returns the number of failed statements
+
+        :param conn: connection (not cursor object)
+        :param path: script file
+        """
+        lines = [line for line in open(path) if not line.startswith('--')]
+        failed = 0
+
+        for statement in re.split(r';\s*$', ''.join(lines), flags=re.M):
+            statement = statement.strip()
+            if len(statement) == 0:
+                continue
+            try:
+                conn.execute(self.translate(statement))
+            except sqlite3.IntegrityError:
+                failed += 1
+        conn.commit()
+        return failed
+
+    def load(self, conn, scripts=SCRIPTS):
+        """Creates the schema and loads the sample data
+
+        :param conn: connection (not cursor object)
+        :param scripts (optional): list of script files
+        """
+        for path in scripts:
+            failed = self.run_script(conn, path)
+            if failed > 0:
+                print("%s: %d statement(s) failed." % (os.path.basename(path), failed))
+
+
+def get_oracle_connection(username=None, password=None):
+    """Returns an Oracle connection or None if the login was denied"""
+    try:
+        return OracleBackend().connect(username, password)
+    except cx_Oracle.DatabaseError as exc:
+        print("Invalid Oracle username/password; login denied.")
+
+def split_args(args):
+    """Removes the --sqlite PATH option from a list of command line arguments
+    Returns the remaining arguments and the path (None if not given)
+
+    :param args: command line arguments without the program name
+    """
+    if '--sqlite' not in args:
+        return args, None
+
+    i = args.index('--sqlite')
+    if i + 1 >= len(args):
+        print("--sqlite needs a database file.")
+        sys.exit(1)
+    return args[:i] + args[i + 2:], args[i + 1]
+
+def connection_factory(sqlite_path=None):
+    """Returns a function that opens a new connection to the database each
+    time it is called (returning None if the connection failed), so that
+    background work can use a connection of its own. A new SQLite file is
+    loaded with table.sql and data.sql on the first call; the Oracle login is
+    asked for once
+
+    :param sqlite_path (optional): SQLite database file
+    """
+    if sqlite_path is not None:
+        backend = SQLiteBackend(sqlite_path)
+        opened = [0]
+
+        def connect():
+            # Every connection to ':memory:' is a different database
+            if sqlite_path == ':memory:' and opened[0] > 0:
+                return None
+            new = sqlite_path == ':memory:' or not os.path.exists(sqlite_path)
+            conn = backend.connect()
+            if new:
+                backend.load(conn)
+            opened[0] += 1
+            return conn
+        return connect
+
+    if cx_Oracle is None:
+        print("cx_Oracle is not installed; use --sqlite PATH for a local database.")
+        return lambda: None
+
+    oracle_user = input("Enter Oracle username: ")
+    oracle_pass = input("Enter Oracle password: ")
+    return lambda: get_oracle_connection(username=oracle_user, password=oracle_pass)
+
+def open_database(sqlite_path=None):
+    """Connects to the embedded SQLite database if a path is given (loading
+    table.sql and data.sql into a new file), otherwise prompts for an Oracle login
+    Returns None if the connection failed
+
+    :param sqlite_path (optional): SQLite database file
+    """
+    return connection_factory(sqlite_path)()
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] != 'load':
+        print("Usage: python backends.py load PATH")
+        sys.exit(1)
+
+    backend = SQLiteBackend(sys.argv[2])
+    conn = backend.connect()
+    backend.load(conn)
+    conn.close()
+    print("Loaded %s." % (sys.argv[2]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import io
+import sys
+import json
+import time
+import random
+import builtins
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+
+from queries import *
+from main import Twitter
+from mlist import ListManager
+from tweet import TweetSearch, Tweet, compose_tweet, search_tweets, hydrate_tweets
+from user import search_users, list_followers
+from f_lists import get_users_l, get_lhas_user, create_l, add_lmember, delete_lmember
+from backends import split_args, open_database
+from tracing import TracingConnection
+
+"""
+Macro-benchmark for the client screens. Every scenario logs in as a random
+user and drives the same functions as the menus, with scripted answers for
+the prompts and the screen output discarded. Reports latency percentiles,
+queries per run and peak Python memory, and compares against a saved baseline.
+
+The compose and lists scenarios write to the database, so run it on a
+database made by gen_data.py rather than a real one.
+
+Usage:
+python benchmark.py [--runs N] [--seed N] [--only NAME,...] [--save FILE] [--compare FILE] [--sqlite PATH]
+"""
+
+RUNS = 50
+PERCENTILES = [50, 90, 99]
+
+
+@contextmanager
+def scripted_input(answers):
+    """Answers input() prompts from a list instead of the keyboard
+
+    :param answers: list of strings, one per prompt
+    """
+    answers = list(answers)
+
+    def answer(prompt=''):
+        if len(answers) == 0:
+            raise RuntimeError("No scripted answer for prompt %r" % (prompt))
+        return answers.pop(0)
+
+    original = builtins.input
+    builtins.input = answer
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+class Workload:
+
+    def __init__(self, conn, seed=0):
+        """Picks the users, keywords and tweets used by the scenarios
+
+        :param conn: TracingConnection
+        :param seed (optional): random seed
+        """
+        self.rng = random.Random(seed)
+        self.twitter = Twitter(conn)
+        curs = self.twitter.get_curs()
+
+        curs.execute("select distinct flwer from follows")
+        self.users = [row[0] for row in curs.fetchall()]
+        curs.execute("select distinct flwee from follows")
+        self.followed = [row[0] for row in curs.fetchall()]
+        curs.execute("select term from mentions group by term order by count(*) desc")
+        self.terms = [row[0].rstrip() for row in curs.fetchall()[:50]]
+        curs.execute("select name, city from users")
+        rows = curs.fetchall()
+        self.names = list(set(row[0].split()[0] for row in rows))
+        self.cities = list(set(row[1].rstrip() for row in rows))
+        curs.execute("select max(tid) from tweets")
+        self.max_tid = curs.fetchone()[0]
+        self.list_id = 0
+
+    def login(self, user):
+        """Sets up the session as if the user had logged in"""
+        session = self.twitter
+        session.username = user
+        session.name = get_name(session.get_curs(), user).rstrip()
+        session.lists = ListManager(session)
+        session.tweets = TweetSearch(session)
+        session.current = session.tweets
+        return session
+
+    def random_tweet(self, session):
+        """Returns a random existing tweet as a Tweet object"""
+        curs = session.get_curs()
+        while True:
+            curs.execute("select * from tweets where tid = :1",
+                [self.rng.randint(1, self.max_tid)])
+            row = curs.fetchone()
+            if row is not None:
+                return hydrate_tweets(session, [row])[0]
+
+    def new_list(self):
+        """Returns an unused list name"""
+        self.list_id += 1
+        return 'bench%d' % (self.list_id)
+
+    # Each scenario prepares its inputs and returns a function for one run
+
+    def home_timeline(self):
+        session = self.login(self.rng.choice(self.users))
+
+        def run():
+            home = session.tweets
+            home.get_user_tweets()
+            home.display_results()
+            if home.more_results_exist():
+                home.more_results()
+                home.display_results()
+        return run, []
+
+    def tweet_search(self):
+        session = self.login(self.rng.choice(self.users))
+        keyword = self.rng.choice(self.terms)
+        if self.rng.random() < 0.5:
+            keyword = '#' + keyword
+
+        def run():
+            search_tweets(session).display_results()
+        return run, [keyword]
+
+    def user_search(self):
+        session = self.login(self.rng.choice(self.users))
+        keyword = self.rng.choice(self.names + self.cities)
+
+        def run():
+            search_users(session).display_results()
+        return run, [keyword]
+
+    def followers(self):
+        session = self.login(self.rng.choice(self.followed))
+
+        def run():
+            list_followers(session).display_results()
+        return run, []
+
+    def tweet_stats(self):
+        session = self.login(self.rng.choice(self.users))
+        tweet = self.random_tweet(session)
+
+        def run():
+            tweet.display_stats()
+        return run, ['3']
+
+    def compose(self):
+        session = self.login(self.rng.choice(self.users))
+        text = "Benchmark tweet #%s #%s" % (self.rng.choice(self.terms), self.rng.choice(self.terms))
+
+        def run():
+            compose_tweet(session)
+        return run, [text, 'y', '']
+
+    def lists(self):
+        session = self.login(self.rng.choice(self.users))
+        manager = session.lists
+        user = session.get_username()
+        curs = session.get_curs()
+        conn = session.get_conn()
+        lname = self.new_list()
+        member = self.rng.choice(self.users)
+
+        def run():
+            create_l(session, user, curs, conn, manager.quit_to_menu)
+            add_lmember(session, user, curs, conn, manager.quit_to_menu)
+            delete_lmember(session, user, curs, conn, manager.quit_to_menu)
+            get_users_l(user, curs, conn)
+            get_lhas_user(session, user, curs)
+        return run, [lname, 'y', '', lname, str(member), 'y', '',
+            lname, str(member), 'y', '', '']
+
+SCENARIOS = ['home_timeline', 'tweet_search', 'user_search', 'followers',
+    'tweet_stats', 'compose', 'lists']
+
+def percentile(values, pct):
+    """Returns the nearest-rank percentile of a list of numbers"""
+    values = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(values))) - 1, 0)
+    return values[rank]
+
+def run_scenario(workload, conn, name, runs):
+    """Runs a scenario with fresh inputs each time
+    Returns a dictionary of results
+
+    :param workload: Workload object
+    :param conn: TracingConnection
+    :param name: scenario name
+    :param runs: number of timed runs
+    """
+    times = []
+    queries = []
+    for i in range(runs + 1):
+        run, answers = getattr(workload, name)()
+        with scripted_input(answers), redirect_stdout(io.StringIO()):
+            start_queries = conn.tracer.statements
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        # The first run warms up the caches and statement cache
+        if i > 0:
+            times.append(elapsed * 1000)
+            queries.append(conn.tracer.statements - start_queries)
+
+    # Measure memory separately, tracemalloc slows down every allocation
+    run, answers = getattr(workload, name)()
+    tracemalloc.start()
+    with scripted_input(answers), redirect_stdout(io.StringIO()):
+        run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {'runs': runs, 'queries': sum(queries) / float(len(queries)),
+        'peak_kb': peak / 1024.0, 'max_ms': max(times)}
+    for pct in PERCENTILES:
+        result['p%d_ms' % (pct)] = percentile(times, pct)
+    return result
+
+def print_results(results, baseline=None):
+    """Prints one line per scenario, with the change from the baseline"""
+    columns = ['p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'queries', 'peak_kb']
+    print("%-14s" % ("scenario") + "".join("%16s" % (col) for col in columns))
+    for name in SCENARIOS:
+        if name not in results:
+            continue
+        line = "%-14s" % (name)
+        for col in columns:
+            value = results[name][col]
+            cell = "%.1f" % (value)
+            if baseline is not None and name in baseline and baseline[name][col] > 0:
+                change = (value - baseline[name][col]) / baseline[name][col] * 100
+                cell += " (%+.0f%%)" % (change)
+            line += "%16s" % (cell)
+        print(line)
+
+def take_option(args, option, default=None):
+    """Removes an option and its value from a list of arguments
+    Returns the remaining arguments and the value
+    """
+    if option not in args:
+        return args, default
+    i = args.index(option)
+    return args[:i] + args[i + 2:], args[i + 1]
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    args, runs = take_option(args, '--runs', RUNS)
+    args, seed = take_option(args, '--seed', 0)
+    args, only = take_option(args, '--only')
+    args, save = take_option(args, '--save')
+    args, compare = take_option(args, '--compare')
+
+    names = SCENARIOS if only is None else only.split(',')
+    if len(args) > 0 or any(name not in SCENARIOS for name in names):
+        print("Usage: python benchmark.py [--runs N] [--seed N] [--only NAME,...] "
+            "[--save FILE] [--compare FILE] [--sqlite PATH]")
+        print("Scenarios: %s" % (', '.join(SCENARIOS)))
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+    if conn is None:
+        sys.exit(1)
+
+    conn = TracingConnection(conn)
+    workload = Workload(conn, int(seed))
+    results = {}
+    for name in names:
+        results[name] = run_scenario(workload, conn, name, int(runs))
+
+    baseline = None
+    if compare is not None:
+        with open(compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if save is not None:
+        with open(save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Saved baseline to %s." % (save))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
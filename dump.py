@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import zlib
+import struct
+from array import array
+from datetime import datetime, timedelta
+
+from backends import SQLiteBackend, SCRIPTS, split_args, open_database
+from migrations import prepare_bulk_load, finish_bulk_load
+
+"""
+Bulk export and import of the tables in table.sql. Each table is written to
+DIR/<table>.col in a columnar format: a header line naming the columns,
+then compressed blocks of BLOCK_ROWS rows in which every column is stored
+contiguously (integers, floats and dates as 64-bit arrays, text as lengths
+followed by the UTF-8 bytes, each with a null bitmap) and an empty block at
+the end. Export and import stream one block at a time.
+
+Import fills an empty schema in foreign key order with executemany batches
+and commits every COMMIT_ROWS rows. The secondary indexes are dropped
+before the load and built once every row is loaded, when the counter tables
+are refilled and the next ids moved past the loaded ones, even if the schema
+was migrated before (the optional indexes are built by their rebuild
+commands).
+
+Usage:
+python dump.py export DIR [--sqlite PATH]
+python dump.py import DIR [--batch N] [--commit N] [--sqlite PATH]
+    a new SQLite file is created from table.sql only
+"""
+
+# Rows per block of a dump file and per export fetch
+BLOCK_ROWS = 10000
+
+# Default rows per executemany batch and per commit on import
+BATCH_ROWS = 10000
+COMMIT_ROWS = 100000
+
+MAGIC = b'TWCOL1\n'
+BLOCK_HEADER = struct.Struct('<II')
+EPOCH = datetime(1970, 1, 1)
+
+# Tables in foreign key order, with their (column, type) lists and keys.
+# Tweets are ordered by id so that replies follow the tweets they reply to
+TABLES = [
+    ('users', [('usr', 'int'), ('pwd', 'str'), ('name', 'str'), ('email', 'str'),
+        ('city', 'str'), ('timezone', 'float')], 'usr'),
+    ('follows', [('flwer', 'int'), ('flwee', 'int'), ('start_date', 'date')], 'flwer, flwee'),
+    ('tweets', [('tid', 'int'), ('writer', 'int'), ('tdate', 'date'), ('text', 'str'),
+        ('replyto', 'int')], 'tid'),
+    ('hashtags', [('term', 'str')], 'term'),
+    ('mentions', [('tid', 'int'), ('term', 'str')], 'tid, term'),
+    ('retweets', [('usr', 'int'), ('tid', 'int'), ('rdate', 'date')], 'usr, tid'),
+    ('lists', [('lname', 'str'), ('owner', 'int')], 'lname'),
+    ('includes', [('lname', 'str'), ('member', 'int')], 'lname, member')
+]
+
+def little_endian(values):
+    """Byte swaps an array in place on big-endian machines"""
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def encode_column(values, kind):
+    """Returns the bytes of one column of a block: a null bitmap followed by
+    the values
+
+    :param values: list of column values
+    :param kind: 'int', 'float', 'date' or 'str'
+    """
+    nulls = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is None:
+            nulls[i // 8] |= 1 << (i % 8)
+
+    if kind == 'str':
+        data = [b'' if value is None else value.rstrip().encode('utf-8') for value in values]
+        lengths = little_endian(array('I', [len(item) for item in data]))
+        return bytes(nulls) + lengths.tobytes() + b''.join(data)
+    if kind == 'float':
+        numbers = array('d', [0.0 if value is None else value for value in values])
+    elif kind == 'date':
+        numbers = array('q', [0 if value is None else int((value - EPOCH).total_seconds())
+            for value in values])
+    else:
+        numbers = array('q', [0 if value is None else value for value in values])
+    return bytes(nulls) + little_endian(numbers).tobytes()
+
+def decode_column(data, offset, count, kind):
+    """Reads one column of a block
+    Returns the list of values and the offset after the column
+
+    :param data: uncompressed block
+    :param offset: position of the column's null bitmap
+    :param count: number of rows in the block
+    :param kind: 'int', 'float', 'date' or 'str'
+    """
+    size = (count + 7) // 8
+    nulls = data[offset:offset + size]
+    offset += size
+
+    if kind == 'str':
+        lengths = array('I')
+        lengths.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        values = []
+        for length in little_endian(lengths):
+            values.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+    else:
+        numbers = array('d' if kind == 'float' else 'q')
+        numbers.frombytes(data[offset:offset + 8 * count])
+        offset += 8 * count
+        values = little_endian(numbers).tolist()
+        if kind == 'date':
+            values = [EPOCH + timedelta(seconds=value) for value in values]
+
+    for i in range(count):
+        if nulls[i // 8] & (1 << (i % 8)):
+            values[i] = None
+    return values, offset
+
+def write_block(f, rows, columns):
+    """Writes a block of rows to a dump file"""
+    data = b''.join(encode_column([row[i] for row in rows], kind)
+        for i, (name, kind) in enumerate(columns))
+    data = zlib.compress(data)
+    f.write(BLOCK_HEADER.pack(len(rows), len(data)))
+    f.write(data)
+
+def read_blocks(f, columns):
+    """Yields the rows of every block of a dump file as lists of tuples"""
+    while True:
+        count, size = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        if count == 0:
+            return
+        data = zlib.decompress(f.read(size))
+        offset = 0
+        values = []
+        for name, kind in columns:
+            column, offset = decode_column(data, offset, count, kind)
+            values.append(column)
+        yield list(zip(*values))
+
+def export_table(conn, directory, table, columns, key):
+    """Writes a table to DIR/<table>.col
+    Returns the number of rows
+
+    :param conn: connection (not cursor object)
+    :param directory: dump directory
+    :param table: table name
+    :param columns: list of (column, type) pairs
+    :param key: order by clause
+    """
+    curs = conn.cursor()
+    curs.execute("select %s from %s order by %s" % (', '.join(name for name, kind in columns),
+        table, key))
+    count = 0
+    with open(os.path.join(directory, table + '.col'), 'wb') as f:
+        f.write(MAGIC)
+        f.write(json.dumps({'table': table, 'columns': columns}).encode('utf-8') + b'\n')
+        while True:
+            rows = curs.fetchmany(BLOCK_ROWS)
+            if len(rows) == 0:
+                break
+            write_block(f, rows, columns)
+            count += len(rows)
+        f.write(BLOCK_HEADER.pack(0, 0))
+    curs.close()
+    return count
+
+def import_table(conn, directory, table, batch=BATCH_ROWS, commit=COMMIT_ROWS):
+    """Inserts the rows of DIR/<table>.col with executemany batches
+    Returns the number of rows
+
+    :param conn: connection (not cursor object)
+    :param directory: dump directory
+    :param table: table name
+    :param batch (optional): rows per executemany
+    :param commit (optional): rows per commit
+    """
+    curs = conn.cursor()
+    count = 0
+    uncommitted = 0
+    with open(os.path.join(directory, table + '.col'), 'rb') as f:
+        if f.readline() != MAGIC:
+            raise ValueError("%s.col is not a dump file" % (table))
+        columns = json.loads(f.readline().decode('utf-8'))['columns']
+        q = "insert into %s(%s) values(%s)" % (table, ','.join(name for name, kind in columns),
+            ','.join(':%d' % (i + 1) for i in range(len(columns))))
+
+        for rows in read_blocks(f, columns):
+            for i in range(0, len(rows), batch):
+                curs.executemany(q, rows[i:i + batch])
+            count += len(rows)
+            uncommitted += len(rows)
+            if uncommitted >= commit:
+                conn.commit()
+                uncommitted = 0
+    conn.commit()
+    curs.close()
+    return count
+
+def export_dump(conn, directory):
+    """Writes every table to a dump directory
+    Returns a dictionary mapping table name to number of rows
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return dict((table, export_table(conn, directory, table, columns, key))
+        for table, columns, key in TABLES)
+
+def import_dump(conn, directory, batch=BATCH_ROWS, commit=COMMIT_ROWS):
+    """Loads a dump directory into an empty schema, then builds the indexes,
+    counter tables and next ids (see prepare_bulk_load and finish_bulk_load)
+    Returns a dictionary mapping table name to number of rows and the list
+    of optional migrations to rebuild
+    """
+    prepare_bulk_load(conn)
+    counts = {}
+    for table, columns, key in TABLES:
+        counts[table] = import_table(conn, directory, table, batch, commit)
+    return counts, finish_bulk_load(conn)
+
+def take_number(args, option, default):
+    """Removes a numeric option and its value from a list of arguments
+    Returns the remaining arguments and the value
+    """
+    if option not in args:
+        return args, default
+    i = args.index(option)
+    return args[:i] + args[i + 2:], int(args[i + 1])
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    args, batch = take_number(args, '--batch', BATCH_ROWS)
+    args, commit = take_number(args, '--commit', COMMIT_ROWS)
+
+    if len(args) != 2 or args[0] not in ['export', 'import']:
+        print("Usage: python dump.py export | import DIR [--batch N] [--commit N] [--sqlite PATH]")
+        sys.exit(1)
+
+    if args[0] == 'import' and sqlite_path is not None and not os.path.exists(sqlite_path):
+        backend = SQLiteBackend(sqlite_path)
+        conn = backend.connect()
+        backend.load(conn, SCRIPTS[:1])
+    else:
+        conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    stale = []
+    if args[0] == 'export':
+        counts = export_dump(conn, args[1])
+    else:
+        curs = conn.cursor()
+        curs.execute("select count(*) from users")
+        if curs.fetchone()[0] > 0:
+            print("The users table is not empty; import needs an empty schema.")
+            sys.exit(1)
+        curs.close()
+        counts, stale = import_dump(conn, args[1], batch, commit)
+
+    for table, columns, key in TABLES:
+        print("%-8s %d rows" % (table, counts[table]))
+    if len(stale) > 0:
+        print("Rebuild the optional indexes: %s" % (', '.join(stale)))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+
+from queries import get_names, get_tweet_writers, get_hashtags_for
+
+"""
+Per-session read-through cache for the user names, tweet writers and texts,
+and hashtags shown on the screens, and for the formatted lines of the tweets
+and users displayed. Users and tweets are never updated once
+written, so entries only need to be dropped when this session writes them.
+The caches are shared with the prefetch thread, so each access takes a lock.
+"""
+
+# Number of entries kept per kind of entity
+CACHE_SIZE = 2000
+
+class LRUCache:
+
+    def __init__(self, capacity=CACHE_SIZE):
+        """Bounded mapping that forgets the least recently used entries
+
+        :param capacity (optional): maximum number of entries
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, keys):
+        """Returns the cached values of some keys and the list of missing keys
+
+        :param keys: iterable of keys
+        """
+        found = {}
+        missing = []
+        with self.lock:
+            for key in set(keys):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(key)
+                    self.misses += 1
+        return found, missing
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class EntityCache:
+
+    def __init__(self, capacity=CACHE_SIZE):
+        """Caches of user names, (writer, text) tweets, tweet hashtags and 
+        display cards
+
+        :param capacity (optional): maximum number of entries per cache
+        """
+        self.names = LRUCache(capacity)
+        self.tweets = LRUCache(capacity)
+        self.terms = LRUCache(capacity)
+        self.cards = LRUCache(capacity)
+
+    def read_through(self, cache, keys, fetch, default=None):
+        """Returns a dictionary of cached values, fetching the missing keys
+        with one batch query
+
+        :param cache: LRUCache object
+        :param keys: iterable of keys
+        :param fetch: function taking the missing keys and returning a dictionary
+        :param default (optional): value cached for keys the query did not return
+            (None to not cache them)
+        """
+        found, missing = cache.lookup(keys)
+        if len(missing) == 0:
+            return found
+
+        fetched = fetch(missing)
+        for key in missing:
+            value = fetched.get(key, default)
+            if value is not None:
+                cache.store(key, value)
+                found[key] = value
+        return found
+
+    def get_names(self, curs, users):
+        """Returns a dictionary mapping user id to name
+
+        :param curs: cursor object
+        :param users: iterable of user ids
+        """
+        return self.read_through(self.names, users, lambda keys: get_names(curs, keys))
+
+    def get_name(self, curs, user):
+        """Returns a user's name"""
+        return self.get_names(curs, [user])[user]
+
+    def get_tweets(self, curs, tids):
+        """Returns a dictionary mapping tweet id to a (writer, text) tuple
+
+        :param curs: cursor object
+        :param tids: iterable of tweet ids
+        """
+        return self.read_through(self.tweets, tids, lambda keys: get_tweet_writers(curs, keys))
+
+    def get_terms(self, curs, tids):
+        """Returns a dictionary mapping tweet id to its hashtag terms
+        Tweets without hashtags are cached with an empty tuple
+
+        :param curs: cursor object
+        :param tids: iterable of tweet ids
+        """
+        return self.read_through(self.terms, tids, lambda keys: get_hashtags_for(curs, keys),
+            default=())
+
+    def get_card(self, entity, layout, build):
+        """Returns the lines displaying a tweet or user in one layout, 
+        building them the first time
+
+        :param entity: ('tweet', tid) or ('user', usr)
+        :param layout: tuple of the display arguments (index, width, ...)
+        :param build: function returning the lines
+        """
+        found, missing = self.cards.lookup([entity])
+        layouts = found.get(entity)
+        if layouts is None:
+            layouts = {}
+            self.cards.store(entity, layouts)
+        if layout not in layouts:
+            layouts[layout] = build()
+        return layouts[layout]
+
+    def invalidate_user(self, user):
+        """Forget a user and its cards written by this session"""
+        self.names.discard(user)
+        self.cards.discard(('user', user))
+
+    def invalidate_tweet(self, tid):
+        """Forget a tweet, its hashtags and its cards written by this session"""
+        self.tweets.discard(tid)
+        self.terms.discard(tid)
+        self.cards.discard(('tweet', tid))
+
+    def stats(self):
+        """Returns a dictionary mapping cache name to (hits, misses, size)"""
+        return dict((name, (cache.hits, cache.misses, len(cache))) for name, cache in
+            [('names', self.names), ('tweets', self.tweets), ('terms', self.terms),
+            ('cards', self.cards)])
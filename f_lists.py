@@ -1,16 +1,17 @@
 from utils import *
 from queries import *
+from unit_of_work import UnitOfWork
 ##here are functions in lists' home
 
 def answer_check(prompt):
     while True:
-        answer = input(prompt)
+        answer = read_input(prompt)
         if answer.lower() in ['y','yes']:
             return 1
         elif answer.lower() in ['n','no']:
             return 0;
         else:
-            answer = input(prompt)
+            answer = read_input(prompt)
 
 def member_exists(curs, lname, member):
 
@@ -25,7 +26,7 @@ def has_list(curs, owner):
 
 def get_members(curs, username, lname):
     curs.execute("select member from includes, lists where lists.lname =includes.lname and "
-        "lists.owner =:1 and lists.lname like '%%' || :1 ||'%%'", [username,lname])
+        "lists.owner =:1 and lists.lname like '%%' || :2 ||'%%'", [username,lname])
         
 
 #############################################
@@ -38,14 +39,15 @@ def get_users_l(username, curs, con):
 
     if has_list(curs, username):
         has_lists = True
-        print_border(length=width, thick=False)
         curs.execute("select lname from lists where owner=:1",[username])
         rows = curs.fetchall()
-        print_string("YOUR LISTS:", length=width)
-        print_border(length=width, thick=False, sign='|')
-        for row in rows:
-            print_string(row[0], length=width)
-        print_border(length=width, thick=False)
+        with screen():
+            print_border(length=width, thick=False)
+            print_string("YOUR LISTS:", length=width)
+            print_border(length=width, thick=False, sign='|')
+            for row in rows:
+                print_string(row[0], length=width)
+            print_border(length=width, thick=False)
     else:
         print("You do not have any lists.")
 
@@ -72,20 +74,21 @@ def get_lhas_user(session, username, curs):
     headers = "%-5s | %-20s | %-12s" % (owner_header, name_header, lname_header)
     BORD_LEN = 45
 
-    print_border(BORD_LEN, False)
-    print_string(headers, length=BORD_LEN)
-    print_border(BORD_LEN, False, sign='|')
-
-    for i, row in enumerate(rows):
-        owner = row[0]
-        name = row[1]
-        lname = row[2]
-        row_str = "%-5s | %-20s | %-12s" % (owner, name, lname)
-        print_string(row_str, length=BORD_LEN)
-        if i == len(rows) - 1:
-            print_border(BORD_LEN, False)
-        else: 
-            print_border(BORD_LEN, False, sign='|')
+    with screen():
+        print_border(BORD_LEN, False)
+        print_string(headers, length=BORD_LEN)
+        print_border(BORD_LEN, False, sign='|')
+
+        for i, row in enumerate(rows):
+            owner = row[0]
+            name = row[1]
+            lname = row[2]
+            row_str = "%-5s | %-20s | %-12s" % (owner, name, lname)
+            print_string(row_str, length=BORD_LEN)
+            if i == len(rows) - 1:
+                print_border(BORD_LEN, False)
+            else: 
+                print_border(BORD_LEN, False, sign='|')
 
     press_enter(session)
     return
@@ -103,8 +106,9 @@ def create_l(session, username, curs, con, manage_lists) :
     prompt = "You want to create list name as "+lname+"? y/n: "
     if answer_check(prompt) :
     ##create table
-        curs.execute('insert into lists values(:1,:2)',[lname,username])
-        con.commit()
+        work = UnitOfWork(session)
+        work.add_list([lname, username])
+        work.commit()
         print("List %s created." % (lname))
         press_enter(session)
     return
@@ -128,8 +132,9 @@ def add_lmember(session, username, curs, con, manage_lists):
         else:
             prompt = "You want to add member "+str(member)+"? y/n: "
             if answer_check(prompt) :
-                curs.execute('insert into includes values(:1,:2)',[lname,member])
-                con.commit()
+                work = UnitOfWork(session)
+                work.add_include([lname, member])
+                work.commit()
                 print("Added %s to list %s." % (member, lname))
                 press_enter(session)
     return
@@ -152,7 +157,7 @@ def delete_lmember(session, username, curs, con, manage_lists):
             print("No members to delete.")
             return 
 
-        list_members(curs, lname, rows)
+        list_members(session, lname, rows)
         prompt = "Enter the member you want to delete: "
         member = validate_num(prompt, session, menu_func=manage_lists)
         if (not member_exists(curs,lname,member) or not user_exists(curs,member)):
@@ -161,22 +166,25 @@ def delete_lmember(session, username, curs, con, manage_lists):
         else:
             prompt = "You want to delete member "+str(member)+"? y/n: "
             if answer_check(prompt) :
-                curs.execute("delete from includes where lname like '%%' || :1 ||'%%' and member=:2",[lname,member])
-                con.commit()
+                work = UnitOfWork(session)
+                work.remove_include([lname, member])
+                work.commit()
                 print("%s deleted from %s." % (member, lname))
                 press_enter(session)
     return
 
-def list_members(curs, lname, rows):
-    print_border(thick=False)
-    columns = "%-5s | %-20s" % ("USER", "NAME")
-    print_string(columns)
-    print_border(thick=False)
+def list_members(session, lname, rows):
+    names = session.get_cache().get_names(session.get_curs(), [row[0] for row in rows])
+    with screen():
+        print_border(thick=False)
+        columns = "%-5s | %-20s" % ("USER", "NAME")
+        print_string(columns)
+        print_border(thick=False)
 
-    for row in rows:
-        user = row[0]
-        name = get_name(curs, user)
+        for row in rows:
+            user = row[0]
+            name = names[user]
 
-        row_str = "%-5s | %-20s" % (user, name)
-        print_string(row_str)
-    print_border(thick=False)
+            row_str = "%-5s | %-20s" % (user, name)
+            print_string(row_str)
+        print_border(thick=False)
@@ -0,0 +1,192 @@
+from array import array
+from bisect import bisect_left
+
+"""
+In-memory copy of the follows table as compressed sparse row (CSR) arrays.
+The forward arrays list the users each user follows, sorted by id, so that
+membership is a binary search. The reverse arrays list the followers of each
+user, newest follow first. New follows are kept in small delta lists and
+merged into the arrays once there are enough of them.
+"""
+
+# Number of rows fetched per round trip while loading
+FETCH_SIZE = 10000
+
+# Number of new follows kept in the delta lists before the arrays are rebuilt
+COMPACT_AFTER = 10000
+
+class Adjacency:
+
+    def __init__(self):
+        """Neighbour lists of a set of nodes stored in three flat arrays:
+        the sorted node ids, the start offset of each node's neighbours and
+        the neighbours themselves
+        """
+        self.nodes = array('q')
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+
+    def append(self, node, target):
+        """Adds an edge; edges must be added grouped by node in id order"""
+        if len(self.nodes) == 0 or self.nodes[-1] != node:
+            self.nodes.append(node)
+            self.offsets.append(self.offsets[-1])
+        self.targets.append(target)
+        self.offsets[-1] += 1
+
+    def find(self, node):
+        """Returns the position of a node or -1 if it has no edges"""
+        i = bisect_left(self.nodes, node)
+        if i < len(self.nodes) and self.nodes[i] == node:
+            return i
+        return -1
+
+    def neighbours(self, node):
+        """Returns the neighbours of a node"""
+        i = self.find(node)
+        if i < 0:
+            return array('q')
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def degree(self, node):
+        """Returns the number of neighbours of a node"""
+        i = self.find(node)
+        if i < 0:
+            return 0
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def contains(self, node, target):
+        """Returns True if target is a neighbour (neighbours must be sorted)"""
+        i = self.find(node)
+        if i < 0:
+            return False
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        j = bisect_left(self.targets, target, lo, hi)
+        return j < hi and self.targets[j] == target
+
+    def __len__(self):
+        return len(self.targets)
+
+
+class FollowGraph:
+
+    def __init__(self):
+        """Follow relationships of every user, see load"""
+        self.forward = Adjacency()
+        self.reverse = Adjacency()
+        self.new_following = {}
+        self.new_followers = {}
+        self.new_count = 0
+
+    def load(self, curs):
+        """Builds the arrays from the follows table
+
+        :param curs: cursor object
+        """
+        self.forward = Adjacency()
+        curs.execute("select flwer, flwee from follows order by flwer, flwee")
+        for flwer, flwee in fetch_rows(curs):
+            self.forward.append(flwer, flwee)
+
+        self.reverse = Adjacency()
+        curs.execute("select flwee, flwer from follows "
+            "order by flwee, start_date desc, flwer")
+        for flwee, flwer in fetch_rows(curs):
+            self.reverse.append(flwee, flwer)
+
+        self.new_following = {}
+        self.new_followers = {}
+        self.new_count = 0
+
+    def load_user(self, curs, user):
+        """Builds the forward arrays of a user and of the users they follow
+        only, which is all that scoring the user's suggestions reads
+
+        :param curs: cursor object
+        :param user: user id
+        """
+        self.forward = Adjacency()
+        curs.execute("select flwer, flwee from follows where flwer = :1 or flwer in "
+            "(select flwee from follows where flwer = :2) order by flwer, flwee", [user, user])
+        for flwer, flwee in fetch_rows(curs):
+            self.forward.append(flwer, flwee)
+
+        self.reverse = Adjacency()
+        self.new_following = {}
+        self.new_followers = {}
+        self.new_count = 0
+        return self
+
+    def follows(self, flwer, flwee):
+        """Returns True if flwer follows flwee"""
+        if flwee in self.new_following.get(flwer, ()):
+            return True
+        return self.forward.contains(flwer, flwee)
+
+    def following(self, user):
+        """Returns the ids of the users a user follows, in id order"""
+        new = self.new_following.get(user)
+        if new is None:
+            return list(self.forward.neighbours(user))
+        return sorted(list(self.forward.neighbours(user)) + new)
+
+    def followers(self, user):
+        """Returns the ids of a user's followers, newest follow first"""
+        new = self.new_followers.get(user, [])
+        return new[::-1] + list(self.reverse.neighbours(user))
+
+    def following_count(self, user):
+        """Returns the number of users a user follows"""
+        return self.forward.degree(user) + len(self.new_following.get(user, ()))
+
+    def follower_count(self, user):
+        """Returns the number of followers of a user"""
+        return self.reverse.degree(user) + len(self.new_followers.get(user, ()))
+
+    def mutual_followers(self, user, other):
+        """Returns the followers two users have in common, in the order of
+        the first user's followers
+        """
+        if self.follower_count(other) < self.follower_count(user):
+            common = set(flwer for flwer in self.followers(other) if self.follows(flwer, user))
+            return [flwer for flwer in self.followers(user) if flwer in common]
+        return [flwer for flwer in self.followers(user) if self.follows(flwer, other)]
+
+    def add_follow(self, flwer, flwee):
+        """Applies a follow written to the database"""
+        if self.follows(flwer, flwee):
+            return
+        following = self.new_following.setdefault(flwer, [])
+        following.insert(bisect_left(following, flwee), flwee)
+        self.new_followers.setdefault(flwee, []).append(flwer)
+        self.new_count += 1
+
+        if self.new_count >= COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        """Merges the delta lists into the arrays"""
+        forward = Adjacency()
+        for user in sorted(set(self.forward.nodes).union(self.new_following)):
+            for flwee in self.following(user):
+                forward.append(user, flwee)
+
+        reverse = Adjacency()
+        for user in sorted(set(self.reverse.nodes).union(self.new_followers)):
+            for flwer in self.followers(user):
+                reverse.append(user, flwer)
+
+        self.forward = forward
+        self.reverse = reverse
+        self.new_following = {}
+        self.new_followers = {}
+        self.new_count = 0
+
+def fetch_rows(curs):
+    """Yields the rows of an executed query, fetching them in batches"""
+    while True:
+        rows = curs.fetchmany(FETCH_SIZE)
+        if len(rows) == 0:
+            return
+        for row in rows:
+            yield row
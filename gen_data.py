@@ -0,0 +1,276 @@
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+from backends import SQLiteBackend, SCRIPTS, split_args, open_database
+from migrations import prepare_bulk_load, finish_bulk_load
+
+"""
+Generates a synthetic Twitter dataset at a configurable scale: users with
+power-law follows, tweets with hashtags and replies, retweets, lists and
+includes. Rows are streamed into the database with executemany batches.
+
+Usage:
+python gen_data.py TWEETS [--seed N] --sqlite PATH   creates a new SQLite database
+python gen_data.py TWEETS [--seed N]                 fills an empty Oracle schema
+"""
+
+# Rows per executemany batch and commit
+BATCH_SIZE = 10000
+
+# Shape of the generated data, relative to the number of tweets
+TWEETS_PER_USER = 10
+HASHTAG_TERMS = 2000
+REPLY_RATE = 0.2
+RETWEET_RATE = 0.2
+USERS_PER_LIST = 20
+START_DATE = datetime(2010, 1, 1)
+
+FIRST_NAMES = ['John', 'Mary', 'Connor', 'Laura', 'Ryan', 'Jordan', 'Ashley', 'Kara',
+    'Milan', 'Davood', 'Leon', 'Cam', 'Adam', 'Oscar', 'Tyler', 'Matt', 'Andrej', 'Eric']
+LAST_NAMES = ['Doe', 'Smith', 'McDavid', 'Petrich', 'Nugent', 'Eberle', 'Lucic', 'Rafiei',
+    'Johnson', 'Talbot', 'Larsson', 'Pitlick', 'Nurse', 'Benning', 'Sekera', 'Gryba']
+CITIES = ['Edmonton', 'Calgary', 'Toronto', 'Ottawa', 'Vancouver', 'Montreal', 'Regina',
+    'Winnipeg', 'Halifax', 'St. Johns', 'Victoria', 'Red Deer']
+WORDS = ['the', 'new', 'study', 'shows', 'science', 'space', 'galaxy', 'hockey', 'game',
+    'tonight', 'great', 'news', 'today', 'water', 'found', 'could', 'world', 'first',
+    'people', 'research', 'planet', 'ice', 'castle', 'win', 'chance', 'see', 'bill',
+    'committee', 'wild', 'hamsters', 'corn', 'diet', 'parrot', 'trial', 'weevil', 'named']
+
+def zipf_weights(count, alpha=1.0):
+    """Returns cumulative power-law weights for ranks 1 to count
+
+    :param count: number of ranks
+    :param alpha (optional): skew of the distribution
+    """
+    total = 0.0
+    weights = []
+    for rank in range(1, count + 1):
+        total += 1.0 / (rank ** alpha)
+        weights.append(total)
+    return weights
+
+def pick(rng, population, cum_weights, k=1):
+    """Draws k values from population using cumulative weights"""
+    return rng.choices(population, cum_weights=cum_weights, k=k)
+
+def make_terms(rng):
+    """Returns a vocabulary of distinct hashtag terms of at most 10 chars"""
+    terms = list(WORDS)
+    while len(terms) < HASHTAG_TERMS:
+        term = rng.choice(WORDS)[:6] + str(len(terms))
+        terms.append(term[:10])
+    return terms
+
+def make_text(rng, terms):
+    """Returns a tweet text of at most 80 chars ending with its hashtags"""
+    tags = ' '.join('#' + term for term in terms)
+    text = rng.choice(WORDS).capitalize()
+    for i in range(rng.randint(3, 10)):
+        word = rng.choice(WORDS)
+        if len(text) + len(word) + len(tags) + 2 > 80:
+            break
+        text += ' ' + word
+    return (text + ' ' + tags).rstrip()
+
+
+class Generator:
+
+    def __init__(self, tweets, seed=0):
+        """Synthetic dataset with the given number of tweets
+
+        :param tweets: number of tweets
+        :param seed (optional): random seed
+        """
+        self.rng = random.Random(seed)
+        self.num_tweets = tweets
+        self.num_users = max(tweets // TWEETS_PER_USER, 10)
+        self.users = list(range(1, self.num_users + 1))
+        self.popularity = zipf_weights(self.num_users)
+        self.terms = make_terms(self.rng)
+        self.term_weights = zipf_weights(len(self.terms), alpha=1.1)
+
+    def gen_users(self):
+        rng = self.rng
+        for usr in self.users:
+            name = "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+            yield [usr, 'pass', name, 'u%d@tw.com' % (usr), rng.choice(CITIES),
+                rng.randint(-8, -3)]
+
+    def gen_hashtags(self):
+        for term in self.terms:
+            yield [term]
+
+    def gen_follows(self):
+        """Out-degrees follow a Pareto distribution and followees are picked
+        by popularity, so a few users have most of the followers
+        """
+        rng = self.rng
+        for flwer in self.users:
+            degree = min(int(rng.paretovariate(1.2) * 3), self.num_users - 1)
+            flwees = set(pick(rng, self.users, self.popularity, degree))
+            flwees.discard(flwer)
+            for flwee in sorted(flwees):
+                start = START_DATE + timedelta(days=rng.randint(0, 365 * 7))
+                yield [flwer, flwee, start]
+
+    def tweet_date(self, tid):
+        """Tweets are spread evenly over seven years in tid order"""
+        return START_DATE + timedelta(minutes=tid * (365 * 7 * 24 * 60) // self.num_tweets)
+
+    def gen_tweets(self):
+        """Yields (tweet row, list of mention rows) pairs"""
+        rng = self.rng
+        for tid in range(1, self.num_tweets + 1):
+            writer = pick(rng, self.users, self.popularity)[0]
+            count = rng.choice([0, 0, 1, 1, 1, 2, 3])
+            terms = sorted(set(pick(rng, self.terms, self.term_weights, count)))
+            replyto = None
+            if tid > 1 and rng.random() < REPLY_RATE:
+                replyto = rng.randint(max(1, tid - 1000), tid - 1)
+
+            row = [tid, writer, self.tweet_date(tid), make_text(rng, terms), replyto]
+            yield row, [[tid, term] for term in terms]
+
+    def gen_retweets(self):
+        rng = self.rng
+        for tid in range(1, self.num_tweets + 1):
+            if rng.random() >= RETWEET_RATE:
+                continue
+            tdate = self.tweet_date(tid)
+            for usr in set(pick(rng, self.users, self.popularity, rng.randint(1, 3))):
+                yield [usr, tid, tdate + timedelta(days=rng.randint(0, 30))]
+
+    def gen_lists(self):
+        rng = self.rng
+        for i in range(1, self.num_users // USERS_PER_LIST + 2):
+            yield ['list%d' % (i), rng.choice(self.users)]
+
+    def gen_includes(self):
+        rng = self.rng
+        for i in range(1, self.num_users // USERS_PER_LIST + 2):
+            members = set(rng.sample(self.users, min(rng.randint(5, 15), self.num_users)))
+            for member in sorted(members):
+                yield ['list%d' % (i), member]
+
+
+INSERTS = {
+    'users': "insert into users(usr,pwd,name,email,city,timezone) values(:1,:2,:3,:4,:5,:6)",
+    'hashtags': "insert into hashtags(term) values(:1)",
+    'tweets': "insert into tweets(tid,writer,tdate,text,replyto) values(:1,:2,:3,:4,:5)",
+    'mentions': "insert into mentions(tid,term) values(:1,:2)",
+    'follows': "insert into follows(flwer,flwee,start_date) values(:1,:2,:3)",
+    'retweets': "insert into retweets(usr,tid,rdate) values(:1,:2,:3)",
+    'lists': "insert into lists(lname,owner) values(:1,:2)",
+    'includes': "insert into includes(lname,member) values(:1,:2)"
+}
+
+def write_rows(conn, table, rows):
+    """Inserts rows into a table in executemany batches
+    Returns the number of rows
+
+    :param conn: connection (not cursor object)
+    :param table: table name
+    :param rows: iterable of row values
+    """
+    curs = conn.cursor()
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            curs.executemany(INSERTS[table], batch)
+            conn.commit()
+            count += len(batch)
+            batch = []
+    if len(batch) > 0:
+        curs.executemany(INSERTS[table], batch)
+        conn.commit()
+        count += len(batch)
+    curs.close()
+    return count
+
+def write_tweets(conn, tweets):
+    """Inserts tweets and their mentions in executemany batches
+    Returns the number of tweets and mentions
+
+    :param conn: connection (not cursor object)
+    :param tweets: iterable of (tweet row, mention rows) pairs
+    """
+    curs = conn.cursor()
+    batch = []
+    mentions = []
+    counts = [0, 0]
+    for row, terms in tweets:
+        batch.append(row)
+        mentions.extend(terms)
+        if len(batch) == BATCH_SIZE:
+            curs.executemany(INSERTS['tweets'], batch)
+            curs.executemany(INSERTS['mentions'], mentions)
+            conn.commit()
+            counts = [counts[0] + len(batch), counts[1] + len(mentions)]
+            batch = []
+            mentions = []
+    if len(batch) > 0:
+        curs.executemany(INSERTS['tweets'], batch)
+        if len(mentions) > 0:
+            curs.executemany(INSERTS['mentions'], mentions)
+        conn.commit()
+        counts = [counts[0] + len(batch), counts[1] + len(mentions)]
+    curs.close()
+    return counts
+
+def generate(conn, tweets, seed=0):
+    """Fills an empty schema with a synthetic dataset
+    Returns a dictionary mapping table name to number of rows
+
+    :param conn: connection (not cursor object)
+    :param tweets: number of tweets
+    :param seed (optional): random seed
+    """
+    gen = Generator(tweets, seed)
+    counts = {}
+    counts['users'] = write_rows(conn, 'users', gen.gen_users())
+    counts['hashtags'] = write_rows(conn, 'hashtags', gen.gen_hashtags())
+    counts['tweets'], counts['mentions'] = write_tweets(conn, gen.gen_tweets())
+    counts['follows'] = write_rows(conn, 'follows', gen.gen_follows())
+    counts['retweets'] = write_rows(conn, 'retweets', gen.gen_retweets())
+    counts['lists'] = write_rows(conn, 'lists', gen.gen_lists())
+    counts['includes'] = write_rows(conn, 'includes', gen.gen_includes())
+    return counts
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    seed = 0
+    if '--seed' in args:
+        i = args.index('--seed')
+        seed = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+
+    if len(args) != 1 or not args[0].isdigit():
+        print("Usage: python gen_data.py TWEETS [--seed N] [--sqlite PATH]")
+        sys.exit(1)
+
+    if sqlite_path is not None:
+        if os.path.exists(sqlite_path):
+            print("%s already exists." % (sqlite_path))
+            sys.exit(1)
+        backend = SQLiteBackend(sqlite_path)
+        conn = backend.connect()
+        backend.load(conn, SCRIPTS[:1])
+    else:
+        conn = open_database()
+
+    if conn is None:
+        sys.exit(1)
+
+    prepare_bulk_load(conn)
+    counts = generate(conn, int(args[0]), seed)
+    finish_bulk_load(conn)
+    for table in sorted(counts):
+        print("%-8s %d rows" % (table, counts[table]))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
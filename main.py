@@ -1,11 +1,21 @@
 import sys
-import cx_Oracle
 
 from utils import *
 from queries import * 
 from tweet import TweetSearch, compose_tweet, search_tweets
-from user import UserSearch, search_users, list_followers 
+from user import UserSearch, search_users, list_followers, list_suggestions 
 from mlist import ListManager 
+from allocator import IdAllocator
+from unit_of_work import UnitOfWork
+from entity_cache import EntityCache
+from prefetch import Prefetcher
+from follow_graph import FollowGraph
+from snapshot import open_snapshot, split_snapshot_args
+from navigation import Navigator, Screen, push, replace, go_home, restart, leave
+from trending import display_trending
+from migrations import apply_migrations
+from backends import split_args, connection_factory
+from tracing import TracingConnection, split_trace_args
 
 """
 CMPUT 291 Mini Project 1
@@ -13,35 +23,50 @@ Contributors: Hong Zhou, Haotian Zhu, Sharidan Barboza
 Due: March 12 5 PM
 """
 
-def get_connection(username=None, password=None):
-    """
-    Usage Example:
-    from connect import get_connection
-    conn = get_connection("sql_login.txt")
-    """
-    try:
-        return cx_Oracle.connect(username, password, "gwynne.cs.ualberta.ca:1521/CRS")
-    except cx_Oracle.DatabaseError as exc:
-        print("Invalid Oracle username/password; login denied.")
-
 class Twitter:
 
-    def __init__(self, connection):
-        """Establishes a connection with cx_Oracle and logs in user
+    def __init__(self, connection, snapshot=None, connect=None):
+        """Establishes a connection with the database and logs in user
 
-        :param connection: cx_Oracle connection
+        :param connection: cx_Oracle or sqlite3 connection, or a
+            TracingConnection wrapping one (None to browse a snapshot)
+        :param snapshot (optional): read-only Snapshot object to browse
+        :param connect (optional): function opening another connection, 
+            used to load the next page of results in the background and
+            to reserve new ids
         """
         self.conn = connection 
-        self.curs = self.conn.cursor()
+        self.snapshot = snapshot
+        self.tracer = getattr(connection, 'tracer', None)
+        self.curs = None if connection is None else self.conn.cursor()
         self.username = None
         self.name = None
         self.tweets = None
         self.s_tweets = None
         self.current = None
         self.lists = None 
-
-        create_tStat(self.curs)
-        create_uStat(self.curs)
+        self.cache = EntityCache()
+        self.graph = None
+        self.prefetcher = None if connect is None else Prefetcher(connect)
+
+        # A snapshot has nothing to migrate and nothing can be written to it
+        if snapshot is not None:
+            self.schema = {}
+            self.ids = {}
+        else:
+            self.schema = apply_migrations(self.conn)
+
+            # A session signs up at most one user, so don't reserve more
+            self.ids = {
+                'tweets': IdAllocator(self.conn, 'tweets', connect=connect),
+                'users': IdAllocator(self.conn, 'users', block_size=1, connect=connect)
+            }
+        self.timeline = 'timeline' in self.schema
+        self.search_index = 'search_terms' in self.schema
+        self.user_index = 'user_grams' in self.schema
+        self.suggestions = 'suggestions' in self.schema
+        self.trending = 'trend_counters' in self.schema
+        self.term_index = 'term_sets' in self.schema
         
     def get_conn(self):
         """Return the connection"""
@@ -59,74 +84,219 @@ class Twitter:
         """Return the user's first and last name"""
         return self.name
 
+    def get_snapshot(self):
+        """Return the snapshot being browsed or None"""
+        return self.snapshot
+
+    def read_only(self):
+        """Return True if browsing a snapshot, where nothing can be written"""
+        return self.snapshot is not None
+
     def get_current(self):
         """Get the current functionality"""
         return self.current
 
+    def get_cache(self):
+        """Return the entity cache of names, tweets and hashtags"""
+        return self.cache
+
+    def follow_graph(self, load=True):
+        """Return the in-memory follow graph, loading it on first use
+        
+        :param load (optional): if False, return None instead of loading it
+        """
+        if self.snapshot is not None:
+            return self.snapshot.follow_graph()
+        if self.graph is None and load:
+            self.graph = FollowGraph()
+            self.graph.load(self.curs)
+        return self.graph
+
+    def prefetch(self, owner, key, load):
+        """Load a page of a result set in the background if prefetching
+
+        :param owner: TweetSearch or UserSearch object
+        :param key: page key within the result set
+        :param load: function taking a cursor and returning the page
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.request(owner, key, load)
+
+    def prefetched(self, owner, key):
+        """Return a page loaded in the background or None"""
+        if self.prefetcher is None:
+            return None
+        return self.prefetcher.take(owner, key)
+
+    def cancel_prefetch(self, owner=None, keep=None):
+        """Cancel the background loads of a result set (default: all)
+
+        :param owner (optional): TweetSearch or UserSearch object
+        :param keep (optional): result set whose loads are kept
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.cancel(owner, keep)
+
+    def next_id(self, table):
+        """Return a new unique id for the tweets or users table"""
+        return self.ids[table].next_id()
+
+    def use_timeline(self):
+        """Return True if home tweets are read from the timeline table"""
+        return self.timeline
+
+    def use_search_index(self):
+        """Return True if tweet searches use the search_terms index"""
+        return self.search_index
+
+    def trace(self, action):
+        """Start recording the statements of a new action if tracing"""
+        if self.tracer is not None:
+            self.tracer.begin_action(action)
+
+    def use_user_index(self):
+        """Return True if user searches use the user_grams index"""
+        return self.user_index
+
+    def use_suggestions(self):
+        """Return True if suggestions are read from the suggestions table"""
+        return self.suggestions
+
+    def use_trending(self):
+        """Return True if trending hashtags are counted in trend_counters"""
+        return self.trending
+
+    def use_term_index(self):
+        """Return True if similar and related tweets come from term_sets"""
+        return self.term_index
+
+    def run(self):
+        """Shows the start up screen, then every screen the user moves to,
+        until the user exits
+        """
+        Navigator(self.start_screen, self.home_screen).run()
+
+    def start_screen(self):
+        """Returns the start up screen"""
+        self.username = None
+        self.tweets = None
+        self.current = None
+        return Screen(self.start_up)
+
+    def home_screen(self):
+        """Returns the home screen, showing the first page of home tweets"""
+        if self.tweets is None:
+            self.get_home_tweets()
+        self.tweets.reset()
+        return Screen(self.home, self.tweets, results=self.tweets)
+
+    def quit_to_start(self):
+        """Cancels a prompt and returns to the start up screen"""
+        raise restart()
+
+    def quit_to_home(self):
+        """Cancels a prompt and returns to the home screen"""
+        raise go_home()
+
     def start_up(self):
         """Displays start up screen to provide options for both
         registered and unregistered users 
+        Returns the transition to the home screen once logged in
         """
         width = 60
-        print_border(width, True)
-        print_string("            WELCOME TO THE TWITTER DATABASE", length=width)
-        print_string(" Created by: Hong Zhou, Haotion Zhu, and Sharidan Barboza", length=width)
-        print_border(width, True, sign='|')
-        print_string("            1. Login   2. Sign-Up   3. Exit", length=width)
-        print_border(width, False, sign='|')
-        print_string("INPUT INSTRUCTIONS:", length=width) 
-        print_string("Enter a number specified by the menu to select an option.", length=width) 
-        print_string("Enter control-C any time to immediately exit the program.", length=width)
-        print_string("Enter q, quit, or exit to cancel input and go back.", length=width)
-        print_border(width, True)
+        with screen():
+            print_border(width, True)
+            print_string("            WELCOME TO THE TWITTER DATABASE", length=width)
+            print_string(" Created by: Hong Zhou, Haotion Zhu, and Sharidan Barboza", length=width)
+            print_border(width, True, sign='|')
+            print_string("            1. Login   2. Sign-Up   3. Exit", length=width)
+            print_border(width, False, sign='|')
+            print_string("INPUT INSTRUCTIONS:", length=width) 
+            print_string("Enter a number specified by the menu to select an option.", length=width) 
+            print_string("Enter control-C any time to immediately exit the program.", length=width)
+            print_string("Enter q, quit, or exit to cancel input and go back.", length=width)
+            print_border(width, True)
         choice = validate_num(SELECT, self, self.exit, size=3)
 
         if choice == 1:
-    	    self.login()
+    	    self.trace('Login')
+    	    logged_in = self.login()
         elif choice == 2:
-    	    self.signup()
+    	    self.trace('Sign-Up')
+    	    logged_in = self.signup()
         else:
-            self.exit()
+            return leave()
 
-        self.get_home_tweets()
+        if logged_in:
+            return go_home()
 
     def exit(self):
         """Exit from the system and close database"""
         print("\nThank you for using Twitter. Closing the database ...")
-
-        self.curs.close()
-        self.conn.close()
+        if self.tracer is not None:
+            self.tracer.report()
+
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        for allocator in self.ids.values():
+            allocator.close()
+        if self.conn is not None:
+            self.curs.close()
+            self.conn.close()
         sys.exit()
 
     def login(self):
-        """Allows returning user to sign in. Will return to the start
-        up screen if login fails
+        """Allows returning user to sign in
+        Returns False if login fails
         """
-        self.username = validate_num("Enter username: ", self, menu_func=self.start_up)
-        password = validate_str("Enter password: ", self, self.start_up, 4)
-        row = find_user(self.curs, self.username, password)
+        self.username = validate_num("Enter username: ", self, menu_func=self.quit_to_start)
+        password = validate_str("Enter password: ", self, self.quit_to_start, 4)
+        if self.snapshot is not None:
+            row = self.snapshot.find_user(self.username, password)
+        else:
+            row = find_user(self.curs, self.username, password)
 
         if row is None:
             print("Username and/or password not valid.\n")
             self.username = None
-        else:
-            self.name = row[2].rstrip()
-            self.lists = ListManager(self)	
+            return False
 
-        if self.username is None:
-            self.start_up()
+        self.name = row[2].rstrip()
+        self.lists = ListManager(self)	
+        return True
 
     def logout(self):
-        """Logs user out of the system. Returns user to start up screen"""
-        self.start_up()
+        """Logs user out of the system
+        Returns the transition to the start up screen
+        """
+        # Pick up the follows of other clients at the next login
+        self.graph = None
+        self.cancel_prefetch()
+        if self.tracer is not None:
+            self.tracer.report()
+            for name, (hits, misses, size) in sorted(self.cache.stats().items()):
+                print("Entity cache %s: %d hits, %d misses, %d entries" % (name, hits, misses, size))
+            if self.prefetcher is not None:
+                hits, misses, dropped, cancelled, wasted, ms = self.prefetcher.stats()
+                rate = 100.0 * hits / (hits + misses) if hits + misses > 0 else 0.0
+                print("Prefetch: %d hits, %d misses (%.0f%% hit rate), %d dropped, %d cancelled, "
+                    "%d wasted (%.1f ms)" % (hits, misses, rate, dropped, cancelled, wasted, ms))
+        return restart()
 
     def signup(self):
-        """Creates a new user and inserts user into the database"""
+        """Creates a new user and inserts user into the database
+        Returns False if the user is not created
+        """
+        if self.read_only():
+            print("Sign-up is not available while browsing a snapshot.\n")
+            press_enter(self)
+            return False
+
         self.username = self.generate_user()
-        name = validate_str("Enter your name: ", self, self.start_up, 20)
-        email = validate_str("Enter your email: ", self, self.start_up, 15)
-        city = validate_str("Enter your city: ", self, self.start_up, 12)
-        timezone = validate_num("Enter your timezone: ", self, self.start_up, num_type='float', rnge=(-12,14))
+        name = validate_str("Enter your name: ", self, self.quit_to_start, 20)
+        email = validate_str("Enter your email: ", self, self.quit_to_start, 15)
+        city = validate_str("Enter your city: ", self, self.quit_to_start, 12)
+        timezone = validate_num("Enter your timezone: ", self, self.quit_to_start, num_type='float', rnge=(-12,14))
         password = self.validate_password() 
         self.name = name
 
@@ -137,14 +307,17 @@ class Twitter:
         if confirm in ["y", "yes"]:
             print("Welcome %s! Your username is %d." % (name, self.username))
             data = [self.username, password, name, email, city, timezone]
-            insert_user(self.conn, data)
+            work = UnitOfWork(self)
+            work.add_user(data)
+            work.commit()
+            self.lists = ListManager(self)
             press_enter(self)
-        else:
-            self.start_up()
+            return True
+        return False
 
     def validate_password(self):
         while True: 
-            password = validate_str("Enter your password: ", self, self.start_up, 4)
+            password = validate_str("Enter your password: ", self, self.quit_to_start, 4)
             if valid_password(password):
                 return password
             else:
@@ -152,20 +325,12 @@ class Twitter:
 
     def generate_user(self):
         """Generates a new unique user id for user sign-up"""
-        select(self.curs, 'users')
-        rows = self.curs.fetchall()
-        new_usr = len(rows) + 1
-    
-        while user_exists(self.curs, new_usr): 
-            new_usr += 1
-        return new_usr
+        return self.next_id('users')
 
     def get_home_tweets(self):
         """Gets the tweets of users being followed by the user"""
         self.tweets = TweetSearch(self)
         self.current = self.tweets
-        self.tweets.get_user_tweets()
-        self.home()
 
     def _main_menu(self):
         """Displays the main functionality menu
@@ -191,8 +356,12 @@ class Twitter:
                 "Search users", 
                 "Compose tweet",
                 "List followers", 
+                "Who to follow",
                 "Manage lists"
             ]
+            if self.read_only():
+                main_list = [choice for choice in main_list if choice not in 
+                    ["Compose tweet", "Who to follow", "Manage lists"]]
             choices.extend(main_list)
    
         home_screen = False 
@@ -205,66 +374,91 @@ class Twitter:
         display_selections(choices, no_border=True)
         return choices
 
-    def home(self, current=None, reset=True):
-        """Displays main system functionalities menu"""
-        if current is None:
-            self.current = self.tweets
-        else:
-            self.current = current
+    def results_screen(self, results):
+        """Returns the screen showing a TweetSearch or UserSearch with the
+        main menu
+        """
+        return Screen(self.home, results, results=results)
 
-        if reset:
-            self.current = self.current.reset()
+    def home(self, current):
+        """Displays main system functionalities menu below a page of results
+        Returns the transition to the next screen (None to show it again)
 
-        while True:          
+        :param current: TweetSearch or UserSearch object
+        """
+        self.current = current
+
+        # Background loads of result sets left behind are not needed
+        self.cancel_prefetch(keep=self.current)
+        with screen():
             print_newline()
 
             self.current.display_results()
+            if self.use_trending() and self.current.get_category() == "Home":
+                display_trending(self)
             choices = self._main_menu()
-            choice = validate_num(SELECT, self, self.start_up, size=len(choices)) - 1
-            option = choices[choice]
-
-            category = self.current.get_category()
-
-            # Currently operating functionalties
-            if option == 'Select a result':
-                self.current.choose_result()
-                self.current = self.tweets
-            elif option == 'See more results':
-                self.current.more_results()
-            elif option == 'Search tweets':
-                self.current = search_tweets(self)
-            elif category == 'TweetSearch' and option == 'Do another search':
-                self.current = search_tweets(self)
-            elif option == 'Search users':
-                self.current = search_users(self) 
-            elif category == 'UserSearch' and option == 'Do another search':
-                self.current = search_users(self)
-            elif option == 'Compose tweet':
-                compose_tweet(self)
-            elif option == 'List followers':
-                self.current = list_followers(self)
-            elif option == 'Manage lists':
-                self.lists.manage_lists() 
-            elif option == "Home":
-                self.current = self.tweets
-                self.home()
-            elif option == 'Logout':
-                self.logout()
+        choice = validate_num(SELECT, self, self.quit_to_start, size=len(choices)) - 1
+        option = choices[choice]
+
+        category = self.current.get_category()
+        self.trace(option)
+
+        # Currently operating functionalties
+        if option == 'Select a result':
+            return self.current.choose_result()
+        elif option == 'See more results':
+            self.current.more_results()
+        elif option == 'Search tweets':
+            return push(self.results_screen(search_tweets(self)))
+        elif category == 'TweetSearch' and option == 'Do another search':
+            return replace(self.results_screen(search_tweets(self)))
+        elif option == 'Search users':
+            return push(self.results_screen(search_users(self)))
+        elif category == 'UserSearch' and option == 'Do another search':
+            return replace(self.results_screen(search_users(self)))
+        elif option == 'Compose tweet':
+            compose_tweet(self)
+        elif option == 'List followers':
+            return push(self.results_screen(list_followers(self)))
+        elif option == 'Who to follow':
+            return push(self.results_screen(list_suggestions(self)))
+        elif option == 'Manage lists':
+            return push(Screen(self.lists.manage_lists))
+        elif option == "Home":
+            return go_home()
+        elif option == 'Logout':
+            return self.logout()
    
 # ----------------------------------- MAIN --------------------------------------
 
 def main():
-    # Get Oracle username and password
-    oracle_user = input("Enter Oracle username: ")
-    oracle_pass = input("Enter Oracle password: ")
-    connection = get_connection(username=oracle_user, password=oracle_pass)
+    # Connect to Oracle, or to a local SQLite file with --sqlite PATH
+    # --trace records the statements of every action
+    args, sqlite_path = split_args(sys.argv[1:])
+    args, tracer = split_trace_args(args)
+    args, snapshot_dir = split_snapshot_args(args)
+
+    # --snapshot DIR browses a read-only snapshot without a database
+    if snapshot_dir is not None:
+        snapshot = open_snapshot(snapshot_dir)
+        if snapshot is None:
+            sys.exit()
+        twitter = Twitter(None, snapshot)
+        twitter.run()
+        twitter.exit()
+
+    connect = connection_factory(sqlite_path)
+    connection = connect()
 
     if connection is None:
         sys.exit()
 
+    if tracer is not None:
+        connection = TracingConnection(connection, tracer)
+
     # Log in/sign up user into database
-    twitter = Twitter(connection)
-    twitter.start_up()
+    twitter = Twitter(connection, connect=connect)
+    twitter.run()
     
     # Exit out of the database system
     twitter.exit()
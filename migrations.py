@@ -0,0 +1,193 @@
+from utils import TODAY
+from queries import *
+from backends import DATABASE_ERRORS
+
+"""
+Schema registry for the views, indexes and auxiliary tables that the client
+adds to the schema in table.sql. The schema_versions table records the
+version of every applied migration, so starting the client only runs one
+query unless something is missing or outdated.
+"""
+
+def apply_views(conn):
+    """Creates the tStat and uStat views
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_tStat(curs)
+    create_uStat(curs)
+    curs.close()
+
+def apply_timeline(conn):
+    """Creates the timeline table
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_timeline(curs)
+    curs.close()
+
+def apply_search_index(conn):
+    """Creates the search_terms table
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_search_index(curs)
+    curs.close()
+
+def apply_user_grams(conn):
+    """Creates the user_grams table
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_user_grams(curs)
+    curs.close()
+
+def apply_term_index(conn):
+    """Creates the term_sets and term_posts tables
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_term_index(curs)
+    curs.close()
+
+def apply_trend_counters(conn):
+    """Creates the trend_counters and trend_days tables
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_trend_counters(curs)
+    curs.close()
+
+def apply_suggestions(conn):
+    """Creates the suggestions and stale_suggestions tables
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    create_suggestions(curs)
+    curs.close()
+
+# (name, version, function applying it, required)
+# Optional migrations are only applied by their maintenance commands
+# (timeline.py, search_index.py, user_index.py, suggestions.py, trending.py,
+# term_index.py); once applied they are upgraded at startup
+MIGRATIONS = [
+    ('views', 1, apply_views, True),
+    ('id_blocks', 1, create_id_blocks, True),
+    ('indexes', 1, create_indexes, True),
+    ('tweet_stats', 1, create_tweet_stats, True),
+    ('user_stats', 1, create_user_stats, True),
+    ('timeline', 1, apply_timeline, False),
+    ('search_terms', 1, apply_search_index, False),
+    ('user_grams', 1, apply_user_grams, False),
+    ('suggestions', 1, apply_suggestions, False),
+    ('trend_counters', 2, apply_trend_counters, False),
+    ('term_sets', 1, apply_term_index, False)
+]
+
+def get_versions(curs):
+    """ Returns a dictionary mapping migration name to applied version
+    Creates the schema_versions table on first use
+
+    :param curs: cursor object
+    """
+    try:
+        curs.execute("select name, version from schema_versions")
+    except DATABASE_ERRORS:
+        curs.execute("create table schema_versions (name varchar(30), version int, "
+            "applied date, primary key (name))")
+        return {}
+    return dict(curs.fetchall())
+
+def record_version(conn, name, version):
+    """ Records that a migration has been applied
+
+    :param conn: connection (not cursor object)
+    :param name: migration name
+    :param version: applied version
+    """
+    curs = conn.cursor()
+    curs.execute("update schema_versions set version = :1, applied = :2 where name = :3",
+        [version, TODAY, name])
+    if curs.rowcount == 0:
+        curs.execute("insert into schema_versions(name, version, applied) "
+            "values(:1, :2, :3)", [name, version, TODAY])
+    curs.close()
+    conn.commit()
+
+def apply_migration(conn, name):
+    """ Applies a single migration (required or optional) and records it
+
+    :param conn: connection (not cursor object)
+    :param name: migration name
+    """
+    curs = conn.cursor()
+    get_versions(curs)
+    curs.close()
+
+    for migration, version, apply, required in MIGRATIONS:
+        if migration == name:
+            apply(conn)
+            record_version(conn, name, version)
+
+def apply_migrations(conn):
+    """ Applies every required migration that is missing and upgrades every
+    applied migration that is outdated
+    Returns a dictionary mapping migration name to applied version
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    versions = get_versions(curs)
+    curs.close()
+
+    for name, version, apply, required in MIGRATIONS:
+        applied = versions.get(name)
+        if applied == version or (applied is None and not required):
+            continue
+
+        apply(conn)
+        record_version(conn, name, version)
+        versions[name] = version
+    return versions
+
+def prepare_bulk_load(conn):
+    """ Applies the required migrations to an empty schema, where they have
+    no rows to fill, and drops the secondary indexes so that a bulk load
+    does not maintain them
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migrations(conn)
+    drop_indexes(conn)
+
+def finish_bulk_load(conn):
+    """ Rebuilds what the required migrations derive from the tables in
+    table.sql after a bulk load: the secondary indexes, the tweet_stats and
+    user_stats counters and the next ids in id_blocks. Recorded versions are
+    not checked, so a schema migrated before the load is refreshed too
+    Returns the names of the applied optional migrations, which their
+    maintenance commands have to rebuild
+
+    :param conn: connection (not cursor object)
+    """
+    create_indexes(conn)
+
+    curs = conn.cursor()
+    curs.execute("delete from tweet_stats")
+    fill_tweet_stats(curs)
+    curs.execute("delete from user_stats")
+    fill_user_stats(curs)
+    versions = get_versions(curs)
+    curs.close()
+    conn.commit()
+
+    reseed_id_blocks(conn)
+    return [name for name, version, apply, required in MIGRATIONS 
+        if not required and name in versions]
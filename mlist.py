@@ -1,6 +1,7 @@
 
 from utils import *
 from f_lists import get_users_l, get_lhas_user, create_l, add_lmember,delete_lmember
+from navigation import go_home, stay
 
 
 
@@ -14,7 +15,7 @@ from f_lists import get_users_l, get_lhas_user, create_l, add_lmember,delete_lme
 ##                                                            6 back to main home
 ##                                                            7 quit
 ##
-## return none
+## return the transition to the next screen (none to show the menu again)
 #################################
 
 class ListManager:
@@ -26,37 +27,34 @@ class ListManager:
         self.curs = session.get_curs() 
 
     def manage_lists(self):
-        while True:
-            chooses= [
-                "Show your lists", 
-                "Show lists you are on",
-                "Create a list",
-                "Add a member to a list",
-                "Delete a member from a list",
-                "Back to home","Log out"
-            ]
+        chooses= [
+            "Show your lists", 
+            "Show lists you are on",
+            "Create a list",
+            "Add a member to a list",
+            "Delete a member from a list",
+            "Back to home","Log out"
+        ]
+        with screen():
             print_newline()
             display_selections(chooses, "Manage Lists")
-            num_choose = validate_num(SELECT, self.session, menu_func=self.session.home, size=len(chooses))
-
-            if num_choose == 1:
-                get_users_l(self.username, self.curs, self.con)
-            elif num_choose == 2:
-                get_lhas_user(self.session, self.username, self.curs)
-            elif num_choose == 3:
-                create_l(self.session, self.username, self.curs, self.con, self.manage_lists)
-            elif num_choose == 4:
-                add_lmember(self.session, self.username, self.curs, self.con, self.manage_lists)
-            elif num_choose == 5:
-                delete_lmember(self.session, self.username, self.curs, self.con, self.manage_lists)
-            elif num_choose == 6:
-                self.session.home()
-            else:
-                self.session.logout()
-        return
-
-
-
-
-
-        
+        num_choose = validate_num(SELECT, self.session, menu_func=self.session.quit_to_home, size=len(chooses))
+
+        if num_choose == 1:
+            get_users_l(self.username, self.curs, self.con)
+        elif num_choose == 2:
+            get_lhas_user(self.session, self.username, self.curs)
+        elif num_choose == 3:
+            create_l(self.session, self.username, self.curs, self.con, self.quit_to_menu)
+        elif num_choose == 4:
+            add_lmember(self.session, self.username, self.curs, self.con, self.quit_to_menu)
+        elif num_choose == 5:
+            delete_lmember(self.session, self.username, self.curs, self.con, self.quit_to_menu)
+        elif num_choose == 6:
+            return go_home()
+        else:
+            return self.session.logout()
+
+    def quit_to_menu(self):
+        """Show the list menu again after a list prompt was quit"""
+        raise stay()
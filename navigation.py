@@ -0,0 +1,166 @@
+from collections import deque
+
+"""
+Screen navigation. Every screen of the client (start up, a page of results,
+a selected tweet or user, list management) is a Screen whose show function
+displays it once, handles one choice and returns a Transition saying where
+to go next. The Navigator runs the current screen in a loop and applies the
+transitions, so moving between screens never nests Python calls.
+
+The home screen is the root. Screens opened from it are kept in a bounded
+back-history for "Go back"; the oldest are forgotten past HISTORY_SIZE, and
+the result sets of forgotten screens are released.
+
+Prompts that are cancelled by typing quit raise a Transition from their
+menu_func callback instead of returning one.
+"""
+
+# Number of screens kept above the home screen for going back
+HISTORY_SIZE = 20
+
+# Transition kinds
+PUSH = 'push'
+REPLACE = 'replace'
+BACK = 'back'
+HOME = 'home'
+STAY = 'stay'
+RESTART = 'restart'
+EXIT = 'exit'
+
+class Transition(Exception):
+
+    def __init__(self, kind, screen=None):
+        """A move from the current screen to another one
+
+        :param kind: PUSH, REPLACE, BACK, HOME, STAY, RESTART or EXIT
+        :param screen (optional): Screen object for PUSH and REPLACE
+        """
+        Exception.__init__(self, kind)
+        self.kind = kind
+        self.screen = screen
+
+def push(screen):
+    """Open a screen on top of the current one"""
+    return Transition(PUSH, screen)
+
+def replace(screen):
+    """Open a screen instead of the current one (e.g. another search)"""
+    return Transition(REPLACE, screen)
+
+def go_back():
+    """Return to the previous screen"""
+    return Transition(BACK)
+
+def go_home():
+    """Forget the history and show the first page of the home screen"""
+    return Transition(HOME)
+
+def stay():
+    """Show the current screen again"""
+    return Transition(STAY)
+
+def restart():
+    """Forget every screen and show the start up screen"""
+    return Transition(RESTART)
+
+def leave():
+    """Stop navigating"""
+    return Transition(EXIT)
+
+
+class Screen:
+
+    def __init__(self, show, *args, **kwargs):
+        """A screen of the client
+
+        :param show: function displaying the screen and handling one choice,
+            returning a Transition (or None to show the screen again)
+        :param args: arguments of show
+        :param results (optional): TweetSearch or UserSearch the screen shows,
+            released once no screen in the history shows it
+        """
+        self.show_func = show
+        self.args = args
+        self.results = kwargs.get('results')
+
+    def show(self):
+        return self.show_func(*self.args)
+
+
+class Navigator:
+
+    def __init__(self, start, home, size=HISTORY_SIZE):
+        """Runs screens until a screen leaves
+
+        :param start: function returning the start up Screen
+        :param home: function returning the home Screen, showing its first page
+        :param size (optional): number of screens kept for going back
+        """
+        self.start = start
+        self.home = home
+        self.root = None
+        self.history = deque()
+        self.size = size
+
+    def current(self):
+        """Returns the screen being shown"""
+        return self.history[-1] if len(self.history) > 0 else self.root
+
+    def screens(self):
+        return [self.root] + list(self.history)
+
+    def run(self):
+        """Shows the start up screen, then the screens the transitions lead to"""
+        self.root = self.start()
+        while True:
+            try:
+                transition = self.current().show()
+            except Transition as raised:
+                transition = raised
+
+            if transition is None or transition.kind == STAY:
+                continue
+            if transition.kind == EXIT:
+                self.clear()
+                return
+            self.apply(transition)
+
+    def apply(self, transition):
+        """Changes the current screen"""
+        if transition.kind == PUSH:
+            self.history.append(transition.screen)
+            while len(self.history) > self.size:
+                self.release(self.history.popleft())
+        elif transition.kind == REPLACE:
+            old = self.history.pop() if len(self.history) > 0 else None
+            self.history.append(transition.screen)
+            if old is not None:
+                self.release(old)
+        elif transition.kind == BACK:
+            if len(self.history) > 0:
+                self.release(self.history.pop())
+        elif transition.kind == HOME:
+            self.clear()
+            self.root = self.home()
+        elif transition.kind == RESTART:
+            self.clear()
+            self.root = self.start()
+
+    def clear(self):
+        """Forgets every screen, releasing their result sets"""
+        screens = self.screens()
+        self.root = None
+        self.history.clear()
+        for screen in screens:
+            if screen is not None and screen.results is not None:
+                screen.results.release()
+
+    def release(self, screen):
+        """Releases the result set of a forgotten screen unless another
+        screen still shows it
+        """
+        if screen.results is None:
+            return
+        if any(other is not None and other.results is screen.results for other in self.screens()):
+            return
+        screen.results.release()
@@ -0,0 +1,175 @@
+import time
+import queue
+import threading
+
+"""
+Background loading of the next page of results. While a page is shown, the
+result set asks the prefetcher to load the following one; a worker thread
+runs the load on a connection of its own, so that "See more results" usually
+finds the page ready. At most QUEUE_SIZE loads wait for the worker (further
+requests are dropped), and the loads of result sets the user navigated away
+from are cancelled: queued ones are skipped (counted as cancelled), and ones
+that were already loading or loaded are counted as wasted work.
+"""
+
+# Number of page loads waiting for the worker
+QUEUE_SIZE = 2
+
+# Seconds to wait for the worker to finish its current load when closing
+CLOSE_TIMEOUT = 5
+
+class Job:
+
+    def __init__(self, owner, key, load):
+        """A page load requested by a result set
+
+        :param owner: result set object (TweetSearch or UserSearch)
+        :param key: page key within the result set
+        :param load: function taking a cursor and returning the page
+        """
+        self.owner = owner
+        self.key = key
+        self.load = load
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.cancelled = False
+        self.started = False
+        self.ms = 0.0
+
+
+class Prefetcher:
+
+    def __init__(self, connect):
+        """Loads pages in a worker thread, see request and take
+
+        :param connect: function returning a new connection (or None)
+        """
+        self.connect = connect
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.wasted = 0
+        self.wasted_ms = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='prefetch')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        """Worker loop: runs the queued loads until a None job arrives"""
+        try:
+            conn = self.connect()
+        except Exception:
+            conn = None
+
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            with self.lock:
+                job.started = not job.cancelled
+            if job.started and conn is not None:
+                # A cursor per load, closed so that a partly fetched page
+                # does not keep a read open against the session's writes
+                start = time.perf_counter()
+                curs = conn.cursor()
+                try:
+                    job.result = job.load(curs)
+                except Exception:
+                    job.failed = True
+                finally:
+                    curs.close()
+                job.ms = (time.perf_counter() - start) * 1000
+            else:
+                job.failed = True
+
+            # A job cancelled while it was loading is counted here (see cancel)
+            with self.lock:
+                job.done.set()
+                if job.started and job.cancelled and not job.failed:
+                    self.wasted += 1
+                    self.wasted_ms += job.ms
+
+        if conn is not None:
+            conn.close()
+
+    def request(self, owner, key, load):
+        """Queues a page load unless it is already queued or the queue is full
+
+        :param owner: result set object
+        :param key: page key within the result set
+        :param load: function taking a cursor and returning the page
+        """
+        with self.lock:
+            if (id(owner), key) in self.jobs:
+                return
+            job = Job(owner, key, load)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self.dropped += 1
+                return
+            self.jobs[(id(owner), key)] = job
+        self.start()
+
+    def take(self, owner, key):
+        """Returns a requested page, waiting for the worker if it is being
+        loaded, or None if it was not requested or the load failed
+
+        :param owner: result set object
+        :param key: page key within the result set
+        """
+        with self.lock:
+            job = self.jobs.pop((id(owner), key), None)
+        if job is not None:
+            job.done.wait()
+        if job is None or job.failed:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return job.result
+
+    def cancel(self, owner=None, keep=None):
+        """Cancels the loads of a result set, or of every result set but one
+
+        :param owner (optional): result set whose loads are cancelled (default: all)
+        :param keep (optional): result set whose loads are kept
+        """
+        with self.lock:
+            for job_key, job in list(self.jobs.items()):
+                if job.owner is keep or (owner is not None and job.owner is not owner):
+                    continue
+                del self.jobs[job_key]
+                job.cancelled = True
+                if not job.started:
+                    self.cancelled += 1
+                elif job.done.is_set() and not job.failed:
+                    self.wasted += 1
+                    self.wasted_ms += job.ms
+
+    def close(self):
+        """Cancels every load and stops the worker"""
+        self.cancel()
+        if self.thread is not None:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put(None)
+            self.thread.join(CLOSE_TIMEOUT)
+            self.thread = None
+
+    def stats(self):
+        """Returns the hits, misses, dropped and cancelled requests, and the
+        wasted loads with their time in ms
+        """
+        return self.hits, self.misses, self.dropped, self.cancelled, self.wasted, self.wasted_ms
@@ -1,102 +1,12 @@
+from itertools import combinations
+
 from utils import is_hashtag, remove_hashtags
+from analyzer import text_words, word_patterns, substring_distance
+from backends import DATABASE_ERRORS
 
 # Query helper methods
 
-# ---------------------------- INSERT QUERIES ----------------------------------
-def insert_user(conn, data_list):
-    """ Inserts new user into users table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of usr, pwd, name, email, city, timezone values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into users(usr,pwd,name,email,city,timezone)"
-    	"values(:1,:2,:3,:4,:5,:6)", data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_follow(conn, data_list):
-    """ Inserts new follow relationship into follows table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of flwer, flwee, start_date values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into follows(flwer,flwee,start_date)"
-    	"values(:1,:2,:3)", data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_tweet(conn, data_list):
-    """ Inserts new tweet into tweets table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of tid, writer, tdate, text, replyto values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into tweets(tid,writer,tdate,text,replyto)"
-	    "values(:1,:2,:3,:4,:5)", data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_hashtag(conn, term):
-    """ Inserts new hashtag into hashtags table
-
-    :param conn: connection (not cursor object)
-    :param term: single string containing a hashtag term
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into hashtags(term) values(:1)", [term.lower()])
-    cursInsert.close()
-    conn.commit()
-
-def insert_mention(conn, data_list):
-    """ Inserts new mention into mentions table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of tid, term values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into mentions(tid,term) values(:1,:2)",
-        data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_retweet(conn, data_list):
-    """ Inserts new retweet into retweets table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of usr, tid, rdate values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into retweets(usr,tid,rdate) values(:1,:2,:3)", 
-        data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_list(conn, data_list):
-    """ Inserts new list into lists table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of lname, owner values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into lists(lname,owner) values(:1,:2)",
-        data_list)
-    cursInsert.close()
-    conn.commit()
-
-def insert_include(conn, data_list):
-    """ Inserts new include into includes table
-
-    :param conn: connection (not cursor object)
-    :param data_list: list of lname, member values
-    """
-    cursInsert = conn.cursor()
-    cursInsert.execute("insert into includes(lname,member) values(:1,:2)",
-        data_list)
-    cursInsert.close()
-    conn.commit()
+# Inserts and deletes are written through unit_of_work.UnitOfWork
 
 # -------------------------- SPECIFIC SELECT QUERIES --------------------------------
 
@@ -137,7 +47,7 @@ def follows_exists(curs, flwer, flwee):
     :param flwer: follower user id
     :param flwee: followee user id
     """
-    curs.execute('select * from follows where flwer=:1 and flwee=:2', [flwer, flwee])
+    curs.execute('select 1 from follows where flwer=:1 and flwee=:2', [flwer, flwee])
     return curs.fetchone() is not None
 
 def tid_exists(curs, tid):
@@ -188,18 +98,61 @@ def select(curs, table):
     """
     curs.execute("select * from %s" % (table))
 
-def follows_tweets(curs, user):
+def keyset(after, start, date_col='t.tdate', id_col='t.tid'):
+    """ Returns the condition and bind values that restrict a query ordered by
+    date and id (newest first) to the rows after a page boundary
+    
+    :param after: (date, id) tuple of the last row on the previous page
+    :param start: number of the first bind variable
+    :param date_col (optional): date column of the ordering key
+    :param id_col (optional): id column of the ordering key
+    """
+    cond = ' and (%s < :%d or (%s = :%d and %s < :%d))' % (date_col, start, 
+        date_col, start + 1, id_col, start + 2)
+    return cond, [after[0], after[0], after[1]]
+
+def fetch_page(curs, size, key):
+    """ Fetches the next page of rows from an executed query
+    Rows sharing the key of the last row are kept on the same page so the
+    next page can start strictly after it
+    Returns the rows and True if more rows follow
+
+    :param curs: cursor object
+    :param size: number of rows per page
+    :param key: function returning the ordering key of a row
+    """
+    rows = curs.fetchmany(size)
+    if len(rows) < size:
+        return rows, False
+
+    while True:
+        row = curs.fetchone()
+        if row is None:
+            return rows, False
+        if key(row) != key(rows[-1]):
+            return rows, True
+        rows.append(row)
+
+def follows_tweets(curs, user, after=None):
     """ Gets the tweets/retweets from users who are being followed by the user
     Ordered by tweet date
     
     :param curs: cursor boejct
     :param user: logged-in user id
+    :param after (optional): (tdate, tid) of the last tweet on the previous page
     """
-    curs.execute('select distinct t.tid, t.writer, t.tdate, t.text, t.replyto, t2.usr '
-        'from tweets t left outer join (select f.flwer, f.flwee, rt.usr, rt.tid '
-        'from follows f left outer join retweets rt on f.flwee = rt.usr) t2 '
-        'on t.tid = t2.tid or (t.writer = t2.flwee) where t2.flwer =:1 order by t.tdate desc', 
-        [user])
+    q = 'select distinct t.tid, t.writer, t.tdate, t.text, t.replyto, t2.usr ' \
+        'from tweets t left outer join (select f.flwer, f.flwee, rt.usr, rt.tid ' \
+        'from follows f left outer join retweets rt on f.flwee = rt.usr) t2 ' \
+        'on t.tid = t2.tid or (t.writer = t2.flwee) where t2.flwer =:1'
+    binds = [user]
+
+    if after is not None:
+        cond, values = keyset(after, 2)
+        q += cond
+        binds.extend(values)
+    q += ' order by t.tdate desc, t.tid desc'
+    curs.execute(q, binds)
 
 def get_followers(curs, user):
     """Gets all the followers of a specific user
@@ -297,34 +250,38 @@ def uStat_exists(curs):
     return curs.fetchone() is not None
 
 def get_user_stats(curs, user):
-    """Get user statistics about a specific user"""
-    curs.execute("select * from uStat where usr=:1", [user])
-    return curs.fetchmany(3)
+    """Get the followee, follower and tweet counts of a specific user
+    from the user_stats table
+    """
+    curs.execute("select flwee_cnt, flwer_cnt, tw_cnt from user_stats where usr=:1", [user])
+    row = curs.fetchone()
+    return (0, 0, 0) if row is None else row
 
-def get_user_tweets(curs, user):
-    """Get all the tweets of a specific user
+def get_user_tweets(curs, user, after=None):
+    """Get the tweets of a specific user, newest first
 
     :param user: user id
+    :param after (optional): (tdate, tid) of the last tweet on the previous page
     """
-    curs.execute('select * from tweets where writer=:1 order by tdate desc', [user])
+    binds = [user]
+    cond = ''
+    if after is not None:
+        cond, values = keyset(after, 2)
+        binds.extend(values)
 
-def get_rep_cnt(curs, tid):
-    """ Get the reply count of a specific tweet
-    
-    param curs: cursor object
-    param: tid: a tweet's id
-    """
-    curs.execute('select rep_cnt from tStat where tid=:1', [tid])
-    return curs.fetchone()
+    curs.execute('select * from tweets t where t.writer=:1%s '
+        'order by t.tdate desc, t.tid desc' % (cond), binds)
 
-def get_ret_cnt(curs, tid):
-    """ Get the retweetn count of a specific tweet
+def get_tweet_stats(curs, tid):
+    """ Get the reply, retweet and similar tweet counts of a specific tweet
+    from the tweet_stats table
     
     param curs: cursor object
     param: tid: a tweet's id
     """
-    curs.execute('select ret_cnt from tStat where tid=:1', [tid])
-    return curs.fetchone()
+    curs.execute('select rep_cnt, ret_cnt, sim_cnt from tweet_stats where tid=:1', [tid])
+    row = curs.fetchone()
+    return (0, 0, 0) if row is None else row
 
 def get_hashtags(curs, tid):
     """ Get all the hashtags for a tweet"""
@@ -341,18 +298,19 @@ def already_retweeted(curs, user, tid):
     curs.execute('select * from retweets where usr=:1 and tid=:2', [user, tid])
     return False if curs.fetchone() is None else True
 
-def match_tweet(curs, keywords, order):
+def match_tweet(curs, keywords, after=None):
     """Matches tweets who satisfy at least one keyword 
+    Ordered by tweet date
 
     :param curs: cursor object
     :param keywords: list of tokenized words
-    :param order: what to order results by
+    :param after (optional): (tdate, tid) of the last tweet on the previous page
     """
     if len(keywords) == 0:
         return
 
     q = "select distinct t.tid, t.writer, t.tdate, t.text, t.replyto from tweets t " \
-        "full outer join mentions m on t.tid=m.tid where"
+        "full outer join mentions m on t.tid=m.tid where ("
     term_q = " m.term like '%%' || :%d || '%%'"
     text_q = " lower(t.text) like '%%' || :%d || '%%'"
     
@@ -366,33 +324,1253 @@ def match_tweet(curs, keywords, order):
             q += " or" + term_q % (i)
         else:
             q += " or" + text_q % (i)
-    q += " order by %s desc" % (order)
+    q += ")"
 
     terms = remove_hashtags(keywords)
+    if after is not None:
+        cond, values = keyset(after, len(terms) + 1)
+        q += cond
+        terms.extend(values)
+    q += " order by t.tdate desc, t.tid desc"
     curs.execute(q, terms)
 
-def match_name(curs, keyword):
-    """Matches users whose names contain the keyword
+def match_name(curs, keyword, after=None):
+    """Matches users whose names contain the keyword, shortest name first
 
     :param curs: cursor object
     :param keywords: input string (e.g. 'John', 'John Doe') 
+    :param after (optional): (name length, usr) of the last user on the previous page
     """
     if len(keyword) == 0:
         return
 
-    curs.execute("select * from users where lower(name) like '%%' || :1 || '%%' "
-        "order by length(trim(name))", [keyword])  
+    q = "select * from users where lower(name) like '%%' || :1 || '%%'"
+    binds = [keyword]
+    if after is not None:
+        q += " and (length(trim(name)) > :2 or (length(trim(name)) = :3 and usr > :4))"
+        binds.extend([after[0], after[0], after[1]])
+    curs.execute(q + " order by length(trim(name)), usr", binds)
 
-def match_city(curs, keyword):
-    """Matches users whose cities contain the keyword
+def match_city(curs, keyword, after=None):
+    """Matches users whose cities contain the keyword, shortest city first
 
     :param curs: cursor object
     :param keywords: input string (e.g. 'Edmonton', 'New York') 
+    :param after (optional): (city length, usr) of the last user on the previous page
     """
     if len(keyword) == 0:
         return
 
-    temp = [keyword, keyword] 
-    curs.execute("select * from users where lower(city) like '%%' || :1 || '%%' "
-        "and lower(name) not like '%%' || :2 || '%%' order by length(trim(city))", temp) 
+    q = ("select * from users where lower(city) like '%%' || :1 || '%%' "
+        "and lower(name) not like '%%' || :2 || '%%'")
+    binds = [keyword, keyword]
+    if after is not None:
+        q += " and (length(trim(city)) > :3 or (length(trim(city)) = :4 and usr > :5))"
+        binds.extend([after[0], after[0], after[1]])
+    curs.execute(q + " order by length(trim(city)), usr", binds)
+
+# --------------------------- BATCH SELECT QUERIES ---------------------------------
+
+# Oracle refuses IN lists longer than 1000 expressions
+MAX_IN_LIST = 1000
+
+def bind_list(count, start=1):
+    """ Returns a string of numbered bind variables for an IN list
+    (e.g. ':1,:2,:3')
+
+    :param count: number of bind variables
+    :param start (optional): number of the first bind variable
+    """
+    return ','.join(':%d' % (i) for i in range(start, start + count))
+
+def chunks(values, size=MAX_IN_LIST):
+    """ Splits a list of bind values into pieces that fit in an IN list
+
+    :param values: list of values
+    :param size (optional): maximum number of values per piece
+    """
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def in_list(values):
+    """ Pads a list of bind values to a power of two length by repeating the
+    last value, so that IN lists of similar length share one cached statement
+
+    :param values: non-empty list of values
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+    return values + [values[-1]] * (size - len(values))
+
+def get_names(curs, users):
+    """ Gets the names of several users at once
+    Returns a dictionary mapping user id to name
+
+    :param curs: cursor object
+    :param users: iterable of user ids
+    """
+    names = {}
+    for part in chunks(set(users)):
+        part = in_list(part)
+        curs.execute('select usr, name from users where usr in (%s)' 
+            % (bind_list(len(part))), part)
+        for row in curs.fetchall():
+            names[row[0]] = row[1].rstrip()
+    return names
+
+def get_users(curs, users):
+    """ Gets the rows of several users at once
+    Returns a dictionary mapping user id to its users row
+
+    :param curs: cursor object
+    :param users: iterable of user ids
+    """
+    rows = {}
+    for part in chunks(set(users)):
+        part = in_list(part)
+        curs.execute('select * from users where usr in (%s)' 
+            % (bind_list(len(part))), part)
+        for row in curs.fetchall():
+            rows[row[0]] = row
+    return rows
+
+def get_tweets(curs, tids):
+    """ Gets the rows of several tweets at once
+    Returns a dictionary mapping tweet id to its tweets row
+
+    :param curs: cursor object
+    :param tids: iterable of tweet ids
+    """
+    rows = {}
+    for part in chunks(set(tids)):
+        part = in_list(part)
+        curs.execute('select * from tweets where tid in (%s)' 
+            % (bind_list(len(part))), part)
+        for row in curs.fetchall():
+            rows[row[0]] = row
+    return rows
+
+def get_tweet_writers(curs, tids):
+    """ Gets the writer and text of several tweets at once
+    Returns a dictionary mapping tweet id to a (writer, text) tuple
+
+    :param curs: cursor object
+    :param tids: iterable of tweet ids
+    """
+    tweets = {}
+    for part in chunks(set(tids)):
+        part = in_list(part)
+        curs.execute('select tid, writer, text from tweets where tid in (%s)' 
+            % (bind_list(len(part))), part)
+        for row in curs.fetchall():
+            tweets[row[0]] = (row[1], row[2].rstrip())
+    return tweets
+
+def get_hashtags_for(curs, tids):
+    """ Gets the hashtags of several tweets at once
+    Returns a dictionary mapping tweet id to a list of terms
+
+    :param curs: cursor object
+    :param tids: iterable of tweet ids
+    """
+    terms = {}
+    for part in chunks(set(tids)):
+        part = in_list(part)
+        curs.execute('select tid, term from mentions where tid in (%s)' 
+            % (bind_list(len(part))), part)
+        for row in curs.fetchall():
+            terms.setdefault(row[0], []).append(row[1].rstrip())
+    return terms
+
+# ------------------------------ TIMELINE QUERIES ----------------------------------
+# The timeline table is an optional inbox holding one row per tweet that shows
+# up on a user's home screen. src is the followee the tweet arrived through:
+# the writer for tweets and the retweeter for retweets.
+
+def create_timeline(curs):
+    """ Create the timeline table and its index if they do not exist
+
+    :param curs: cursor object
+    """
+    if timeline_exists(curs):
+        return
+
+    curs.execute('create table timeline (usr int, tid int, src int, tdate date, '
+        'primary key (usr, tid, src), '
+        'foreign key (usr) references users, '
+        'foreign key (tid) references tweets, '
+        'foreign key (src) references users)')
+    curs.execute('create index timeline_page on timeline (usr, tdate, tid)')
+
+def timeline_exists(curs):
+    """ Return True if the timeline table has been created"""
+    curs.execute("select table_name from user_tables where table_name='TIMELINE'")
+    return curs.fetchone() is not None
+
+def fanout_tweet(curs, tid, writer, tdate):
+    """ Delivers a new tweet to the timelines of the writer's followers
 
+    :param curs: cursor object
+    :param tid: tweet id
+    :param writer: user id of the writer
+    :param tdate: tweet date
+    """
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select f.flwer, :1, :2, :3 from follows f where f.flwee = :4', 
+        [tid, writer, tdate, writer])
+
+def fanout_retweet(curs, usr, tid):
+    """ Delivers a retweet to the timelines of the retweeter's followers
+    Retweets of one's own tweet are already delivered as tweets
+
+    :param curs: cursor object
+    :param usr: user id of the retweeter
+    :param tid: tweet id
+    """
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select f.flwer, t.tid, :1, t.tdate from follows f, tweets t '
+        'where f.flwee = :2 and t.tid = :3 and t.writer <> :4', 
+        [usr, usr, tid, usr])
+
+def backfill_timeline(curs, flwer, flwee):
+    """ Delivers the existing tweets and retweets of a new followee
+
+    :param curs: cursor object
+    :param flwer: follower user id
+    :param flwee: followee user id
+    """
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select :1, t.tid, t.writer, t.tdate from tweets t where t.writer = :2', 
+        [flwer, flwee])
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select :1, t.tid, rt.usr, t.tdate from retweets rt, tweets t '
+        'where rt.usr = :2 and rt.tid = t.tid and t.writer <> rt.usr', 
+        [flwer, flwee])
+
+def fill_timeline(curs):
+    """ Fills the timeline table for every user from follows, tweets and retweets
+
+    :param curs: cursor object
+    """
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select f.flwer, t.tid, t.writer, t.tdate from follows f, tweets t '
+        'where f.flwee = t.writer')
+    curs.execute('insert into timeline(usr, tid, src, tdate) '
+        'select f.flwer, t.tid, rt.usr, t.tdate from follows f, retweets rt, tweets t '
+        'where f.flwee = rt.usr and rt.tid = t.tid and t.writer <> rt.usr')
+
+def timeline_tweets(curs, user, after=None):
+    """ Gets the tweets/retweets on the user's timeline
+    Same rows and order as follows_tweets, read from the timeline table
+
+    :param curs: cursor object
+    :param user: logged-in user id
+    :param after (optional): (tdate, tid) of the last tweet on the previous page
+    """
+    q = 'select t.tid, t.writer, t.tdate, t.text, t.replyto, tl.src ' \
+        'from timeline tl, tweets t where tl.usr = :1 and tl.tid = t.tid'
+    binds = [user]
+
+    if after is not None:
+        cond, values = keyset(after, 2, 'tl.tdate', 'tl.tid')
+        q += cond
+        binds.extend(values)
+    q += ' order by tl.tdate desc, tl.tid desc'
+    curs.execute(q, binds)
+
+# ---------------------------- SEARCH INDEX QUERIES --------------------------------
+# The search_terms table is an optional inverted index over tweets. Each row
+# maps a word (kind 'w') or hashtag (kind 'h') to a tweet that contains it.
+
+def create_search_index(curs):
+    """ Create the search_terms table and its index if they do not exist
+
+    :param curs: cursor object
+    """
+    if search_index_exists(curs):
+        return
+
+    curs.execute("create table search_terms (token varchar(80), kind char(1), tid int, "
+        "primary key (token, kind, tid), "
+        "foreign key (tid) references tweets)")
+    curs.execute("create index search_terms_tid on search_terms (tid)")
+
+def search_index_exists(curs):
+    """ Return True if the search_terms table has been created"""
+    curs.execute("select table_name from user_tables where table_name='SEARCH_TERMS'")
+    return curs.fetchone() is not None
+
+def tweet_tokens(tid, text, terms):
+    """ Returns the search_terms rows of a single tweet
+
+    :param tid: tweet id
+    :param text: tweet text
+    :param terms: list of hashtag terms of the tweet
+    """
+    rows = [[word, 'w', tid] for word in text_words(text)]
+    for term in set(terms):
+        rows.append([term.lower(), 'h', tid])
+    return rows
+
+def insert_search_terms(conn, rows):
+    """ Inserts rows into the search_terms table
+
+    :param conn: connection (not cursor object)
+    :param rows: list of token, kind, tid values
+    """
+    if len(rows) == 0:
+        return
+
+    cursInsert = conn.cursor()
+    cursInsert.executemany("insert into search_terms(token,kind,tid) "
+        "values(:1,:2,:3)", rows)
+    cursInsert.close()
+    conn.commit()
+
+def match_indexed(curs, keywords, after=None):
+    """Matches the candidate tweets for at least one keyword using the
+    search_terms index: hashtags must match a term and the words of other
+    keywords must match the words of the text (see word_patterns). Candidates
+    still have to be checked against the text, e.g. 'c-309' is a candidate
+    for any text with a word ending in 'c' and one starting with '309'
+    Ordered by tweet date
+
+    :param curs: cursor object
+    :param keywords: list of tokenized words
+    :param after (optional): (tdate, tid) of the last tweet on the previous page
+    """
+    term_q = "t.tid in (select s.tid from search_terms s where s.kind = 'h' and s.token = :%d)"
+    word_q = "t.tid in (select s.tid from search_terms s where s.kind = 'w' " \
+        "and s.token like :%d)"
+    conds = []
+    binds = []
+
+    for word in keywords:
+        if is_hashtag(word):
+            tokens = [(word[1:], term_q)]
+        else:
+            tokens = [(pattern, word_q) for pattern in word_patterns(word)]
+        if len(tokens) == 0:
+            # A keyword without words can match any text
+            conds.append("1 = 1")
+            continue
+
+        matches = []
+        for token, cond in tokens:
+            binds.append(token)
+            matches.append(cond % (len(binds)))
+        conds.append("(" + " and ".join(matches) + ")")
+
+    if len(conds) == 0:
+        conds.append("1 = 0")
+
+    q = "select t.tid, t.writer, t.tdate, t.text, t.replyto from tweets t " \
+        "where (%s)" % (" or ".join(conds))
+
+    if after is not None:
+        cond, values = keyset(after, len(binds) + 1)
+        q += cond
+        binds.extend(values)
+    q += " order by t.tdate desc, t.tid desc"
+    curs.execute(q, binds)
+
+# ----------------------------- USER SEARCH INDEX ----------------------------------
+# The user_grams table is an optional trigram index over user names (field 'n')
+# and cities (field 'c'). Each row maps a 3 character substring of the lowercase
+# name or city to a user that contains it.
+
+GRAM_LEN = 3
+
+# Most users per field checked by edit distance in a fuzzy search
+FUZZY_CANDIDATES = 200
+
+def create_user_grams(curs):
+    """ Create the user_grams table if it does not exist
+
+    :param curs: cursor object
+    """
+    if user_grams_exists(curs):
+        return
+
+    curs.execute("create table user_grams (gram varchar(3), field char(1), usr int, "
+        "primary key (gram, field, usr), "
+        "foreign key (usr) references users)")
+
+def user_grams_exists(curs):
+    """ Return True if the user_grams table has been created"""
+    curs.execute("select table_name from user_tables where table_name='USER_GRAMS'")
+    return curs.fetchone() is not None
+
+def grams(text):
+    """ Returns the distinct trigrams of a lowercase name, city or keyword
+
+    :param text: string
+    """
+    text = text.strip().lower()
+    return sorted(set(text[i:i + GRAM_LEN] for i in range(len(text) - GRAM_LEN + 1)))
+
+def user_grams(usr, name, city):
+    """ Returns the user_grams rows of a single user
+
+    :param usr: user id
+    :param name: user name
+    :param city: user city
+    """
+    rows = [[gram, 'n', usr] for gram in grams(name)]
+    rows.extend([gram, 'c', usr] for gram in grams(city))
+    return rows
+
+def insert_user_grams(conn, rows):
+    """ Inserts rows into the user_grams table
+
+    :param conn: connection (not cursor object)
+    :param rows: list of gram, field, usr values
+    """
+    if len(rows) == 0:
+        return
+
+    cursInsert = conn.cursor()
+    cursInsert.executemany("insert into user_grams(gram,field,usr) values(:1,:2,:3)", rows)
+    cursInsert.close()
+    conn.commit()
+
+def gram_candidates(keyword, field, start=1, min_count=None, shared=False):
+    """ Returns a subquery of the users having at least min_count of the 
+    keyword's trigrams in a field (default: all of them), and its bind values
+
+    :param keyword: lowercase keyword with at least one trigram
+    :param field: 'n' for names or 'c' for cities
+    :param start (optional): number of the first bind variable
+    :param min_count (optional): number of trigrams that must match
+    :param shared (optional): if True, also select the number of matching
+        trigrams of every user as 'shared'
+    """
+    # Any subset of the trigrams gives a superset of the matching users
+    values = grams(keyword)[:MAX_IN_LIST]
+    if min_count is None:
+        min_count = len(values)
+    values = in_list(values)
+
+    columns = "g.usr, count(*) as shared" if shared else "g.usr"
+    q = "select %s from user_grams g where g.field = '%s' and g.gram in (%s) " \
+        "group by g.usr having count(*) >= :%d" % (columns, field, 
+        bind_list(len(values), start), start + len(values))
+    return q, values + [min_count]
+
+def match_name_indexed(curs, keyword, after=None):
+    """Matches users whose names contain the keyword using the user_grams 
+    index. Same results and order as match_name
+
+    :param curs: cursor object
+    :param keyword: lowercase input string
+    :param after (optional): (name length, usr) of the last user on the previous page
+    """
+    if len(grams(keyword)) == 0:
+        return match_name(curs, keyword, after)
+
+    q, binds = gram_candidates(keyword, 'n')
+    binds.append(keyword)
+    q = "select * from users where usr in (%s) " \
+        "and lower(name) like '%%' || :%d || '%%'" % (q, len(binds))
+    if after is not None:
+        q += " and (length(trim(name)) > :%d or (length(trim(name)) = :%d and usr > :%d))" \
+            % (len(binds) + 1, len(binds) + 2, len(binds) + 3)
+        binds.extend([after[0], after[0], after[1]])
+    curs.execute(q + " order by length(trim(name)), usr", binds)
+
+def match_city_indexed(curs, keyword, after=None):
+    """Matches users whose cities but not names contain the keyword using 
+    the user_grams index. Same results and order as match_city
+
+    :param curs: cursor object
+    :param keyword: lowercase input string
+    :param after (optional): (city length, usr) of the last user on the previous page
+    """
+    if len(grams(keyword)) == 0:
+        return match_city(curs, keyword, after)
+
+    q, binds = gram_candidates(keyword, 'c')
+    binds.extend([keyword, keyword])
+    q = "select * from users where usr in (%s) " \
+        "and lower(city) like '%%' || :%d || '%%' " \
+        "and lower(name) not like '%%' || :%d || '%%'" % (q, len(binds) - 1, len(binds))
+    if after is not None:
+        q += " and (length(trim(city)) > :%d or (length(trim(city)) = :%d and usr > :%d))" \
+            % (len(binds) + 1, len(binds) + 2, len(binds) + 3)
+        binds.extend([after[0], after[0], after[1]])
+    curs.execute(q + " order by length(trim(city)), usr", binds)
+
+def match_users_fuzzy(curs, keyword, edits):
+    """Matches users whose name or city contains the keyword with at most
+    edits typos. Candidates sharing enough trigrams with the keyword come from
+    the user_grams index, most shared trigrams first, and at most
+    FUZZY_CANDIDATES of them per field are checked by edit distance
+    Returns the rows ordered by distance, names before cities, then length
+
+    :param curs: cursor object
+    :param keyword: lowercase input string
+    :param edits: maximum number of inserted, deleted or changed characters
+    """
+    # A substring within k edits still shares all but GRAM_LEN * k trigrams
+    min_count = min(len(grams(keyword)), MAX_IN_LIST) - GRAM_LEN * edits
+    if min_count < 1:
+        return []
+
+    matches = {}
+    for field, column in [('n', 2), ('c', 4)]:
+        q, binds = gram_candidates(keyword, field, min_count=min_count, shared=True)
+        curs.execute("select u.* from users u, (%s) c where u.usr = c.usr "
+            "order by c.shared desc, u.usr" % (q), binds)
+        for row in curs.fetchmany(FUZZY_CANDIDATES):
+            text = row[column].strip().lower()
+            distance = substring_distance(keyword, text)
+            if distance <= edits and row[0] not in matches:
+                matches[row[0]] = ((distance, column, len(text)), row)
+    return [row for key, row in sorted(matches.values(), key=lambda match: match[0])]
+
+# ---------------------------- HASHTAG CO-OCCURRENCE --------------------------------
+# The term_sets and term_posts tables are an optional index over mentions.
+# term_sets counts the tweets mentioning every set of up to MAX_SET_TERMS terms
+# (the posting count of single terms and the co-occurrence of larger sets), so
+# the similar tweet count of a tweet follows from the counts of the subsets of
+# its terms. term_posts lists the tweets of each term, newest first.
+# Once they exist, tweet_stats.sim_cnt is no longer kept up to date.
+
+MAX_SET_TERMS = 4
+
+# Newest tweets read per term when looking for related tweets
+RELATED_SCAN = 200
+
+def create_term_index(curs):
+    """ Create the term_sets and term_posts tables if they do not exist
+
+    :param curs: cursor object
+    """
+    if term_index_exists(curs):
+        return
+
+    curs.execute("create table term_sets (terms varchar(%d), cnt int, "
+        "primary key (terms))" % (11 * MAX_SET_TERMS - 1))
+    curs.execute("create table term_posts (term varchar(10), tdate date, tid int, "
+        "primary key (term, tdate, tid), "
+        "foreign key (tid) references tweets)")
+
+def term_index_exists(curs):
+    """ Return True if the term_sets table has been created"""
+    curs.execute("select table_name from user_tables where table_name='TERM_SETS'")
+    return curs.fetchone() is not None
+
+def term_subsets(terms):
+    """ Returns the term_sets keys of a tweet's terms: every set of up to
+    MAX_SET_TERMS terms, sorted and joined by spaces
+
+    :param terms: list of hashtag terms
+    """
+    terms = sorted(set(term.rstrip() for term in terms))
+    keys = []
+    for size in range(1, min(len(terms), MAX_SET_TERMS) + 1):
+        keys.extend(' '.join(subset) for subset in combinations(terms, size))
+    return keys
+
+def count_term_sets(curs, tweet_terms):
+    """ Counts the term sets of new tweets
+
+    :param curs: cursor object
+    :param tweet_terms: list with the list of terms of each new tweet
+    """
+    rows = [[key] for terms in tweet_terms for key in term_subsets(terms)]
+    if len(rows) == 0:
+        return
+
+    curs.executemany("insert into term_sets(terms, cnt) select :1, 0 from dual "
+        "where not exists (select * from term_sets where terms = :2)",
+        [[row[0], row[0]] for row in rows])
+    curs.executemany("update term_sets set cnt = cnt + 1 where terms = :1", rows)
+
+def insert_term_posts(curs, rows):
+    """ Inserts rows into the term_posts table
+
+    :param curs: cursor object
+    :param rows: list of term, tdate, tid values
+    """
+    if len(rows) > 0:
+        curs.executemany("insert into term_posts(term, tdate, tid) values(:1,:2,:3)", 
+            [[term.rstrip(), tdate, tid] for term, tdate, tid in rows])
+
+def similar_count(curs, tid, terms):
+    """ Returns the number of tweets (itself included) that mention one of a
+    tweet's terms, by inclusion-exclusion over the counts of its term sets
+    Tweets with more than MAX_SET_TERMS terms are counted from mentions
+
+    :param curs: cursor object
+    :param tid: tweet id
+    :param terms: list of the tweet's hashtag terms
+    """
+    if len(set(terms)) > MAX_SET_TERMS:
+        curs.execute("select count(distinct m2.tid) from mentions m, mentions m2 "
+            "where m.tid = :1 and m2.term = m.term", [tid])
+        return curs.fetchone()[0]
+
+    keys = term_subsets(terms)
+    if len(keys) == 0:
+        return 0
+    curs.execute("select terms, cnt from term_sets where terms in (%s)"
+        % (bind_list(len(keys))), keys)
+    return sum(cnt * (1 if len(key.split()) % 2 else -1) for key, cnt in curs.fetchall())
+
+def related_posts(curs, terms):
+    """ Gets the (term, tid, tdate) of the newest RELATED_SCAN tweets of 
+    every term from term_posts
+
+    :param curs: cursor object
+    :param terms: list of hashtag terms
+    """
+    rows = []
+    for term in sorted(set(term.rstrip() for term in terms)):
+        curs.execute("select term, tid, tdate from term_posts where term = :1 "
+            "order by tdate desc, tid desc", [term])
+        rows.extend(curs.fetchmany(RELATED_SCAN))
+    return rows
+
+def match_related(curs, tid):
+    """ Gets the (tid, tdate, shared terms) of the tweets sharing hashtags
+    with a tweet from the mentions table, most shared terms then newest first
+
+    :param curs: cursor object
+    :param tid: tweet id
+    """
+    curs.execute("select t.tid, t.tdate, count(*) from mentions m, mentions m2, tweets t "
+        "where m.tid = :1 and m2.term = m.term and m2.tid <> :2 and t.tid = m2.tid "
+        "group by t.tid, t.tdate order by count(*) desc, t.tdate desc, t.tid desc",
+        [tid, tid])
+
+# ----------------------------- TRENDING HASHTAGS ----------------------------------
+# The trend_counters table is optional and holds one bounded heavy-hitter
+# summary per day of tweet dates (see trending.py): at most a fixed number of
+# terms per day, each with its estimated count and the most it may be over.
+# Every day also has a trend_days row with its number of counters; sessions
+# lock it before reading the day's counters, so they update them one at a time.
+
+# Number of counters kept per day
+SKETCH_SIZE = 100
+
+def create_trend_counters(curs):
+    """ Create the trend_counters and trend_days tables if they do not exist
+
+    :param curs: cursor object
+    """
+    if not trend_counters_exists(curs):
+        curs.execute("create table trend_counters (bucket date, term varchar(10), "
+            "cnt int, err int, primary key (bucket, term))")
+
+    curs.execute("select table_name from user_tables where table_name='TREND_DAYS'")
+    if curs.fetchone() is None:
+        curs.execute("create table trend_days (bucket date, terms int, primary key (bucket), "
+            "check (terms between 0 and %d))" % (SKETCH_SIZE))
+
+def trend_counters_exists(curs):
+    """ Return True if the trend_counters table has been created"""
+    curs.execute("select table_name from user_tables where table_name='TREND_COUNTERS'")
+    return curs.fetchone() is not None
+
+def lock_trend_day(curs, bucket):
+    """ Locks the counters of one day until the caller commits, adding the 
+    day's trend_days row if it is missing
+    Returns True if the row was added
+
+    :param curs: cursor object
+    :param bucket: datetime of the start of the day
+    """
+    curs.execute("update trend_days set terms = terms where bucket = :1", [bucket])
+    if curs.rowcount > 0:
+        return False
+
+    try:
+        curs.execute("insert into trend_days(bucket, terms) values(:1, 0)", [bucket])
+    except DATABASE_ERRORS:
+        # Another session added the day first: wait for its lock
+        curs.execute("update trend_days set terms = terms where bucket = :1", [bucket])
+        return False
+    return True
+
+def get_trend_counters(curs, bucket):
+    """ Gets the (term, cnt, err) counters of one day
+
+    :param curs: cursor object
+    :param bucket: datetime of the start of the day
+    """
+    curs.execute("select term, cnt, err from trend_counters where bucket = :1", [bucket])
+
+def save_trend_counters(curs, bucket, removed, rows):
+    """ Replaces counters of one day locked by lock_trend_day
+    The day's number of counters is checked against SKETCH_SIZE
+
+    :param curs: cursor object
+    :param bucket: datetime of the start of the day
+    :param removed: list of terms whose counters are deleted or replaced
+    :param rows: list of term, cnt, err values to insert
+    """
+    if len(removed) > 0:
+        curs.executemany("delete from trend_counters where bucket = :1 and term = :2",
+            [[bucket, term] for term in removed])
+    if len(rows) > 0:
+        curs.executemany("insert into trend_counters(bucket,term,cnt,err) "
+            "values(:1,:2,:3,:4)", [[bucket] + list(row) for row in rows])
+    curs.execute("update trend_days set terms = (select count(*) from trend_counters "
+        "where bucket = :1) where bucket = :2", [bucket, bucket])
+
+def prune_trend_counters(curs, before):
+    """ Deletes the counters of the days before a date
+
+    :param curs: cursor object
+    :param before: datetime of the first day kept
+    """
+    curs.execute("delete from trend_counters where bucket < :1", [before])
+    curs.execute("delete from trend_days where bucket < :1", [before])
+
+def top_trends(curs, since, limit):
+    """ Gets the (term, cnt) of the most mentioned hashtags since a day
+
+    :param curs: cursor object
+    :param since: datetime of the first day counted
+    :param limit: number of terms returned
+    """
+    curs.execute("select term, sum(cnt) from trend_counters where bucket >= :1 "
+        "group by term order by sum(cnt) desc, term", [since])
+    return curs.fetchmany(limit)
+
+def mention_dates(curs, since):
+    """ Gets the (tdate, term) of every mention in the tweets since a date,
+    oldest first
+
+    :param curs: cursor object
+    :param since: datetime of the first day read
+    """
+    curs.execute("select t.tdate, m.term from tweets t, mentions m "
+        "where t.tid = m.tid and t.tdate >= :1 order by t.tdate", [since])
+
+# -------------------------------- SUGGESTIONS -------------------------------------
+# The suggestions table is optional and holds the precomputed "who to follow"
+# ranking of every user (see suggestions.py). Users whose ranking may be out of
+# date because of new follows, list members or hashtags are queued in
+# stale_suggestions until they are scored again.
+
+def create_suggestions(curs):
+    """ Create the suggestions and stale_suggestions tables if they do not exist
+
+    :param curs: cursor object
+    """
+    if suggestions_exists(curs):
+        return
+
+    curs.execute("create table suggestions (usr int, sugg int, score int, "
+        "friends int, tags int, lists int, "
+        "primary key (usr, sugg), "
+        "foreign key (usr) references users, "
+        "foreign key (sugg) references users)")
+    curs.execute("create table stale_suggestions (usr int, "
+        "primary key (usr), "
+        "foreign key (usr) references users)")
+
+def suggestions_exists(curs):
+    """ Return True if the suggestions table has been created"""
+    curs.execute("select table_name from user_tables where table_name='SUGGESTIONS'")
+    return curs.fetchone() is not None
+
+def get_suggestions(curs, user):
+    """ Gets the stored suggestions of a user, best first, skipping the
+    accounts the user followed since they were scored
+
+    :param curs: cursor object
+    :param user: user id
+    """
+    curs.execute("select s.sugg, s.score, s.friends, s.tags, s.lists from suggestions s "
+        "where s.usr = :1 and not exists (select * from follows f "
+        "where f.flwer = s.usr and f.flwee = s.sugg) "
+        "order by s.score desc, s.sugg", [user])
+
+def save_suggestions(conn, users, rows):
+    """ Replaces the suggestions of some users and takes them off the
+    stale queue
+
+    :param conn: connection (not cursor object)
+    :param users: list of user ids that were scored
+    :param rows: list of usr, sugg, score, friends, tags, lists values
+    """
+    curs = conn.cursor()
+    for part in chunks(users):
+        part = in_list(part)
+        binds = bind_list(len(part))
+        curs.execute("delete from suggestions where usr in (%s)" % (binds), part)
+        curs.execute("delete from stale_suggestions where usr in (%s)" % (binds), part)
+    if len(rows) > 0:
+        curs.executemany("insert into suggestions(usr,sugg,score,friends,tags,lists) "
+            "values(:1,:2,:3,:4,:5,:6)", rows)
+    curs.close()
+    conn.commit()
+
+def mark_stale(curs, users):
+    """ Queues users whose suggestions need to be scored again
+
+    :param curs: cursor object
+    :param users: iterable of user ids
+    """
+    rows = [[user, user] for user in set(users)]
+    if len(rows) > 0:
+        curs.executemany("insert into stale_suggestions(usr) select :1 from dual "
+            "where not exists (select * from stale_suggestions where usr = :2)", rows)
+
+def mark_followers_stale(curs, user):
+    """ Queues the followers of a user, whose friends-of-friends changed
+
+    :param curs: cursor object
+    :param user: user id
+    """
+    curs.execute("insert into stale_suggestions(usr) select f.flwer from follows f "
+        "where f.flwee = :1 and not exists "
+        "(select * from stale_suggestions s where s.usr = f.flwer)", [user])
+
+def get_stale(curs):
+    """ Gets the ids of the users queued in stale_suggestions"""
+    curs.execute("select usr from stale_suggestions order by usr")
+
+def all_user_terms(curs):
+    """ Gets the distinct (writer, term) pairs of every hashtag used
+
+    :param curs: cursor object
+    """
+    curs.execute("select distinct t.writer, m.term from tweets t, mentions m "
+        "where t.tid = m.tid order by m.term")
+
+def all_list_members(curs):
+    """ Gets the (lname, member) rows of every list
+
+    :param curs: cursor object
+    """
+    curs.execute("select lname, member from includes order by lname")
+
+def get_user_terms(curs, user):
+    """ Gets the distinct hashtags a user has used
+
+    :param curs: cursor object
+    :param user: user id
+    """
+    curs.execute("select distinct m.term from tweets t, mentions m "
+        "where t.tid = m.tid and t.writer = :1", [user])
+
+def get_term_users(curs, terms, max_users):
+    """ Gets the distinct (writer, term) pairs of some hashtags, skipping the
+    hashtags used by more than max_users users
+
+    :param curs: cursor object
+    :param terms: list of hashtag terms
+    :param max_users: largest number of users of a hashtag that is kept
+    """
+    rows = []
+    for part in chunks(terms):
+        part = in_list(part)
+        binds = bind_list(len(part))
+        curs.execute("select distinct t.writer, m.term from tweets t, mentions m "
+            "where t.tid = m.tid and m.term in (select m2.term from tweets t2, mentions m2 "
+            "where t2.tid = m2.tid and m2.term in (%s) group by m2.term "
+            "having count(distinct t2.writer) <= :%d)" % (binds, len(part) + 1),
+            part + [max_users])
+        rows.extend(curs.fetchall())
+    return rows
+
+def get_user_lists(curs, user):
+    """ Gets the names of the lists a user is a member of
+
+    :param curs: cursor object
+    :param user: user id
+    """
+    curs.execute("select lname from includes where member = :1", [user])
+
+def get_list_members(curs, lnames, max_users):
+    """ Gets the (lname, member) rows of some lists, skipping the lists with
+    more than max_users members
+
+    :param curs: cursor object
+    :param lnames: list of list names
+    :param max_users: largest number of members of a list that is kept
+    """
+    rows = []
+    for part in chunks(lnames):
+        part = in_list(part)
+        binds = bind_list(len(part))
+        curs.execute("select lname, member from includes where lname in "
+            "(select lname from includes where lname in (%s) group by lname "
+            "having count(*) <= :%d)" % (binds, len(part) + 1), part + [max_users])
+        rows.extend(curs.fetchall())
+    return rows
+
+# ----------------------------- SECONDARY INDEXES ----------------------------------
+# Indexes on the foreign key columns of the tables in table.sql that the
+# screens and the counter tables look rows up by. Bulk loads drop them and
+# build them after the rows are loaded (see dump.py), which is much faster
+# than maintaining them during the load.
+
+# (index name, table and columns)
+INDEXES = [
+    ('mentions_term', 'mentions (term)'),
+    ('follows_flwee', 'follows (flwee)'),
+    ('tweets_writer', 'tweets (writer, tdate)'),
+    ('tweets_replyto', 'tweets (replyto)'),
+    ('retweets_tid', 'retweets (tid)'),
+    ('includes_member', 'includes (member)')
+]
+
+def create_indexes(conn):
+    """ Create the secondary indexes that do not exist
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    for name, columns in INDEXES:
+        curs.execute("select index_name from user_indexes where index_name = :1", 
+            [name.upper()])
+        if curs.fetchone() is None:
+            curs.execute("create index %s on %s" % (name, columns))
+    curs.close()
+    conn.commit()
+
+def drop_indexes(conn):
+    """ Drop the secondary indexes that exist, before a bulk load
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    for name, columns in INDEXES:
+        curs.execute("select index_name from user_indexes where index_name = :1", 
+            [name.upper()])
+        if curs.fetchone() is not None:
+            curs.execute("drop index %s" % (name))
+    curs.close()
+    conn.commit()
+
+# ------------------------------- ID ALLOCATION ------------------------------------
+# The id_blocks table holds the next free id of each table. Sessions reserve
+# blocks of ids from it (see allocator.py) instead of scanning the table.
+
+# Table name -> id column for every table that gets ids from id_blocks
+ID_COLUMNS = {'tweets': 'tid', 'users': 'usr'}
+
+def create_id_blocks(conn):
+    """ Create the id_blocks table if it does not exist and add a row for
+    every table in ID_COLUMNS that does not have one yet
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    curs.execute("select table_name from user_tables where table_name='ID_BLOCKS'")
+    if curs.fetchone() is None:
+        curs.execute("create table id_blocks (name varchar(20), next_id int, "
+            "primary key (name))")
+
+    curs.execute("select name from id_blocks")
+    existing = [row[0] for row in curs.fetchall()]
+
+    for table, column in ID_COLUMNS.items():
+        if table not in existing:
+            curs.execute("insert into id_blocks(name, next_id) "
+                "select :1, nvl(max(%s), 0) + 1 from %s" % (column, table), [table])
+    curs.close()
+    conn.commit()
+
+def reserve_ids(conn, table, size):
+    """ Reserves a block of consecutive ids for a table
+    The update locks the table's row until the caller commits, so concurrent 
+    sessions always get disjoint blocks
+    Returns the first and last reserved id
+
+    :param conn: connection (not cursor object)
+    :param table: a table name from ID_COLUMNS
+    :param size: number of ids to reserve
+    """
+    curs = conn.cursor()
+    curs.execute("update id_blocks set next_id = next_id + :1 where name = :2", 
+        [size, table])
+    curs.execute("select next_id from id_blocks where name = :1", [table])
+    next_id = curs.fetchone()[0]
+    curs.close()
+
+    return (next_id - size, next_id - 1)
+
+def reseed_id_blocks(conn):
+    """ Moves the next id of every table in ID_COLUMNS past the largest id
+    in the table, after a bulk load inserted ids without reserving them
+
+    :param conn: connection (not cursor object)
+    """
+    create_id_blocks(conn)
+    curs = conn.cursor()
+    for table, column in ID_COLUMNS.items():
+        largest = "(select nvl(max(%s), 0) + 1 from %s)" % (column, table)
+        curs.execute("update id_blocks set next_id = %s where name = :1 and next_id < %s"
+            % (largest, largest), [table])
+    curs.close()
+    conn.commit()
+
+# ------------------------------ TWEET STATISTICS ----------------------------------
+# The tweet_stats table holds the tStat counters of every tweet. The unit of 
+# work keeps it up to date, and fill_tweet_stats recomputes it in bulk.
+
+def create_tweet_stats(conn):
+    """ Create and fill the tweet_stats table if it does not exist
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    curs.execute("select table_name from user_tables where table_name='TWEET_STATS'")
+    if curs.fetchone() is None:
+        curs.execute('create table tweet_stats (tid int, rep_cnt int, ret_cnt int, '
+            'sim_cnt int, primary key (tid), foreign key (tid) references tweets)')
+        fill_tweet_stats(curs)
+    curs.close()
+    conn.commit()
+
+def fill_tweet_stats(curs):
+    """ Computes the counters of every tweet into an empty tweet_stats table
+
+    :param curs: cursor object
+    """
+    curs.execute('insert into tweet_stats(tid, rep_cnt, ret_cnt, sim_cnt) '
+        'select t.tid, '
+        '(select count(*) from tweets r where r.replyto = t.tid), '
+        '(select count(*) from retweets rt where rt.tid = t.tid), 0 '
+        'from tweets t')
+    fill_similar_counts(curs)
+
+def mention_groups(curs):
+    """ Yields the tid and list of terms of every tweet with hashtags
+
+    :param curs: cursor object
+    """
+    curs.execute("select tid, term from mentions order by tid")
+    tid, terms = None, []
+    while True:
+        rows = curs.fetchmany(MAX_IN_LIST)
+        if len(rows) == 0:
+            break
+        for row_tid, term in rows:
+            if row_tid != tid:
+                if tid is not None:
+                    yield tid, terms
+                tid, terms = row_tid, []
+            terms.append(term.rstrip())
+    if tid is not None:
+        yield tid, terms
+
+def fill_set_keys(curs):
+    """ Writes the term_sets keys of every tweet with hashtags to the
+    set_keys work table, creating it if needed, with the sign of each key
+    for inclusion-exclusion (+1 for odd sets, -1 for even ones, 0 for every
+    key of a tweet with more than MAX_SET_TERMS terms). The rows are
+    written in batches, so memory does not grow with the number of
+    distinct term sets; the database groups them
+
+    :param curs: cursor object
+    """
+    curs.execute("select table_name from user_tables where table_name='SET_KEYS'")
+    if curs.fetchone() is None:
+        curs.execute("create table set_keys (tid int, terms varchar(%d), sgn int)" 
+            % (11 * MAX_SET_TERMS - 1))
+        curs.execute("create index set_keys_terms on set_keys (terms)")
+    insert = curs.connection.cursor()
+    insert.execute("delete from set_keys")
+
+    rows = []
+    for tid, terms in mention_groups(curs):
+        exact = len(set(terms)) <= MAX_SET_TERMS
+        for key in term_subsets(terms):
+            sgn = (1 if len(key.split()) % 2 else -1) if exact else 0
+            rows.append([tid, key, sgn])
+        if len(rows) >= MAX_IN_LIST:
+            insert.executemany("insert into set_keys(tid, terms, sgn) values(:1,:2,:3)", rows)
+            rows = []
+    if len(rows) > 0:
+        insert.executemany("insert into set_keys(tid, terms, sgn) values(:1,:2,:3)", rows)
+    insert.close()
+
+def similar_counts(curs):
+    """ Yields the tid and similar tweet count of every tweet with hashtags,
+    computed by inclusion-exclusion over the counts of its term sets (see
+    term_subsets), which takes one pass over mentions instead of joining it
+    with itself. The term sets are counted by the database in the set_keys
+    work table (see fill_set_keys), which is emptied afterwards
+
+    :param curs: cursor object
+    """
+    fill_set_keys(curs)
+    curs.execute("select k.tid, sum(k.sgn * c.cnt) from set_keys k, "
+        "(select terms, count(*) as cnt from set_keys group by terms) c "
+        "where k.terms = c.terms group by k.tid having min(abs(k.sgn)) = 1")
+    while True:
+        rows = curs.fetchmany(MAX_IN_LIST)
+        if len(rows) == 0:
+            break
+        for tid, sim in rows:
+            yield tid, sim
+
+    # Tweets with more than MAX_SET_TERMS terms are counted from mentions
+    other = curs.connection.cursor()
+    curs.execute("select distinct tid from set_keys where sgn = 0")
+    while True:
+        rows = curs.fetchmany(MAX_IN_LIST)
+        if len(rows) == 0:
+            break
+        for row in rows:
+            other.execute("select count(distinct m2.tid) from mentions m, mentions m2 "
+                "where m.tid = :1 and m2.term = m.term", [row[0]])
+            yield row[0], other.fetchone()[0]
+    other.execute("delete from set_keys")
+    other.close()
+
+def fill_similar_counts(curs):
+    """ Computes the similar tweet count of every tweet with hashtags into
+    tweet_stats (see similar_counts)
+
+    :param curs: cursor object
+    """
+    update = curs.connection.cursor()
+    rows = []
+    for tid, sim in similar_counts(curs):
+        rows.append([sim, tid])
+        if len(rows) == MAX_IN_LIST:
+            update.executemany('update tweet_stats set sim_cnt = :1 where tid = :2', rows)
+            rows = []
+    if len(rows) > 0:
+        update.executemany('update tweet_stats set sim_cnt = :1 where tid = :2', rows)
+    update.close()
+
+def count_tweets(curs, tweets):
+    """ Adds the counters of new tweets and counts them as replies
+
+    :param curs: cursor object
+    :param tweets: list of tid, writer, tdate, text, replyto values
+    """
+    curs.executemany('insert into tweet_stats(tid, rep_cnt, ret_cnt, sim_cnt) '
+        'values(:1, 0, 0, 0)', [[tweet[0]] for tweet in tweets])
+
+    replies = [[tweet[4]] for tweet in tweets if tweet[4] is not None]
+    if len(replies) > 0:
+        curs.executemany('update tweet_stats set rep_cnt = rep_cnt + 1 where tid = :1', 
+            replies)
+
+def count_retweets(curs, tids):
+    """ Counts new retweets of tweets
+
+    :param curs: cursor object
+    :param tids: list of retweeted tweet ids
+    """
+    curs.executemany('update tweet_stats set ret_cnt = ret_cnt + 1 where tid = :1', 
+        [[tid] for tid in tids])
+
+def count_mentions(curs, tids):
+    """ Updates the similar tweet counts after the mentions of new tweets 
+    have been inserted
+
+    :param curs: cursor object
+    :param tids: list of new tweet ids with hashtags
+    """
+    binds = [[tid, tid] for tid in tids]
+    curs.executemany('update tweet_stats set sim_cnt = sim_cnt + 1 where tid in '
+        '(select m2.tid from mentions m, mentions m2 '
+        'where m.tid = :1 and m2.term = m.term and m2.tid <> :2)', binds)
+    curs.executemany('update tweet_stats set sim_cnt = '
+        '(select count(distinct m2.tid) from mentions m, mentions m2 '
+        'where m.tid = :1 and m2.term = m.term) where tid = :2', binds)
+
+def tweet_stats_drift(curs, sim=True):
+    """ Compares tweet_stats with the tStat view
+    Returns rows of tid, expected counters and stored counters (None if the
+    tweet has no tweet_stats row) for every tweet whose counters differ
+
+    :param curs: cursor object
+    :param sim (optional): if False, ignore the similar tweet counts (they
+        come from the term_sets index)
+    """
+    q = ('select v.tid, v.rep_cnt, v.ret_cnt, v.sim_cnt, '
+        's.rep_cnt, s.ret_cnt, s.sim_cnt '
+        'from tStat v left outer join tweet_stats s on v.tid = s.tid '
+        'where s.tid is null or v.rep_cnt <> s.rep_cnt '
+        'or v.ret_cnt <> s.ret_cnt')
+    if sim:
+        q += ' or v.sim_cnt <> s.sim_cnt'
+    curs.execute(q)
+    return curs.fetchall()
+
+# ------------------------------- USER STATISTICS ----------------------------------
+# The user_stats table holds the uStat counters of every user: the number of
+# users they follow (flwee_cnt), their followers (flwer_cnt) and tweets (tw_cnt)
+
+def create_user_stats(conn):
+    """ Create and fill the user_stats table if it does not exist
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    curs.execute("select table_name from user_tables where table_name='USER_STATS'")
+    if curs.fetchone() is None:
+        curs.execute('create table user_stats (usr int, flwee_cnt int, flwer_cnt int, '
+            'tw_cnt int, primary key (usr), foreign key (usr) references users)')
+        fill_user_stats(curs)
+    curs.close()
+    conn.commit()
+
+def fill_user_stats(curs):
+    """ Computes the counters of every user into an empty user_stats table
+
+    :param curs: cursor object
+    """
+    curs.execute('insert into user_stats(usr, flwee_cnt, flwer_cnt, tw_cnt) '
+        'select u.usr, '
+        '(select count(*) from follows f where f.flwer = u.usr), '
+        '(select count(*) from follows f where f.flwee = u.usr), '
+        '(select count(*) from tweets t where t.writer = u.usr) '
+        'from users u')
+
+def count_users(curs, users):
+    """ Adds the counters of new users
+
+    :param curs: cursor object
+    :param users: list of new user ids
+    """
+    curs.executemany('insert into user_stats(usr, flwee_cnt, flwer_cnt, tw_cnt) '
+        'values(:1, 0, 0, 0)', [[usr] for usr in users])
+
+def count_follows(curs, follows):
+    """ Counts new follow relationships for both users
+
+    :param curs: cursor object
+    :param follows: list of flwer, flwee, start_date values
+    """
+    curs.executemany('update user_stats set flwee_cnt = flwee_cnt + 1 where usr = :1', 
+        [[follow[0]] for follow in follows])
+    curs.executemany('update user_stats set flwer_cnt = flwer_cnt + 1 where usr = :1', 
+        [[follow[1]] for follow in follows])
+
+def count_writers(curs, writers):
+    """ Counts new tweets for their writers
+
+    :param curs: cursor object
+    :param writers: list of writer ids, one per new tweet
+    """
+    curs.executemany('update user_stats set tw_cnt = tw_cnt + 1 where usr = :1', 
+        [[writer] for writer in writers])
+
+def user_stats_drift(curs):
+    """ Compares user_stats with the uStat view
+    Returns rows of usr, expected counters and stored counters (None if the
+    user has no user_stats row) for every user whose counters differ
+
+    :param curs: cursor object
+    """
+    curs.execute('select v.usr, v.flwer_cnt, v.flwee_cnt, v.tw_cnt, '
+        's.flwee_cnt, s.flwer_cnt, s.tw_cnt '
+        'from uStat v left outer join user_stats s on v.usr = s.usr '
+        'where s.usr is null or v.flwer_cnt <> s.flwee_cnt '
+        'or v.flwee_cnt <> s.flwer_cnt or v.tw_cnt <> s.tw_cnt')
+    return curs.fetchall()
@@ -0,0 +1,58 @@
+import sys
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+
+"""
+Maintenance command for the optional tweet search index
+
+Usage:
+python search_index.py rebuild   creates and fills the search_terms table
+"""
+
+# Number of tweets tokenized per insert batch
+BATCH_SIZE = 1000
+
+def rebuild_search_index(conn):
+    """Creates the search_terms table if needed and refills it from the 
+    tweets and mentions tables
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migration(conn, 'search_terms')
+    curs = conn.cursor()
+    curs.execute("delete from search_terms")
+    curs.execute("insert into search_terms(token,kind,tid) "
+        "select distinct trim(term), 'h', tid from mentions")
+    conn.commit()
+
+    curs.execute("select tid, text from tweets")
+    while True:
+        rows = curs.fetchmany(BATCH_SIZE)
+        if len(rows) == 0:
+            break
+
+        tokens = []
+        for tid, text in rows:
+            tokens.extend(tweet_tokens(tid, text, []))
+        insert_search_terms(conn, tokens)
+    curs.close()
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) != 1 or args[0] != 'rebuild':
+        print("Usage: python search_index.py rebuild [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    rebuild_search_index(conn)
+    print("Search index rebuilt.")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+import os
+import sys
+import json
+import mmap
+import heapq
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from utils import is_hashtag
+from queries import mention_groups, similar_counts
+from backends import split_args, open_database
+from follow_graph import Adjacency, FollowGraph, fetch_rows
+from dump import EPOCH, little_endian
+
+"""
+Read-only snapshots of the data for browsing without a database. A snapshot
+directory holds one file per column of fixed-width little-endian values
+(64-bit integers, and doubles for the time zones) and, for text columns, an
+offsets file and a blob of UTF-8 bytes. Tweets are stored in (tdate, tid)
+order, so the position of a tweet is its place in the home and search
+ordering; lists of tweets are lists of positions.
+
+The follow graph, the tweets of each writer, the retweets of each user and
+the tweets of each hashtag are stored as compressed sparse row arrays (see
+follow_graph.Adjacency). Opening a snapshot only maps the files: values are
+read straight from the mapped pages when a screen needs them.
+
+Usage:
+python snapshot.py build DIR [--sqlite PATH]   writes a snapshot of the database
+python main.py --snapshot DIR                  browses a snapshot
+"""
+
+VERSION = 1
+
+# Integer, float and text columns of the users (by id) and the tweets (by
+# tdate, tid). Null reply ids are stored as NO_TWEET
+USER_COLUMNS = ['users.usr']
+USER_FLOATS = ['users.timezone']
+USER_TEXTS = ['users.pwd', 'users.name', 'users.email', 'users.city']
+TWEET_COLUMNS = ['tweets.tid', 'tweets.writer', 'tweets.tdate', 'tweets.replyto',
+    'tweets.rep_cnt', 'tweets.ret_cnt', 'tweets.sim_cnt']
+TWEET_TEXTS = ['tweets.text', 'terms']
+NO_TWEET = -1
+
+# Tweet ids in id order with their positions, for looking tweets up by id
+INDEX_COLUMNS = ['tids.sorted', 'tids.pos']
+
+# Sparse adjacency arrays: followees by follower, followers by followee
+# (newest first), tweet positions by writer and by retweeting user
+ADJACENCIES = ['follows', 'followers', 'writes', 'retweets']
+
+# Dense adjacency arrays: tweet positions by term number and term numbers by
+# tweet position
+POSTINGS = [('term_posts', 'pos'), ('tweet_terms', 'idx')]
+
+def column_files():
+    """Returns the (file name, typecode) of every file of a snapshot"""
+    files = [(name, 'q') for name in USER_COLUMNS + TWEET_COLUMNS + INDEX_COLUMNS]
+    files.extend((name, 'd') for name in USER_FLOATS)
+    for name in USER_TEXTS + TWEET_TEXTS:
+        files.extend([(name + '.off', 'q'), (name + '.txt', 'B')])
+    for name in ADJACENCIES:
+        files.extend((name + part, 'q') for part in ['.nodes', '.offsets', '.targets'])
+    for name, targets in POSTINGS:
+        files.extend([(name + '.off', 'q'), (name + '.' + targets, 'q')])
+    return files
+
+def split_snapshot_args(args):
+    """Removes the --snapshot DIR option from a list of command line arguments
+    Returns the remaining arguments and the directory (None if not given)
+    """
+    if '--snapshot' not in args:
+        return args, None
+
+    i = args.index('--snapshot')
+    if i + 1 >= len(args):
+        print("--snapshot needs a snapshot directory.")
+        sys.exit(1)
+    return args[:i] + args[i + 2:], args[i + 1]
+
+# ------------------------------------ BUILD ---------------------------------------
+
+def write_array(directory, name, values):
+    """Writes an array to DIR/<name> as little-endian values"""
+    with open(os.path.join(directory, name), 'wb') as f:
+        little_endian(values).tofile(f)
+
+def write_texts(directory, name, values):
+    """Writes text values to DIR/<name>.txt and their start offsets (plus the
+    end of the last value) to DIR/<name>.off
+    """
+    offsets = array('q', [0])
+    with open(os.path.join(directory, name + '.txt'), 'wb') as f:
+        for value in values:
+            data = ('' if value is None else value.rstrip()).encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    write_array(directory, name + '.off', offsets)
+
+def write_adjacency(directory, name, adjacency):
+    """Writes the three arrays of an Adjacency object"""
+    write_array(directory, name + '.nodes', adjacency.nodes)
+    write_array(directory, name + '.offsets', adjacency.offsets)
+    write_array(directory, name + '.targets', adjacency.targets)
+
+def group_positions(pairs, count=None):
+    """Groups (key, position) pairs by key, positions in ascending order
+
+    :param pairs: list of (key, position) pairs
+    :param count (optional): if given, the keys are 0..count-1 and dense
+        (offsets, positions) arrays are returned instead of an Adjacency
+    """
+    pairs.sort()
+    if count is None:
+        adjacency = Adjacency()
+        for key, pos in pairs:
+            adjacency.append(key, pos)
+        return adjacency
+
+    offsets = array('q', [0] * (count + 1))
+    for key, pos in pairs:
+        offsets[key + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    return offsets, array('q', [pos for key, pos in pairs])
+
+def build_snapshot(conn, directory):
+    """Writes a snapshot of the users, tweets, follows, retweets and hashtags
+    of a database
+    Returns the number of users and tweets
+
+    :param conn: connection (not cursor object)
+    :param directory: snapshot directory (created if needed)
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    curs = conn.cursor()
+
+    curs.execute("select usr, pwd, name, email, city, timezone from users order by usr")
+    users = list(fetch_rows(curs))
+    write_array(directory, 'users.usr', array('q', [row[0] for row in users]))
+    write_array(directory, 'users.timezone', array('d', [row[5] or 0.0 for row in users]))
+    for i, name in enumerate(USER_TEXTS):
+        write_texts(directory, name, [row[i + 1] for row in users])
+    user_count = len(users)
+    users = None
+
+    curs.execute("select tid, writer, tdate, text, replyto from tweets order by tdate, tid")
+    tids, writers, dates, replies = array('q'), array('q'), array('q'), array('q')
+    texts = []
+    for tid, writer, tdate, text, replyto in fetch_rows(curs):
+        tids.append(tid)
+        writers.append(writer)
+        dates.append(int((tdate - EPOCH).total_seconds()))
+        texts.append(text)
+        replies.append(NO_TWEET if replyto is None else replyto)
+    write_texts(directory, 'tweets.text', texts)
+    texts = None
+
+    count = len(tids)
+    order = sorted(range(count), key=tids.__getitem__)
+    sorted_tids = array('q', [tids[pos] for pos in order])
+
+    def position(tid):
+        i = bisect_left(sorted_tids, tid)
+        return order[i] if i < count and sorted_tids[i] == tid else NO_TWEET
+
+    rep_cnt = array('q', [0] * count)
+    for replyto in replies:
+        if replyto != NO_TWEET and position(replyto) != NO_TWEET:
+            rep_cnt[position(replyto)] += 1
+
+    ret_cnt = array('q', [0] * count)
+    curs.execute("select usr, tid from retweets")
+    retweets = []
+    for usr, tid in fetch_rows(curs):
+        pos = position(tid)
+        if pos != NO_TWEET:
+            retweets.append((usr, pos))
+            ret_cnt[pos] += 1
+
+    sim_cnt = array('q', [0] * count)
+    for tid, sim in similar_counts(curs):
+        sim_cnt[position(tid)] = sim
+
+    term_pairs = []
+    for tid, terms in mention_groups(curs):
+        term_pairs.extend((term, position(tid)) for term in set(terms))
+    terms = sorted(set(term for term, pos in term_pairs))
+    numbers = dict((term, i) for i, term in enumerate(terms))
+    term_pairs = [(numbers[term], pos) for term, pos in term_pairs]
+    write_texts(directory, 'terms', terms)
+
+    for name, values in [('tweets.tid', tids), ('tweets.writer', writers),
+            ('tweets.tdate', dates), ('tweets.replyto', replies), ('tweets.rep_cnt', rep_cnt),
+            ('tweets.ret_cnt', ret_cnt), ('tweets.sim_cnt', sim_cnt),
+            ('tids.sorted', sorted_tids), ('tids.pos', array('q', order))]:
+        write_array(directory, name, values)
+
+    write_adjacency(directory, 'writes', group_positions([(writers[pos], pos)
+        for pos in range(count)]))
+    write_adjacency(directory, 'retweets', group_positions(retweets))
+    for name, pairs, size in [('term_posts', term_pairs, len(terms)),
+            ('tweet_terms', [(pos, number) for number, pos in term_pairs], count)]:
+        offsets, targets = group_positions(pairs, size)
+        write_array(directory, name + '.off', offsets)
+        write_array(directory, name + '.' + dict(POSTINGS)[name], targets)
+
+    graph = FollowGraph()
+    graph.load(curs)
+    write_adjacency(directory, 'follows', graph.forward)
+    write_adjacency(directory, 'followers', graph.reverse)
+    curs.close()
+
+    meta = {'version': VERSION, 'built': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'users': user_count, 'tweets': count, 'files': column_files()}
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return user_count, count
+
+# ------------------------------------- READ ---------------------------------------
+
+def map_file(path, typecode):
+    """Maps a file read-only and returns a memoryview of its values"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(array(typecode))
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return view if typecode == 'B' else view.cast(typecode)
+
+class TextColumn:
+
+    def __init__(self, offsets, blob):
+        """Text values stored back to back in a blob
+
+        :param offsets: start offset of every value, then the end of the last
+        :param blob: UTF-8 bytes of the values
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class ResultSet:
+
+    def __init__(self, rows):
+        """Cursor-like reader of the rows a snapshot query yields, so that
+        fetch_page can page through them
+
+        :param rows: iterator of rows
+        """
+        self.rows = rows
+
+    def fetchone(self):
+        return next(self.rows, None)
+
+    def fetchmany(self, size):
+        return [row for i, row in zip(range(size), self.rows)]
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class Snapshot:
+
+    def __init__(self, directory):
+        """Maps the files of a snapshot built by build_snapshot
+
+        :param directory: snapshot directory
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != VERSION:
+            raise ValueError("%s is a version %s snapshot, expected %d"
+                % (directory, self.meta['version'], VERSION))
+        if sys.byteorder != 'little':
+            raise ValueError("Snapshots can only be mapped on little-endian machines")
+
+        files = dict((name, map_file(os.path.join(directory, name), typecode))
+            for name, typecode in self.meta['files'])
+        self.columns = files
+        for name in USER_TEXTS + TWEET_TEXTS:
+            self.columns[name] = TextColumn(files[name + '.off'], files[name + '.txt'])
+        self.adjacency = {}
+        for name in ADJACENCIES:
+            adjacency = Adjacency()
+            adjacency.nodes = files[name + '.nodes']
+            adjacency.offsets = files[name + '.offsets']
+            adjacency.targets = files[name + '.targets']
+            self.adjacency[name] = adjacency
+        self.graph = None
+
+    def column(self, name):
+        return self.columns[name]
+
+    # ---- users ----
+
+    def user_position(self, user):
+        """Returns the position of a user id or -1"""
+        usrs = self.column('users.usr')
+        i = bisect_left(usrs, user)
+        return i if i < len(usrs) and usrs[i] == user else -1
+
+    def user_row(self, i):
+        """Returns the users row of the user at a position"""
+        return (self.column('users.usr')[i], self.column('users.pwd')[i],
+            self.column('users.name')[i], self.column('users.email')[i],
+            self.column('users.city')[i], self.column('users.timezone')[i])
+
+    def find_user(self, username, password):
+        """Returns the users row of a user if the password matches, else None"""
+        i = self.user_position(username)
+        if i < 0 or self.column('users.pwd')[i] != password:
+            return None
+        return self.user_row(i)
+
+    def get_users(self, users):
+        """Returns a dictionary mapping user id to its users row"""
+        positions = [(user, self.user_position(user)) for user in set(users)]
+        return dict((user, self.user_row(i)) for user, i in positions if i >= 0)
+
+    def get_names(self, users):
+        """Returns a dictionary mapping user id to name"""
+        names = self.column('users.name')
+        positions = [(user, self.user_position(user)) for user in set(users)]
+        return dict((user, names[i]) for user, i in positions if i >= 0)
+
+    def user_stats(self, user):
+        """Returns the followee, follower and tweet counts of a user"""
+        return (self.adjacency['follows'].degree(user),
+            self.adjacency['followers'].degree(user), self.adjacency['writes'].degree(user))
+
+    def match_users(self, keyword):
+        """Returns the rows of the users whose names contain the keyword by
+        length of name, then of the other users whose cities contain it by
+        length of city (see match_name and match_city)
+        """
+        names, cities = self.column('users.name'), self.column('users.city')
+        by_name, by_city = [], []
+        for i in range(len(names)):
+            name = names[i]
+            if keyword in name.lower():
+                by_name.append((len(name), i))
+            elif keyword in cities[i].lower():
+                by_city.append((len(cities[i]), i))
+        return [self.user_row(i) for length, i in sorted(by_name) + sorted(by_city)]
+
+    def follow_graph(self):
+        """Returns a FollowGraph reading the mapped follow arrays"""
+        if self.graph is None:
+            self.graph = FollowGraph()
+            self.graph.forward = self.adjacency['follows']
+            self.graph.reverse = self.adjacency['followers']
+        return self.graph
+
+    # ---- tweets ----
+
+    def tweet_position(self, tid):
+        """Returns the position of a tweet id or -1"""
+        tids = self.column('tids.sorted')
+        i = bisect_left(tids, tid)
+        return self.column('tids.pos')[i] if i < len(tids) and tids[i] == tid else -1
+
+    def tweet_row(self, pos, rt_user=None):
+        """Returns the (tid, writer, tdate, text, replyto, rt_user) row of the
+        tweet at a position
+        """
+        replyto = self.column('tweets.replyto')[pos]
+        return (self.column('tweets.tid')[pos], self.column('tweets.writer')[pos],
+            EPOCH + timedelta(seconds=self.column('tweets.tdate')[pos]),
+            self.column('tweets.text')[pos], None if replyto == NO_TWEET else replyto, rt_user)
+
+    def tweet_terms(self, pos):
+        """Returns the hashtags of the tweet at a position"""
+        offsets, terms = self.column('tweet_terms.off'), self.column('terms')
+        numbers = self.column('tweet_terms.idx')[offsets[pos]:offsets[pos + 1]]
+        return [terms[number] for number in numbers]
+
+    def term_postings(self, term):
+        """Returns the positions of the tweets mentioning a hashtag, oldest first"""
+        terms = self.column('terms')
+        lo, hi = 0, len(terms)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if terms[mid] < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(terms) or terms[lo] != term:
+            return []
+        offsets = self.column('term_posts.off')
+        return self.column('term_posts.pos')[offsets[lo]:offsets[lo + 1]]
+
+    def tweet_stats(self, tid):
+        """Returns the reply, retweet and similar tweet counts of a tweet"""
+        pos = self.tweet_position(tid)
+        if pos < 0:
+            return (0, 0, 0)
+        return (self.column('tweets.rep_cnt')[pos], self.column('tweets.ret_cnt')[pos],
+            self.column('tweets.sim_cnt')[pos])
+
+    def tweet_details(self, rows):
+        """Returns the writer names, hashtags and reply info of tweet rows in
+        the form of tweet.get_tweet_details
+        """
+        writers, texts = self.column('tweets.writer'), self.column('tweets.text')
+        details = {}
+        for row in rows:
+            pos = self.tweet_position(row[0])
+            info = {'writer_name': self.get_names([row[1]]).get(row[1]),
+                'terms': self.tweet_terms(pos) if pos >= 0 else []}
+            reply = -1 if row[4] is None else self.tweet_position(row[4])
+            if reply >= 0:
+                info['reply_user'] = writers[reply]
+                info['reply_name'] = self.get_names([writers[reply]]).get(writers[reply])
+                info['reply_text'] = texts[reply]
+            if len(row) > 5 and row[5] is not None:
+                info['rt_name'] = self.get_names([row[5]]).get(row[5])
+            details[row[0]] = info
+        return details
+
+    def newest(self, positions, after):
+        """Yields tweet positions in ascending order newest first, starting
+        after a page boundary
+
+        :param positions: ascending tweet positions
+        :param after: (tdate, tid) of the last tweet on the previous page or None
+        """
+        hi = len(positions)
+        if after is not None:
+            hi = bisect_left(positions, self.tweet_position(after[1]), 0, hi)
+        for i in range(hi - 1, -1, -1):
+            yield positions[i]
+
+    def rows(self, entries):
+        """Yields the rows of (position, rt_user) entries"""
+        for pos, rt_user in entries:
+            yield self.tweet_row(pos, rt_user)
+
+    def follows_tweets(self, user, after=None):
+        """Returns the tweets written or retweeted by the users a user follows,
+        newest first (see follows_tweets)
+        """
+        writer_lists = []
+        writes = self.adjacency['writes']
+        for flwee in self.follow_graph().following(user):
+            writer_lists.append((pos, None) for pos in self.newest(writes.neighbours(flwee), after))
+            writer_lists.append(self.retweet_entries(flwee, after))
+        entries = heapq.merge(*writer_lists, key=lambda entry: entry[0], reverse=True)
+        return ResultSet(self.rows(entries))
+
+    def retweet_entries(self, user, after=None):
+        """Yields the (position, user) entries of the tweets of others that a
+        user retweeted, newest first
+        """
+        writers = self.column('tweets.writer')
+        for pos in self.newest(self.adjacency['retweets'].neighbours(user), after):
+            if writers[pos] != user:
+                yield pos, user
+
+    def user_tweets(self, user, after=None):
+        """Returns the tweets of a user, newest first"""
+        positions = self.newest(self.adjacency['writes'].neighbours(user), after)
+        return ResultSet(self.rows((pos, None) for pos in positions))
+
+    def match_tweet(self, keywords, after=None):
+        """Returns the tweets that mention a hashtag keyword or contain a word
+        keyword, newest first (see match_tweet)
+        """
+        hashtags = [word.replace('#', '') for word in keywords if is_hashtag(word)]
+        words = [word for word in keywords if not is_hashtag(word)]
+
+        if len(words) == 0:
+            postings = [self.newest(self.term_postings(term), after) for term in set(hashtags)]
+            positions = distinct(heapq.merge(*postings, reverse=True))
+        else:
+            texts = self.column('tweets.text')
+            positions = (pos for pos in self.newest(range(len(texts)), after)
+                if any(word in texts[pos].lower() for word in words) or
+                any(term in hashtags for term in self.tweet_terms(pos)))
+        return ResultSet(self.rows((pos, None) for pos in positions))
+
+def distinct(positions):
+    """Yields sorted positions without repeats"""
+    last = None
+    for pos in positions:
+        if pos != last:
+            yield pos
+        last = pos
+
+def open_snapshot(directory):
+    """Maps a snapshot directory
+    Returns None if it is not a valid snapshot
+    """
+    try:
+        return Snapshot(directory)
+    except (IOError, OSError, ValueError, KeyError) as e:
+        print("Unable to open snapshot %s: %s" % (directory, e))
+        return None
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) != 2 or args[0] != 'build':
+        print("Usage: python snapshot.py build DIR [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    users, tweets = build_snapshot(conn, args[1])
+    print("Snapshot of %d user(s) and %d tweet(s) written to %s." % (users, tweets, args[1]))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import sys
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migrations
+
+"""
+Maintenance commands for the counter tables
+
+Usage:
+python stats.py rebuild   recomputes tweet_stats and user_stats in bulk
+python stats.py check     compares tweet_stats and user_stats with the tStat
+                          and uStat views
+"""
+
+def rebuild_tweet_stats(conn):
+    """Recomputes every counter in the tweet_stats table
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    curs.execute("delete from tweet_stats")
+    fill_tweet_stats(curs)
+    curs.close()
+    conn.commit()
+
+def rebuild_user_stats(conn):
+    """Recomputes every counter in the user_stats table
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    curs.execute("delete from user_stats")
+    fill_user_stats(curs)
+    curs.close()
+    conn.commit()
+
+def check_tweet_stats(conn, sim=True):
+    """Prints every tweet whose stored counters differ from tStat
+    Returns the number of such tweets
+
+    :param conn: connection (not cursor object)
+    :param sim (optional): if False, skip the similar tweet counts
+    """
+    curs = conn.cursor()
+    rows = tweet_stats_drift(curs, sim)
+    curs.close()
+
+    for row in rows:
+        print("Tweet %d: expected %s, stored %s" % (row[0], row[1:4], row[4:7]))
+    return len(rows)
+
+def check_user_stats(conn):
+    """Prints every user whose stored counters differ from uStat
+    Returns the number of such users
+
+    :param conn: connection (not cursor object)
+    """
+    curs = conn.cursor()
+    rows = user_stats_drift(curs)
+    curs.close()
+
+    for row in rows:
+        print("User %d: expected %s, stored %s" % (row[0], row[1:4], row[4:7]))
+    return len(rows)
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) != 1 or args[0] not in ['rebuild', 'check']:
+        print("Usage: python stats.py rebuild | check [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    schema = apply_migrations(conn)
+    if args[0] == 'rebuild':
+        rebuild_tweet_stats(conn)
+        rebuild_user_stats(conn)
+        print("Counters rebuilt.")
+    else:
+        # With the term_sets index, similar counts are checked by term_index.py
+        drift = check_tweet_stats(conn, sim='term_sets' not in schema)
+        print("%d tweet(s) with wrong counters." % (drift))
+        drift = check_user_stats(conn)
+        print("%d user(s) with wrong counters." % (drift))
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import os
+import sys
+import heapq
+import multiprocessing
+from array import array
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+from follow_graph import FollowGraph, fetch_rows
+
+"""
+"Who to follow" suggestions. Accounts are ranked for a user by the number of
+users they follow that follow the account (friends-of-friends), the number of
+hashtags both have used and the number of lists both are members of.
+
+The suggestions table is optional. Once it exists, a follow refreshes the
+follower's suggestions at once and queues the followers of the follower (whose
+friends-of-friends changed) in stale_suggestions, as well as every member of a
+list a member was added to or removed from and every user of the hashtags of
+a new tweet (hashtags and lists with more than MAX_GROUP users are ignored
+by scoring, so they queue nobody); the refresh command scores the queued
+users again. Without the table the screen scores the user when it is opened.
+
+Usage:
+python suggestions.py rebuild [--jobs N]   creates the tables and scores every user
+python suggestions.py refresh [--jobs N]   scores the users queued as stale
+"""
+
+# Number of suggestions stored per user
+SUGGESTIONS = 20
+
+# Score of each follow, hashtag and list shared with a suggested account
+FRIEND_WEIGHT = 3
+LIST_WEIGHT = 2
+TAG_WEIGHT = 1
+
+# Hashtags and lists with more users than this are ignored: they say little
+# about a user and would make scoring quadratic in their size
+MAX_GROUP = 1000
+
+# Number of users scored per task sent to a worker process
+CHUNK_SIZE = 500
+
+# Number of tasks per worker whose results are held before being written
+TASKS_PER_JOB = 4
+
+class Profiles:
+
+    def __init__(self, graph):
+        """Follow graph, hashtags and lists of the users being scored
+
+        :param graph: FollowGraph object
+        """
+        self.graph = graph
+        self.tags = {}
+        self.tag_users = {}
+        self.lists = {}
+        self.list_members = {}
+
+    def add_groups(self, rows, groups, members):
+        """Adds the users of hashtags or lists, skipping the large ones
+
+        :param rows: (key, user) pairs grouped by key
+        :param groups: dictionary mapping user to the keys of its groups
+        :param members: dictionary mapping key to the users of the group
+        """
+        key, users = None, array('q')
+        for row_key, user in rows:
+            if row_key != key:
+                self.add_group(key, users, groups, members)
+                key, users = row_key, array('q')
+            users.append(user)
+        self.add_group(key, users, groups, members)
+
+    def add_group(self, key, users, groups, members):
+        if key is None or len(users) > MAX_GROUP:
+            return
+        members[key] = users
+        for user in users:
+            groups.setdefault(user, []).append(key)
+
+    def load(self, curs):
+        """Loads the hashtags and lists of every user
+
+        :param curs: cursor object
+        """
+        all_user_terms(curs)
+        rows = ((term, writer) for writer, term in fetch_rows(curs))
+        self.add_groups(rows, self.tags, self.tag_users)
+
+        all_list_members(curs)
+        self.add_groups(fetch_rows(curs), self.lists, self.list_members)
+        return self
+
+    def load_user(self, curs, user):
+        """Loads only the hashtags and lists shared with a single user
+
+        :param curs: cursor object
+        :param user: user id
+        """
+        get_user_terms(curs, user)
+        terms = [row[0] for row in curs.fetchall()]
+        rows = sorted((term, writer) for writer, term in get_term_users(curs, terms, MAX_GROUP))
+        self.add_groups(rows, self.tags, self.tag_users)
+
+        get_user_lists(curs, user)
+        lnames = [row[0] for row in curs.fetchall()]
+        rows = sorted(get_list_members(curs, lnames, MAX_GROUP))
+        self.add_groups(rows, self.lists, self.list_members)
+        return self
+
+def count_shared(keys, members):
+    """Returns a dictionary mapping user to the number of groups shared
+
+    :param keys: keys of a user's groups
+    :param members: dictionary mapping key to the users of the group
+    """
+    counts = {}
+    for key in keys:
+        for other in members.get(key, ()):
+            counts[other] = counts.get(other, 0) + 1
+    return counts
+
+def score_user(profiles, user, limit=SUGGESTIONS):
+    """Returns the best suggestions for a user, best first, as
+    (usr, sugg, score, friends, tags, lists) rows
+
+    :param profiles: Profiles object
+    :param user: user id
+    :param limit (optional): number of suggestions kept
+    """
+    graph = profiles.graph
+    friends = {}
+    for flwee in graph.following(user):
+        for other in graph.following(flwee):
+            friends[other] = friends.get(other, 0) + 1
+    tags = count_shared(profiles.tags.get(user, ()), profiles.tag_users)
+    lists = count_shared(profiles.lists.get(user, ()), profiles.list_members)
+
+    rows = []
+    for other in set(friends).union(tags, lists):
+        if other == user or graph.follows(user, other):
+            continue
+        f, t, l = friends.get(other, 0), tags.get(other, 0), lists.get(other, 0)
+        score = FRIEND_WEIGHT * f + TAG_WEIGHT * t + LIST_WEIGHT * l
+        rows.append((user, other, score, f, t, l))
+    return heapq.nsmallest(limit, rows, key=lambda row: (-row[2], row[1]))
+
+# Profiles shared with the worker processes, which are forked after it is set
+PROFILES = None
+
+def score_chunk(users):
+    """Scores a chunk of users in a worker process
+    Returns the users and their suggestion rows
+    """
+    rows = []
+    for user in users:
+        rows.extend(score_user(PROFILES, user))
+    return users, rows
+
+def score_users(conn, profiles, users, jobs=1):
+    """Scores users and saves their suggestions, one commit per chunk
+
+    :param conn: connection (not cursor object)
+    :param profiles: Profiles object
+    :param users: list of user ids
+    :param jobs (optional): number of worker processes
+    """
+    global PROFILES
+    PROFILES = profiles
+    parts = list(chunks(users, CHUNK_SIZE))
+
+    # Workers read the profiles inherited from the parent, so they need fork
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for part in parts:
+            save_suggestions(conn, *score_chunk(part))
+        return
+
+    with multiprocessing.get_context('fork').Pool(jobs) as pool:
+        wave = jobs * TASKS_PER_JOB
+        for i in range(0, len(parts), wave):
+            for part, rows in pool.imap_unordered(score_chunk, parts[i:i + wave]):
+                save_suggestions(conn, part, rows)
+
+def load_profiles(conn):
+    """Loads the follow graph, hashtags and lists of every user"""
+    curs = conn.cursor()
+    graph = FollowGraph()
+    graph.load(curs)
+    profiles = Profiles(graph).load(curs)
+    curs.close()
+    return profiles
+
+def rebuild_suggestions(conn, jobs=1):
+    """Creates the suggestions tables if needed and scores every user
+
+    :param conn: connection (not cursor object)
+    :param jobs (optional): number of worker processes
+    """
+    apply_migration(conn, 'suggestions')
+    curs = conn.cursor()
+    curs.execute("delete from suggestions")
+    conn.commit()
+
+    select(curs, 'users')
+    users = [row[0] for row in fetch_rows(curs)]
+    curs.close()
+    score_users(conn, load_profiles(conn), users, jobs)
+    return len(users)
+
+def refresh_suggestions(conn, jobs=1):
+    """Scores the users queued in stale_suggestions
+
+    :param conn: connection (not cursor object)
+    :param jobs (optional): number of worker processes
+    """
+    curs = conn.cursor()
+    get_stale(curs)
+    users = [row[0] for row in fetch_rows(curs)]
+    curs.close()
+
+    if len(users) > 0:
+        score_users(conn, load_profiles(conn), users, jobs)
+    return len(users)
+
+def refresh_user(conn, user):
+    """Scores a single user again from the follows, hashtags and lists it
+    shares with others and saves the suggestions
+
+    :param conn: connection (not cursor object)
+    :param user: user id
+    """
+    curs = conn.cursor()
+    graph = FollowGraph().load_user(curs, user)
+    profiles = Profiles(graph).load_user(curs, user)
+    curs.close()
+    save_suggestions(conn, [user], score_user(profiles, user))
+
+def user_suggestions(session):
+    """Returns the logged in user's suggestions as (sugg, score, friends,
+    tags, lists) rows, best first, skipping the accounts followed since they
+    were scored
+
+    :param session: Twitter object
+    """
+    curs = session.get_curs()
+    user = session.get_username()
+
+    if session.use_suggestions():
+        get_suggestions(curs, user)
+        return curs.fetchall()
+
+    profiles = Profiles(session.follow_graph()).load_user(curs, user)
+    return [row[1:] for row in score_user(profiles, user)]
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    jobs = os.cpu_count() or 1
+    if '--jobs' in args:
+        i = args.index('--jobs')
+        jobs = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+
+    if len(args) != 1 or args[0] not in ['rebuild', 'refresh']:
+        print("Usage: python suggestions.py rebuild | refresh [--jobs N] [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    if args[0] == 'rebuild':
+        count = rebuild_suggestions(conn, jobs)
+    else:
+        count = refresh_suggestions(conn, jobs)
+    print("Suggestions scored for %d user(s)." % (count))
+    conn.close()
+
+if __name__ == "__main__":
+    main()
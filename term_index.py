@@ -0,0 +1,88 @@
+import sys
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+
+"""
+Maintenance commands for the optional hashtag co-occurrence index
+
+Usage:
+python term_index.py rebuild          creates and fills the term_sets and term_posts tables
+python term_index.py check [tid ...]  compares the similar tweet counts with mentions
+"""
+
+def rebuild_term_index(conn):
+    """Creates the term_sets and term_posts tables if needed and refills
+    them from the mentions table
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migration(conn, 'term_sets')
+    curs = conn.cursor()
+    curs.execute("delete from term_posts")
+    curs.execute("delete from term_sets")
+    curs.execute("insert into term_posts(term, tdate, tid) "
+        "select distinct rtrim(m.term), t.tdate, t.tid from mentions m, tweets t "
+        "where m.tid = t.tid")
+
+    # The database counts the term sets (see fill_set_keys)
+    fill_set_keys(curs)
+    curs.execute("insert into term_sets(terms, cnt) "
+        "select terms, count(*) from set_keys group by terms")
+    curs.execute("delete from set_keys")
+    curs.execute("select count(*) from term_sets")
+    count = curs.fetchone()[0]
+    curs.close()
+    conn.commit()
+    return count
+
+def check_term_index(conn, tids=None):
+    """Compares the similar tweet count of tweets with the mentions table
+    Returns a dictionary mapping tweet id to the (expected, indexed) counts
+    of every tweet whose count is wrong
+
+    :param conn: connection (not cursor object)
+    :param tids (optional): list of tweet ids to check (default: all tweets)
+    """
+    curs = conn.cursor()
+    if tids is None:
+        select(curs, 'tweets')
+        tids = [row[0] for row in curs.fetchall()]
+
+    problems = {}
+    for tid in tids:
+        curs.execute("select count(distinct m2.tid) from mentions m, mentions m2 "
+            "where m.tid = :1 and m2.term = m.term", [tid])
+        expected = curs.fetchone()[0]
+        indexed = similar_count(curs, tid, get_hashtags(curs, tid))
+        if expected != indexed:
+            problems[tid] = (expected, indexed)
+    curs.close()
+    return problems
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) < 1 or args[0] not in ['rebuild', 'check']:
+        print("Usage: python term_index.py rebuild | check [tid ...] [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    if args[0] == 'rebuild':
+        count = rebuild_term_index(conn)
+        print("Term index rebuilt with %d term set(s)." % (count))
+    else:
+        tids = [int(tid) for tid in args[1:]] or None
+        problems = check_term_index(conn, tids)
+        for tid, (expected, indexed) in sorted(problems.items()):
+            print("Tweet %d: expected %d, indexed %d" % (tid, expected, indexed))
+        print("%d tweet(s) with wrong similar counts." % (len(problems)))
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
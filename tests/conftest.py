@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SQLiteBackend
+from main import Twitter
+
+"""
+Fixtures shared by the tests: a throwaway SQLite database loaded from
+table.sql and data.sql, and a session logged in on it
+"""
+
+@pytest.fixture
+def conn():
+    backend = SQLiteBackend(':memory:')
+    conn = backend.connect()
+    backend.load(conn)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def session(conn):
+    twitter = Twitter(conn)
+    curs = twitter.get_curs()
+    curs.execute("select flwer from follows group by flwer order by count(*) desc, flwer")
+    twitter.username = curs.fetchone()[0]
+    return twitter
@@ -0,0 +1,42 @@
+import pytest
+
+from allocator import IdAllocator
+from backends import SQLiteBackend
+from migrations import apply_migrations
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'ids.db'))
+    conn = backend.connect()
+    backend.load(conn)
+    apply_migrations(conn)
+    conn.close()
+    return backend
+
+def test_sessions_get_disjoint_ids(backend):
+    first = IdAllocator(backend.connect(), 'tweets', block_size=3, connect=backend.connect)
+    second = IdAllocator(backend.connect(), 'tweets', block_size=3, connect=backend.connect)
+    ids = [first.next_id() for i in range(5)] + [second.next_id() for i in range(5)]
+    ids += [first.next_id() for i in range(5)]
+    assert len(set(ids)) == len(ids)
+    first.close()
+    second.close()
+
+def test_blocks_are_committed_at_once(backend):
+    conn = backend.connect()
+    other = backend.connect()
+    allocator = IdAllocator(conn, 'users', block_size=1)
+    new_id = allocator.next_id()
+
+    # The id_blocks row is not left locked by the session
+    other.execute("update id_blocks set next_id = next_id where name = 'users'")
+    other.commit()
+    assert IdAllocator(other, 'users', block_size=1).next_id() == new_id + 1
+
+def test_pending_writes_are_not_committed(backend):
+    conn = backend.connect()
+    conn.execute("update users set city = city")
+    allocator = IdAllocator(conn, 'tweets')
+    with pytest.raises(RuntimeError):
+        allocator.next_id()
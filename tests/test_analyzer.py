@@ -0,0 +1,90 @@
+import pytest
+
+from analyzer import analyze, split_text, substring_distance, text_words
+
+TEXTS = [
+    "",
+    "short",
+    "Great game tonight #oilers #hockey",
+    "#start of a tweet and the #end",
+    "No hashtags, just words: 42 of them!",
+    "A very long tweet that goes on and on past the width of a single row of text",
+    "averyveryveryverylongwordwithoutanyspacesthatkeepsgoingpastthewidthofarow and more",
+    "Trailing hash # and #_underscore and #UPPER case",
+    "Ünïcödé #Café straße",
+    "word " * 20,
+]
+
+def reference_split(text, max_width=65):
+    """split_text as written before the analyzer"""
+    space_index = -1
+    text = text + " "
+    text1 = text
+    text2 = ""
+
+    if len(text) > max_width:
+        space_index = text.find(' ', max_width - 5)
+
+    if space_index >= max_width:
+        i = max_width
+        while text[i] != ' ':
+            i -= 1
+        space_index = i
+
+    if space_index > 0:
+        text1 = text[:space_index]
+        text2 = text[space_index + 1:]
+    return (text1, text2)
+
+def reference_terms(text):
+    """Tweet.set_terms as written before the analyzer"""
+    terms = []
+    for index, ch in enumerate(text):
+        if ch != '#' or index + 1 >= len(text):
+            continue
+        i = index
+        while i < len(text) - 1 and text[i + 1].isalnum():
+            i += 1
+        term = text[index + 1:i + 1].lower()
+        if len(term) > 0 and term not in terms:
+            terms.append(term)
+    return terms
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('width', [20, 65, 70])
+def test_split_text_matches_reference(text, width):
+    assert split_text(text, max_width=width) == reference_split(text, width)
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_hashtags_match_reference(text):
+    assert analyze(text).hashtags == reference_terms(text)
+
+def test_nohash_and_words():
+    analysis = analyze("Go #Oilers go, GO!")
+    assert analysis.nohash == "go  go, go!"
+    assert analysis.hashtags == ['oilers']
+    assert text_words("Go #Oilers go, GO!") == ['go']
+
+def test_lowering_that_changes_length():
+    # 'İ' lowers to two characters, shifting every offset after it
+    analysis = analyze("İstanbul #trip photos")
+    assert analysis.hashtags == ['trip']
+    assert analysis.nohash == "i̇stanbul  photos"
+
+@pytest.mark.parametrize('pattern, text, distance', [
+    ('edmonton', 'edmonton', 0),
+    ('edmontom', 'south edmonton', 1),
+    ('calgari', 'calgary', 1),
+    ('abc', 'xyz', 3),
+])
+def test_substring_distance(pattern, text, distance):
+    assert substring_distance(pattern, text) == distance
+
+def test_sample_tweets_match_reference(conn):
+    curs = conn.cursor()
+    curs.execute("select text from tweets")
+    for text, in curs.fetchall():
+        text = text.rstrip()
+        assert analyze(text).hashtags == reference_terms(text)
+        for width in [65, 70]:
+            assert split_text(text, max_width=width) == reference_split(text, width)
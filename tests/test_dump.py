@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+import dump
+from backends import SQLiteBackend, SCRIPTS
+from dump import TABLES, encode_column, decode_column, export_dump, import_dump
+from migrations import apply_migrations
+from queries import ID_COLUMNS
+
+
+@pytest.mark.parametrize('kind, values', [
+    ('int', [1, None, -5, 2 ** 40]),
+    ('float', [-7.0, None, 5.5]),
+    ('date', [datetime(2016, 3, 12, 17, 0, 1), None, datetime(1969, 12, 31)]),
+    ('str', ['plain', None, '', 'padded   ', 'Ünïcödé #tag']),
+])
+def test_column_round_trip(kind, values):
+    data = b'prefix' + encode_column(values, kind)
+    decoded, offset = decode_column(data, len(b'prefix'), len(values), kind)
+    assert offset == len(data)
+    if kind == 'str':
+        values = [None if value is None else value.rstrip() for value in values]
+    assert decoded == values
+
+def table_rows(conn, table, columns):
+    curs = conn.cursor()
+    curs.execute("select %s from %s" % (', '.join(name for name, kind in columns), table))
+    return sorted(tuple(value.rstrip() if isinstance(value, str) else value for value in row)
+        for row in curs.fetchall())
+
+def derived(conn):
+    """The counter tables that import refills"""
+    curs = conn.cursor()
+    curs.execute("select * from tweet_stats")
+    tweet_stats = sorted(curs.fetchall())
+    curs.execute("select * from user_stats")
+    user_stats = sorted(curs.fetchall())
+    return tweet_stats, user_stats
+
+def empty_schema():
+    backend = SQLiteBackend(':memory:')
+    conn = backend.connect()
+    backend.load(conn, SCRIPTS[:1])
+    return conn
+
+@pytest.mark.parametrize('migrated', [False, True])
+def test_export_import_round_trip(conn, tmp_path, monkeypatch, migrated):
+    # Small blocks and batches so that every table spans several of them
+    monkeypatch.setattr(dump, 'BLOCK_ROWS', 16)
+    apply_migrations(conn)
+    counts = export_dump(conn, str(tmp_path))
+
+    target = empty_schema()
+    if migrated:
+        apply_migrations(target)
+    loaded, stale = import_dump(target, str(tmp_path), batch=10, commit=25)
+    assert loaded == counts
+    assert stale == []
+
+    for table, columns, key in TABLES:
+        assert table_rows(target, table, columns) == table_rows(conn, table, columns)
+    assert derived(target) == derived(conn)
+
+    # New ids start after the loaded ones
+    curs = target.cursor()
+    for table, column in ID_COLUMNS.items():
+        curs.execute("select max(%s) from %s" % (column, table))
+        largest = curs.fetchone()[0]
+        curs.execute("select next_id from id_blocks where name = :1", [table])
+        assert curs.fetchone()[0] > largest
+
+    # Every index dropped for the load is built again
+    curs.execute("select index_name from user_indexes")
+    target_indexes = set(row[0] for row in curs.fetchall())
+    curs = conn.cursor()
+    curs.execute("select index_name from user_indexes")
+    assert set(row[0] for row in curs.fetchall()) <= target_indexes
+    target.close()
@@ -0,0 +1,44 @@
+import io
+from contextlib import redirect_stdout
+
+from entity_cache import EntityCache
+from tweet import Tweet, hydrate_tweets
+
+
+def test_cards_are_built_once_per_layout():
+    cache = EntityCache()
+    built = []
+
+    def build(lines):
+        built.append(lines)
+        return lines
+
+    assert cache.get_card(('tweet', 1), (0, 65), lambda: build(['one'])) == ['one']
+    assert cache.get_card(('tweet', 1), (0, 65), lambda: build(['again'])) == ['one']
+    assert cache.get_card(('tweet', 1), (1, 65), lambda: build(['two'])) == ['two']
+    assert cache.get_card(('user', 1), (0,), lambda: build(['user'])) == ['user']
+    assert built == [['one'], ['two'], ['user']]
+
+def test_writes_drop_cards():
+    cache = EntityCache()
+    cache.get_card(('tweet', 1), (0, 65), lambda: ['old'])
+    cache.get_card(('user', 1), (0,), lambda: ['old'])
+    cache.invalidate_tweet(1)
+    cache.invalidate_user(1)
+    assert cache.get_card(('tweet', 1), (0, 65), lambda: ['new']) == ['new']
+    assert cache.get_card(('user', 1), (0,), lambda: ['new']) == ['new']
+
+def test_tweets_share_cards(session, monkeypatch):
+    curs = session.get_curs()
+    curs.execute("select tid, writer, tdate, text, replyto from tweets order by tid")
+    rows = curs.fetchall()[:3]
+    built = []
+    card = Tweet.card
+    monkeypatch.setattr(Tweet, 'card', lambda tweet, *args: built.append(tweet.tid()) or 
+        card(tweet, *args))
+
+    with redirect_stdout(io.StringIO()):
+        for tweets in [hydrate_tweets(session, rows), hydrate_tweets(session, rows)]:
+            for i, tweet in enumerate(tweets):
+                tweet.display(index=i)
+    assert built == [row[0] for row in rows]
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pytest
+
+import follow_graph
+from follow_graph import Adjacency, FollowGraph
+
+
+def test_adjacency():
+    adjacency = Adjacency()
+    for node, target in [(1, 2), (1, 5), (1, 9), (4, 1), (7, 3), (7, 8)]:
+        adjacency.append(node, target)
+
+    assert list(adjacency.neighbours(1)) == [2, 5, 9]
+    assert list(adjacency.neighbours(3)) == []
+    assert adjacency.degree(7) == 2
+    assert adjacency.degree(8) == 0
+    assert adjacency.contains(1, 5) and adjacency.contains(7, 8)
+    assert not adjacency.contains(1, 6) and not adjacency.contains(4, 2)
+    assert not adjacency.contains(2, 1)
+    assert len(adjacency) == 6
+
+def graph_from(conn):
+    graph = FollowGraph()
+    graph.load(conn.cursor())
+    return graph
+
+def follows_of(conn):
+    curs = conn.cursor()
+    curs.execute("select flwer, flwee from follows")
+    return curs.fetchall()
+
+def check_graph(graph, conn):
+    """Compares every lookup of the graph with the follows table"""
+    curs = conn.cursor()
+    rows = follows_of(conn)
+    users = set(user for row in rows for user in row)
+    for user in users:
+        following = sorted(flwee for flwer, flwee in rows if flwer == user)
+        curs.execute("select flwer from follows where flwee = :1 "
+            "order by start_date desc, flwer", [user])
+        followers = [row[0] for row in curs.fetchall()]
+        assert graph.following(user) == following
+        assert graph.followers(user) == followers
+        assert graph.following_count(user) == len(following)
+        assert graph.follower_count(user) == len(followers)
+    for flwer, flwee in rows:
+        assert graph.follows(flwer, flwee)
+
+def test_load_matches_table(conn):
+    check_graph(graph_from(conn), conn)
+
+def add_follows(conn, graph, count):
+    """Writes new follows, newer than any loaded one, and applies them to
+    the graph. Returns the follows added
+    """
+    rows = set(follows_of(conn))
+    curs = conn.cursor()
+    curs.execute("select usr from users order by usr")
+    users = [row[0] for row in curs.fetchall()]
+    added = []
+    for flwer in users:
+        for flwee in users[::7]:
+            if len(added) == count:
+                return added
+            if flwer != flwee and (flwer, flwee) not in rows:
+                date = datetime(2030, 1, 1, 0, 0, len(added) % 60, len(added))
+                curs.execute("insert into follows(flwer, flwee, start_date) "
+                    "values(:1, :2, :3)", [flwer, flwee, date])
+                graph.add_follow(flwer, flwee)
+                added.append((flwer, flwee))
+    return added
+
+def test_deltas_match_table(conn):
+    graph = graph_from(conn)
+    added = add_follows(conn, graph, 30)
+    assert graph.new_count == len(added)
+    check_graph(graph, conn)
+
+    # A follow applied twice is kept once
+    graph.add_follow(*added[0])
+    assert graph.new_count == len(added)
+
+def test_compact_keeps_lookups(conn, monkeypatch):
+    monkeypatch.setattr(follow_graph, 'COMPACT_AFTER', 10)
+    graph = graph_from(conn)
+    add_follows(conn, graph, 25)
+    assert graph.new_count == 5
+    check_graph(graph, conn)
+
+    graph.compact()
+    assert graph.new_count == 0
+    check_graph(graph, conn)
+
+def test_mutual_followers(conn):
+    graph = graph_from(conn)
+    add_follows(conn, graph, 20)
+    rows = follows_of(conn)
+    users = sorted(set(flwee for flwer, flwee in rows))
+    for user in users[:20]:
+        for other in users[:20]:
+            common = [flwer for flwer in graph.followers(user) 
+                if (flwer, other) in rows]
+            assert graph.mutual_followers(user, other) == common
+
+def test_load_user(conn):
+    curs = conn.cursor()
+    curs.execute("select flwer from follows group by flwer order by count(*) desc")
+    user = curs.fetchone()[0]
+    graph = FollowGraph().load_user(curs, user)
+    full = graph_from(conn)
+    assert graph.following(user) == full.following(user)
+    for flwee in full.following(user):
+        assert graph.following(flwee) == full.following(flwee)
@@ -0,0 +1,44 @@
+import io
+from contextlib import redirect_stdout
+
+import utils
+from utils import Frame, screen, print_string, read_input
+
+
+def show(text):
+    with screen():
+        print_string(text)
+
+def test_identical_screens_are_skipped(monkeypatch):
+    monkeypatch.setattr(utils, 'FRAME', Frame())
+    out = io.StringIO()
+    with redirect_stdout(out):
+        show("a")
+        show("a")
+        show("b")
+        show("a")
+    assert out.getvalue().split() == ["|", "a", "|", "|", "b", "|", "|", "a", "|"]
+
+def test_output_outside_frames_shows_the_screen_again(monkeypatch):
+    monkeypatch.setattr(utils, 'FRAME', Frame())
+    monkeypatch.setattr('builtins.input', lambda prompt: 'typed')
+    out = io.StringIO()
+    with redirect_stdout(out):
+        show("a")
+        print("message")
+        show("a")
+        print_string("line")
+        show("a")
+        assert read_input("> ") == 'typed'
+        show("a")
+    assert out.getvalue().count("| a") == 4
+
+def test_nested_screens_are_written_once(monkeypatch):
+    monkeypatch.setattr(utils, 'FRAME', Frame())
+    out = io.StringIO()
+    with redirect_stdout(out):
+        with screen():
+            print_string("outer")
+            show("inner")
+            assert out.getvalue() == ""
+    assert out.getvalue().split() == ["|", "outer", "|", "|", "inner", "|"]
@@ -0,0 +1,93 @@
+from navigation import (Navigator, Screen, push, replace, go_back, go_home, stay, 
+    restart, leave, HISTORY_SIZE)
+
+
+class Results:
+
+    def __init__(self, name):
+        self.name = name
+        self.released = 0
+
+    def release(self):
+        self.released += 1
+
+
+class Script:
+
+    def __init__(self, moves):
+        """Screens that follow a list of moves, one per screen shown
+
+        :param moves: list of functions returning a Transition (or None)
+        """
+        self.moves = list(moves)
+        self.shown = []
+
+    def screen(self, name, results=None):
+        return Screen(self.show, name, results=results)
+
+    def show(self, name):
+        self.shown.append(name)
+        return self.moves.pop(0)()
+
+def run(script, size=HISTORY_SIZE):
+    navigator = Navigator(lambda: script.screen('start'), lambda: script.screen('home'), size)
+    navigator.run()
+    return navigator
+
+def test_history_is_bounded():
+    results = [Results(i) for i in range(8)]
+    script = Script([lambda: go_home()] + 
+        [lambda i=i: push(script.screen(i, results[i])) for i in range(8)] + 
+        [lambda: go_back()] * 5 + [lambda: leave()])
+    navigator = run(script, size=3)
+
+    # Pushing past the size forgets the oldest screens
+    assert [result.released for result in results] == [1] * 8
+    assert script.shown == ['start', 'home'] + list(range(7)) + [7, 6, 5, 'home', 'home', 'home']
+
+def test_back_releases_unshared_results():
+    shared = Results('shared')
+    own = Results('own')
+    script = Script([lambda: go_home(), 
+        lambda: push(script.screen('list', shared)),
+        lambda: push(script.screen('page', shared)),
+        lambda: push(script.screen('user', own)),
+        lambda: go_back(),
+        lambda: go_back(),
+        lambda: check(shared.released == 0 and own.released == 1),
+        lambda: go_back(),
+        lambda: check(shared.released == 1),
+        lambda: leave()])
+    run(script)
+
+def check(condition):
+    assert condition
+    return stay()
+
+def test_replace_and_raised_transitions():
+    first = Results('first')
+    second = Results('second')
+
+    def quit_prompt():
+        raise go_home()
+
+    script = Script([lambda: go_home(), 
+        lambda: push(script.screen('search', first)),
+        lambda: replace(script.screen('search', second)),
+        lambda: check(first.released == 1 and second.released == 0),
+        lambda: None,
+        quit_prompt,
+        lambda: check(second.released == 1),
+        lambda: restart(),
+        lambda: leave()])
+    navigator = run(script)
+    assert script.shown == ['start', 'home', 'search', 'search', 'search', 'search', 
+        'home', 'home', 'start']
+    assert navigator.current() is None
+
+def test_leave_releases_every_screen():
+    results = [Results(i) for i in range(3)]
+    script = Script([lambda: go_home()] + 
+        [lambda i=i: push(script.screen(i, results[i])) for i in range(3)] + [lambda: leave()])
+    run(script)
+    assert [result.released for result in results] == [1, 1, 1]
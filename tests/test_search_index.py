@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from queries import reseed_id_blocks
+from analyzer import word_patterns
+from main import Twitter
+from search_index import rebuild_search_index
+from tweet import TweetSearch
+from unit_of_work import UnitOfWork
+
+from test_tweet_search import add_tweets, all_pages, expected
+
+TEXTS = [
+    "Cats and dogs #pets",
+    "abc-3099 is a serial number",
+    "c-309 exactly",
+    "Computer science rocks",
+    "science fair #science",
+    "under_score words",
+    "#happy-new year",
+]
+
+@pytest.fixture
+def indexed(session, conn):
+    add_tweets(conn, TEXTS)
+    rebuild_search_index(conn)
+    reseed_id_blocks(conn)
+    twitter = Twitter(conn)
+    twitter.username = session.get_username()
+    assert twitter.use_search_index()
+    return twitter
+
+@pytest.mark.parametrize('keyword, patterns', [
+    ('science', ['%science%']),
+    ('c-309', ['%c', '309%']),
+    ('a-b-c', ['%a', 'b', 'c%']),
+    ('-309', ['309%']),
+    ('abc-', ['%abc']),
+    ('_x_', ['x']),
+    ('--', []),
+])
+def test_word_patterns(keyword, patterns):
+    assert word_patterns(keyword) == patterns
+
+@pytest.mark.parametrize('keywords', ['ience', 'science', 'c-309', '309', 'cats', 
+    'ts an', 'new', '#science', '#pets dogs', 'score', '-', 'e', 'zzz'])
+def test_index_finds_the_same_tweets(indexed, conn, keywords):
+    search = TweetSearch(indexed, keywords)
+    assert all_pages(search) == expected(conn, search.keywords)
+
+def test_new_tweets_are_indexed(indexed, conn):
+    work = UnitOfWork(indexed)
+    tid = indexed.next_id('tweets')
+    work.add_tweet([tid, indexed.get_username(), datetime(2031, 1, 1), "Parrots talk #birds", None])
+    work.add_terms(tid, ['birds'])
+    work.commit()
+
+    for keywords in ['parrot', 'rots', '#birds']:
+        search = TweetSearch(indexed, keywords)
+        tids = all_pages(search)
+        assert tid in tids
+        assert tids == expected(conn, search.keywords)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from main import Twitter
+from queries import similar_count, similar_counts, term_subsets, get_hashtags
+from term_index import rebuild_term_index, check_term_index
+from unit_of_work import UnitOfWork
+
+# Hashtags of the new tweets: overlapping sets, and one tweet with more
+# terms than MAX_SET_TERMS
+TWEET_TERMS = [
+    ['cat'], ['cat', 'dog'], ['dog', 'fish'], ['cat', 'dog', 'fish'],
+    ['bird'], ['cat', 'bird', 'dog', 'fish'], ['ant', 'bee', 'cat', 'dog', 'elk'],
+    ['elk'], ['bee', 'cat'],
+]
+
+def write_tweets(session, tweet_terms):
+    """Composes a tweet mentioning each list of terms"""
+    work = UnitOfWork(session)
+    date = datetime(2030, 1, 1)
+    tids = []
+    for terms in tweet_terms:
+        tid = session.next_id('tweets')
+        date += timedelta(minutes=1)
+        text = ' '.join('#' + term for term in terms)
+        work.add_tweet([tid, session.get_username(), date, text, None])
+        work.add_terms(tid, terms)
+        tids.append(tid)
+    work.commit()
+    return tids
+
+def direct_counts(conn):
+    curs = conn.cursor()
+    curs.execute("select m.tid, count(distinct m2.tid) from mentions m, mentions m2 "
+        "where m2.term = m.term group by m.tid")
+    return dict(curs.fetchall())
+
+def login(conn, session):
+    twitter = Twitter(conn)
+    twitter.username = session.get_username()
+    return twitter
+
+def test_term_subsets():
+    assert term_subsets(['b  ', 'a', 'b']) == ['a', 'b', 'a b']
+    assert len(term_subsets(['a', 'b', 'c', 'd', 'e'])) == 5 + 10 + 10 + 5
+    assert term_subsets([]) == []
+
+def test_rebuilt_index_matches_mentions(session, conn):
+    write_tweets(session, TWEET_TERMS)
+    rebuild_term_index(conn)
+    assert check_term_index(conn) == {}
+
+def test_new_tweets_update_the_index(session, conn):
+    rebuild_term_index(conn)
+    twitter = login(conn, session)
+    assert twitter.use_term_index()
+    tids = write_tweets(twitter, TWEET_TERMS)
+    assert check_term_index(conn) == {}
+
+    curs = conn.cursor()
+    counts = direct_counts(conn)
+    for tid in tids:
+        assert similar_count(curs, tid, get_hashtags(curs, tid)) == counts[tid]
+
+def test_similar_counts_of_every_tweet(session, conn):
+    write_tweets(session, TWEET_TERMS)
+    assert dict(similar_counts(conn.cursor())) == direct_counts(conn)
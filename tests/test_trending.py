@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from migrations import apply_migration
+from backends import DATABASE_ERRORS
+from queries import get_trend_counters, SKETCH_SIZE
+from trending import SpaceSaving, count_trends, get_trends, day, today, RETENTION
+
+
+def zipf_terms(count, distinct, seed=0):
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return ["t%d" % (rank) for rank in rng.choices(range(distinct), weights, k=count)]
+
+@pytest.mark.parametrize('capacity', [5, 20])
+def test_space_saving_bounds(capacity):
+    terms = zipf_terms(2000, 200)
+    truth = Counter(terms)
+    sketch = SpaceSaving(capacity)
+    for term in terms:
+        sketch.add(term)
+
+    assert len(sketch.counters) == capacity
+    for term, (cnt, err) in sketch.counters.items():
+        # Counts are over-estimates by at most err
+        assert cnt - err <= truth[term] <= cnt
+    assert sum(cnt for cnt, err in sketch.counters.values()) == len(terms)
+
+    # Any term above 1/capacity of the mentions is kept
+    for term, cnt in truth.items():
+        if cnt > len(terms) / capacity:
+            assert term in sketch.counters
+
+def test_space_saving_exact_below_capacity():
+    sketch = SpaceSaving(10)
+    for term in ['a', 'b', 'a', 'c', 'a', 'b']:
+        sketch.add(term)
+    assert sketch.counters == {'a': [3, 0], 'b': [2, 0], 'c': [1, 0]}
+
+@pytest.fixture
+def trends(conn):
+    apply_migration(conn, 'trend_counters')
+    return conn
+
+def stored(curs, bucket):
+    get_trend_counters(curs, bucket)
+    return dict((term.rstrip(), [cnt, err]) for term, cnt, err in curs.fetchall())
+
+def test_stored_counters_match_sketch(trends):
+    curs = trends.cursor()
+    now = datetime.today()
+    terms = zipf_terms(1000, 400)
+    sketch = SpaceSaving()
+
+    # Mentions arrive a few at a time, as tweets are composed
+    for i in range(0, len(terms), 7):
+        count_trends(curs, [(now, term) for term in terms[i:i + 7]])
+        trends.commit()
+    for term in terms:
+        sketch.add(term)
+
+    assert len(sketch.counters) == SKETCH_SIZE
+    assert stored(curs, today()) == sketch.counters
+    curs.execute("select terms from trend_days where bucket = :1", [today()])
+    assert curs.fetchone()[0] == len(sketch.counters)
+
+def test_size_bound_is_enforced(trends):
+    curs = trends.cursor()
+    count_trends(curs, [(datetime.today(), 'x')])
+    with pytest.raises(DATABASE_ERRORS):
+        curs.execute("update trend_days set terms = terms + 1000")
+
+def test_windows_and_pruning(trends):
+    curs = trends.cursor()
+    now = datetime.today()
+    old = now - timedelta(days=RETENTION + 3)
+    count_trends(curs, [(old, 'old')] * 5)
+    count_trends(curs, [(now - timedelta(days=2), 'week')] * 3)
+    count_trends(curs, [(now, 'today')] * 2 + [(now, 'week')])
+    trends.commit()
+
+    assert get_trends(curs, 1) == [('today', 2), ('week', 1)]
+    assert get_trends(curs, 7) == [('week', 4), ('today', 2)]
+
+    # Starting a new day drops the days older than the longest window
+    assert stored(curs, day(old)) == {}
+    curs.execute("select count(*) from trend_days where bucket < :1", 
+        [today() - timedelta(days=RETENTION - 1)])
+    assert curs.fetchone()[0] == 0
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from analyzer import analyze
+from tweet import TweetSearch, PAGE_SIZE
+
+
+def add_tweets(conn, texts, writer=None):
+    """Inserts tweets a minute apart, newest last"""
+    curs = conn.cursor()
+    curs.execute("select nvl(max(tid), 0) from tweets")
+    tid = curs.fetchone()[0]
+    if writer is None:
+        curs.execute("select min(usr) from users")
+        writer = curs.fetchone()[0]
+    date = datetime(2030, 1, 1)
+    for text in texts:
+        tid += 1
+        date += timedelta(minutes=1)
+        curs.execute("insert into tweets(tid, writer, tdate, text, replyto) "
+            "values(:1, :2, :3, :4, null)", [tid, writer, date, text])
+    conn.commit()
+
+def expected(conn, keywords):
+    """The tweets matching a keyword, newest first, found by reading every tweet"""
+    curs = conn.cursor()
+    curs.execute("select tid, tdate, text from tweets")
+    tweets = curs.fetchall()
+    curs.execute("select tid, term from mentions")
+    terms = {}
+    for tid, term in curs.fetchall():
+        terms.setdefault(tid, set()).add(term.rstrip())
+
+    matches = []
+    for tid, tdate, text in tweets:
+        for word in keywords:
+            if word.startswith('#') and word[1:] in terms.get(tid, ()):
+                matches.append((tdate, tid))
+                break
+            elif not word.startswith('#') and word in analyze(text.rstrip()).nohash:
+                matches.append((tdate, tid))
+                break
+    return [tid for tdate, tid in sorted(matches, reverse=True)]
+
+def all_pages(search):
+    """Returns the ids of every tweet listed by a search, page by page"""
+    search.reset()
+    tids = [tweet.tid() for tweet in search.tweets]
+    while search.more_exist:
+        search.more_results()
+        assert len(search.tweets) <= PAGE_SIZE
+        tids.extend(tweet.tid() for tweet in search.tweets)
+    return tids
+
+@pytest.mark.parametrize('keywords', ['a', 'the', 'e', 'zzz', '#happyny', 'go, the'])
+def test_pages_list_every_match_once(session, conn, keywords):
+    search = TweetSearch(session, keywords)
+    assert all_pages(search) == expected(conn, search.keywords)
+
+def test_pages_with_equal_dates(session, conn):
+    # Keyset pages break ties on the tweet id
+    add_tweets(conn, ["same minute %d" % (i) for i in range(2 * PAGE_SIZE + 1)])
+    conn.execute("update tweets set tdate = :1 where text like 'same minute%'",
+        [datetime(2030, 1, 1)])
+    search = TweetSearch(session, 'minute')
+    tids = all_pages(search)
+    assert len(tids) == 2 * PAGE_SIZE + 1
+    assert tids == expected(conn, ['minute'])
+
+def test_filtered_page_fills_up(session, conn):
+    # 'Dog' only matches inside a hashtag of most tweets, which the text 
+    # filter rejects after the query matched them
+    add_tweets(conn, ["#dogs %d" % (i) for i in range(PAGE_SIZE)] + ["dog walk", "a dog"])
+    search = TweetSearch(session, 'dog')
+    search.reset()
+    assert [tweet.get_text() for tweet in search.tweets] == ["a dog", "dog walk"]
+    assert not search.more_exist
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from f_lists import get_members
+from unit_of_work import UnitOfWork
+
+
+def members(conn, lname):
+    curs = conn.cursor()
+    curs.execute("select member from includes where lname = :1 order by member", [lname])
+    return [row[0] for row in curs.fetchall()]
+
+def test_remove_member_from_one_list(session, conn):
+    owner = session.get_username()
+    curs = conn.cursor()
+    curs.execute("select usr from users where usr <> :1 order by usr", [owner])
+    first, second = [row[0] for row in curs.fetchmany(2)]
+
+    work = UnitOfWork(session)
+    for lname in ['fav', 'favs', 'my fav']:
+        work.add_list([lname, owner])
+        work.add_include([lname, first])
+        work.add_include([lname, second])
+    work.commit()
+
+    work = UnitOfWork(session)
+    work.remove_include(['fav', first])
+    work.commit()
+    assert members(conn, 'fav') == [second]
+    assert members(conn, 'favs') == [first, second]
+    assert members(conn, 'my fav') == [first, second]
+
+    get_members(curs, owner, 'favs')
+    assert sorted(row[0] for row in curs.fetchall()) == [first, second]
+
+def test_writes_are_committed_together(session, conn):
+    writer = session.get_username()
+    tid = session.next_id('tweets')
+    work = UnitOfWork(session)
+    work.add_tweet([tid, writer, datetime(2030, 1, 1), "Hello #world", None])
+    work.add_terms(tid, ['world', 'World'])
+    work.commit()
+
+    curs = conn.cursor()
+    curs.execute("select rtrim(term) from mentions where tid = :1", [tid])
+    assert curs.fetchall() == [('world',)]
+    curs.execute("select rep_cnt, ret_cnt from tweet_stats where tid = :1", [tid])
+    assert curs.fetchone() == (0, 0)
@@ -0,0 +1,85 @@
+import pytest
+
+import queries
+from queries import match_users_fuzzy
+from main import Twitter
+from user import UserSearch
+from user_index import rebuild_user_index
+from unit_of_work import UnitOfWork
+
+
+def expected(conn, keyword):
+    """Users whose name contains the keyword, shortest name first, then the
+    users whose city does, found by reading every user
+    """
+    curs = conn.cursor()
+    curs.execute("select usr, name, city from users")
+    users = curs.fetchall()
+    names = sorted((len(name.strip()), usr) for usr, name, city in users
+        if keyword in name.lower())
+    cities = sorted((len(city.strip()), usr) for usr, name, city in users
+        if keyword in city.lower() and keyword not in name.lower())
+    return [usr for length, usr in names + cities]
+
+def all_pages(session, keyword):
+    """Returns the ids of every user listed by a search, page by page"""
+    search = UserSearch(session, keyword)
+    session.current = search
+    search.reset()
+    usrs = [user.id for user in search.users]
+    while search.more_exist:
+        search.more_results()
+        assert len(search.users) <= 5
+        # Only the users shown so far are hydrated
+        assert len(search.all_users) < search.index
+        usrs.extend(user.id for user in search.users)
+    return usrs
+
+KEYWORDS = ['a', 'jo', 'son', 'edmonton', 'ton', 'zzzq']
+
+@pytest.mark.parametrize('keyword', KEYWORDS)
+def test_pages_list_every_match_once(session, conn, keyword):
+    assert all_pages(session, keyword) == expected(conn, keyword)
+
+def test_equal_lengths_are_ordered_by_id(session, conn):
+    curs = conn.cursor()
+    curs.execute("select max(usr) from users")
+    usr = curs.fetchone()[0]
+    for i in range(12):
+        curs.execute("insert into users(usr, pwd, name, email, city, timezone) "
+            "values(:1, 'pw', :2, 'q@q.com', 'Nowhere', 0)", [usr + 12 - i, "Qwerty%02d" % (i)])
+    conn.commit()
+    usrs = all_pages(session, 'qwerty')
+    assert usrs == sorted(usrs) and len(usrs) == 12
+
+@pytest.fixture
+def indexed(session, conn):
+    rebuild_user_index(conn)
+    twitter = Twitter(conn)
+    twitter.username = session.get_username()
+    assert twitter.use_user_index()
+    return twitter
+
+@pytest.mark.parametrize('keyword', KEYWORDS)
+def test_index_finds_the_same_users(indexed, conn, keyword):
+    assert all_pages(indexed, keyword) == expected(conn, keyword)
+
+def test_fuzzy_match_without_exact_match(indexed, conn):
+    curs = conn.cursor()
+    curs.execute("select usr, city from users where lower(city) like '%edmonton%'")
+    edmonton = set(usr for usr, city in curs.fetchall())
+    assert len(edmonton) > 0
+
+    usrs = all_pages(indexed, 'edmontom')
+    assert set(usrs) == edmonton
+
+def test_fuzzy_candidates_are_bounded(indexed, conn, monkeypatch):
+    monkeypatch.setattr(queries, 'FUZZY_CANDIDATES', 2)
+    assert len(match_users_fuzzy(conn.cursor(), 'edmontom', 1)) <= 2
+
+def test_new_users_are_indexed(indexed, conn):
+    usr = indexed.next_id('users')
+    work = UnitOfWork(indexed)
+    work.add_user([usr, 'pw', 'Zanzibar Quux', 'z@q.com', 'Nowhere', 0])
+    work.commit()
+    assert all_pages(indexed, 'zanzibar') == [usr]
@@ -0,0 +1,90 @@
+import sys
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+
+"""
+Maintenance commands for the optional home timeline table
+
+Usage:
+python timeline.py rebuild           creates and fills the timeline table
+python timeline.py check [usr ...]   compares the timeline with follows_tweets
+"""
+
+def rebuild_timeline(conn):
+    """Creates the timeline table if needed and refills it from scratch
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migration(conn, 'timeline')
+    curs = conn.cursor()
+    curs.execute("delete from timeline")
+    fill_timeline(curs)
+    curs.close()
+    conn.commit()
+
+def home_entries(rows):
+    """Returns the set of (tid, retweeter) pairs shown on a home screen
+    The retweeter is None when the tweet is shown as written
+
+    :param rows: rows from follows_tweets or timeline_tweets
+    """
+    entries = set()
+    for row in rows:
+        rt_user = row[5]
+        if rt_user == row[1]:
+            rt_user = None
+        entries.add((row[0], rt_user))
+    return entries
+
+def check_timeline(conn, users=None):
+    """Compares the timeline table with the follows_tweets query
+    Returns a dictionary mapping user id to the (missing, extra) entries of
+    every user whose timeline is out of date
+
+    :param conn: connection (not cursor object)
+    :param users (optional): list of user ids to check (default: all users)
+    """
+    curs = conn.cursor()
+    if users is None:
+        select(curs, 'users')
+        users = [row[0] for row in curs.fetchall()]
+
+    problems = {}
+    for user in users:
+        follows_tweets(curs, user)
+        expected = home_entries(curs.fetchall())
+        timeline_tweets(curs, user)
+        actual = home_entries(curs.fetchall())
+
+        if expected != actual:
+            problems[user] = (expected - actual, actual - expected)
+    curs.close()
+    return problems
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) < 1 or args[0] not in ['rebuild', 'check']:
+        print("Usage: python timeline.py rebuild | check [usr ...] [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    if args[0] == 'rebuild':
+        rebuild_timeline(conn)
+        print("Timeline rebuilt.")
+    else:
+        users = [int(usr) for usr in args[1:]] or None
+        problems = check_timeline(conn, users)
+        for user, (missing, extra) in sorted(problems.items()):
+            print("User %d: %d missing, %d extra" % (user, len(missing), len(extra)))
+        print("%d timeline(s) out of date." % (len(problems)))
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import os
+import re
+import sys
+import json
+import time
+
+"""
+Opt-in query tracing. TracingConnection wraps a cx_Oracle or sqlite3
+connection so that every statement run through its cursors is recorded with
+its SQL fingerprint, number of binds, elapsed time, rows fetched and calling
+function. Statements are grouped by user action (a menu choice); a statement
+repeated N_PLUS_ONE times or more inside one action is flagged, since it is
+usually a lookup run once per displayed row.
+
+Usage:
+python main.py --trace [--trace-file PATH] [--sqlite PATH]
+    --trace prints a summary of every action at logout
+    --trace-file also writes one JSON line per action to PATH
+"""
+
+# Number of identical statements in one action that is flagged as N+1
+N_PLUS_ONE = 5
+
+# Number of statements listed per action in the printed summary
+SUMMARY_LINES = 5
+
+# Modules that run statements for their callers
+HELPER_FILES = ['queries.py', 'entity_cache.py', 'tracing.py']
+
+def fingerprint(statement):
+    """Returns the statement text with literals replaced by ? and
+    whitespace collapsed, so that the same query always looks the same
+
+    :param statement: SQL text
+    """
+    statement = re.sub(r"'[^']*'", "?", statement)
+    statement = re.sub(r"(?<![\w:])\d+(\.\d+)?", "?", statement)
+    statement = re.sub(r"in\s*\(\s*:\d+(\s*,\s*:\d+)*\s*\)", "in (...)", statement)
+    return ' '.join(statement.split())
+
+def bind_count(args):
+    """Returns the number of bind values passed to execute"""
+    if len(args) == 0 or args[0] is None:
+        return 0
+    return len(args[0])
+
+def frame_name(frame):
+    """Returns module.function for a stack frame"""
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return "%s.%s" % (module, frame.f_code.co_name)
+
+def find_caller():
+    """Returns the function that ran the statement, and the function that
+    called it if it is a query helper (e.g. 'queries.get_name < tweet.display')
+    """
+    frame = sys._getframe(2)
+    while frame is not None and os.path.basename(frame.f_code.co_filename) == 'tracing.py':
+        frame = frame.f_back
+    if frame is None:
+        return None
+
+    caller = frame_name(frame)
+    if os.path.basename(frame.f_code.co_filename) in HELPER_FILES:
+        outer = frame.f_back
+        while outer is not None and os.path.basename(outer.f_code.co_filename) in HELPER_FILES:
+            outer = outer.f_back
+        if outer is not None:
+            caller = "%s < %s" % (caller, frame_name(outer))
+    return caller
+
+
+class Tracer:
+
+    def __init__(self, path=None, show=True):
+        """Collects the statements of each user action
+
+        :param path (optional): file to append one JSON line per action to
+        :param show (optional): if False, report only writes the trace file
+        """
+        self.path = path
+        self.show = show
+        self.actions = []
+        self.action = None
+        self.statements = 0
+        self.begin_action('start')
+
+    def begin_action(self, name):
+        """Ends the current action and starts recording a new one
+
+        :param name: action name (usually the menu option)
+        """
+        self.end_action()
+        self.action = {'action': name, 'statements': 0, 'ms': 0.0, 'queries': {}}
+
+    def end_action(self):
+        """Finishes the current action, writing it to the trace file"""
+        if self.action is None or self.action['statements'] == 0:
+            return
+
+        self.actions.append(self.action)
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.summarize(self.action), sort_keys=True) + '\n')
+        self.action = None
+
+    def record(self, statement, binds, elapsed, caller):
+        """Records one executed statement
+        Returns the query entry that fetched rows are counted against
+
+        :param statement: SQL text
+        :param binds: number of bind values
+        :param elapsed: execution time in seconds
+        :param caller: calling function from find_caller
+        """
+        self.statements += 1
+        if self.action is None:
+            self.begin_action('start')
+
+        sql = fingerprint(statement)
+        key = sql + '\n' + str(caller)
+        query = self.action['queries'].get(key)
+        if query is None:
+            query = {'sql': sql, 'caller': caller, 'binds': binds, 'count': 0,
+                'ms': 0.0, 'rows': 0}
+            self.action['queries'][key] = query
+
+        query['count'] += 1
+        query['ms'] += elapsed * 1000
+        self.action['statements'] += 1
+        self.action['ms'] += elapsed * 1000
+        return query
+
+    def add_rows(self, query, rows):
+        """Counts fetched rows against a query entry"""
+        if query is not None:
+            query['rows'] += rows
+
+    def summarize(self, action):
+        """Returns an action with its queries sorted by time and the
+        repeated ones flagged
+        """
+        queries = sorted(action['queries'].values(), key=lambda q: q['ms'], reverse=True)
+        summary = dict(action)
+        summary['queries'] = queries
+        summary['rows'] = sum(q['rows'] for q in queries)
+        summary['n_plus_one'] = [q for q in queries if q['count'] >= N_PLUS_ONE]
+        return summary
+
+    def report(self):
+        """Prints a summary of every recorded action and forgets them"""
+        self.end_action()
+        if not self.show or len(self.actions) == 0:
+            self.actions = []
+            self.begin_action('start')
+            return
+
+        print("\nQUERY TRACE: %d action(s), %d statement(s)" % (len(self.actions), self.statements))
+
+        for action in self.actions:
+            summary = self.summarize(action)
+            print("\n%s: %d statement(s), %.1f ms, %d row(s)" % (summary['action'],
+                summary['statements'], summary['ms'], summary['rows']))
+            for query in summary['queries'][:SUMMARY_LINES]:
+                print("  %4dx %8.1f ms %6d rows  %s" % (query['count'], query['ms'],
+                    query['rows'], query['caller']))
+            for query in summary['n_plus_one']:
+                print("  N+1: %s ran %d times: %s" % (query['caller'], query['count'],
+                    query['sql'][:70]))
+
+        self.actions = []
+        self.begin_action('start')
+
+
+class TracingCursor:
+
+    def __init__(self, cursor, tracer):
+        """Cursor that records its statements with a Tracer
+
+        :param cursor: cursor object
+        :param tracer: Tracer object
+        """
+        self._cursor = cursor
+        self._tracer = tracer
+        self._query = None
+
+    def execute(self, statement, *args):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(statement, *args)
+        finally:
+            self._query = self._tracer.record(statement, bind_count(args),
+                time.perf_counter() - start, find_caller())
+
+    def executemany(self, statement, rows, *args):
+        binds = len(rows[0]) if len(rows) > 0 else 0
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(statement, rows, *args)
+        finally:
+            self._query = self._tracer.record(statement, binds,
+                time.perf_counter() - start, find_caller())
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._tracer.add_rows(self._query, 1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._tracer.add_rows(self._query, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._tracer.add_rows(self._query, len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._tracer.add_rows(self._query, 1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracingConnection:
+
+    def __init__(self, conn, tracer=None):
+        """Connection whose cursors record their statements
+
+        :param conn: connection (not cursor object)
+        :param tracer (optional): Tracer object (default: a new one)
+        """
+        self._conn = conn
+        self.tracer = Tracer() if tracer is None else tracer
+
+    def cursor(self):
+        return TracingCursor(self._conn.cursor(), self.tracer)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def split_trace_args(args):
+    """Removes the --trace and --trace-file PATH options from a list of
+    command line arguments
+    Returns the remaining arguments and a Tracer (None if not tracing)
+
+    :param args: command line arguments without the program name
+    """
+    path = None
+    if '--trace-file' in args:
+        i = args.index('--trace-file')
+        if i + 1 >= len(args):
+            print("--trace-file needs a file name.")
+            sys.exit(1)
+        path = args[i + 1]
+        args = args[:i] + args[i + 2:]
+
+    enabled = '--trace' in args
+    if enabled:
+        args = [arg for arg in args if arg != '--trace']
+
+    if not enabled and path is None:
+        return args, None
+    return args, Tracer(path, show=enabled)
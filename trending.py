@@ -0,0 +1,227 @@
+import sys
+import heapq
+from datetime import datetime, timedelta
+
+from utils import *
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+from follow_graph import fetch_rows
+
+"""
+Trending hashtags. Mentions are counted per day of the tweet date with the
+Space-Saving heavy-hitter algorithm: each day keeps at most SKETCH_SIZE
+counters, and a new term replaces the smallest counter, inheriting its count
+as possible error. Any term mentioned more than 1/SKETCH_SIZE of the time in a
+day is guaranteed to be kept. A window's trends are the sums of the counters
+of its days, so the storage and the time to show them stay fixed no matter
+how many distinct hashtags exist.
+
+Once the trend_counters table exists, the mentions of new tweets update it in
+the same transaction and the home screen shows the top hashtags. A session
+locks a day's counters before reading them, so concurrent sessions counting
+the same day wait for each other instead of overwriting their counts.
+
+Usage:
+python trending.py rebuild   creates the table and counts the recent mentions
+python trending.py show      prints the trending hashtags of every window
+"""
+
+# (title, number of days up to today) of every trending window
+WINDOWS = [('today', 1), ('this week', 7)]
+
+# Days of counters kept, enough for the longest window
+RETENTION = max(days for title, days in WINDOWS)
+
+# Number of hashtags shown per window
+TOP_K = 5
+
+# Stale heap entries tolerated per counter before the heap is rebuilt
+HEAP_SLACK = 4
+
+class SpaceSaving:
+
+    def __init__(self, capacity=SKETCH_SIZE, rows=()):
+        """Bounded set of counters of the most frequent terms
+
+        :param capacity (optional): maximum number of counters
+        :param rows (optional): stored (term, cnt, err) counters
+        """
+        self.capacity = capacity
+        self.counters = {}
+        self.stored = set()
+        self.changed = set()
+        for term, cnt, err in rows:
+            term = term.rstrip()
+            self.counters[term] = [cnt, err]
+            self.stored.add(term)
+        self.rebuild_heap()
+
+    def rebuild_heap(self):
+        """Rebuilds the (count, term) min-heap without stale entries"""
+        self.heap = [(counter[0], term) for term, counter in self.counters.items()]
+        heapq.heapify(self.heap)
+
+    def pop_smallest(self):
+        """Removes the term with the smallest count
+        Returns the term and its count
+        """
+        while True:
+            cnt, term = heapq.heappop(self.heap)
+            counter = self.counters.get(term)
+            if counter is not None and counter[0] == cnt:
+                del self.counters[term]
+                self.changed.discard(term)
+                return term, cnt
+
+    def add(self, term, count=1):
+        """Counts mentions of a term
+
+        :param term: lowercase hashtag term
+        :param count (optional): number of mentions
+        """
+        counter = self.counters.get(term)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[term] = [count, 0]
+        else:
+            victim, smallest = self.pop_smallest()
+            counter = self.counters[term] = [smallest + count, smallest]
+        self.changed.add(term)
+
+        heapq.heappush(self.heap, (counter[0], term))
+        if len(self.heap) > HEAP_SLACK * self.capacity:
+            self.rebuild_heap()
+
+    def save(self, curs, bucket):
+        """Writes the counters changed since they were loaded
+
+        :param curs: cursor object
+        :param bucket: datetime of the start of the day
+        """
+        removed = self.stored - set(self.counters)
+        removed.update(self.stored & self.changed)
+        rows = [[term] + self.counters[term] for term in sorted(self.changed)]
+        save_trend_counters(curs, bucket, sorted(removed), rows)
+
+        self.stored = set(self.counters)
+        self.changed = set()
+
+def day(date):
+    """Returns the start of the day of a datetime"""
+    return datetime(date.year, date.month, date.day)
+
+def today():
+    """Returns the start of the current day"""
+    return day(datetime.today())
+
+def count_trends(curs, mentions):
+    """Adds mentions to the counters of their days
+    Each day is locked until the caller commits
+
+    :param curs: cursor object
+    :param mentions: list of (tdate, term) pairs
+    """
+    buckets = {}
+    for tdate, term in mentions:
+        buckets.setdefault(day(tdate), []).append(term.rstrip().lower())
+
+    for bucket, terms in sorted(buckets.items()):
+        if lock_trend_day(curs, bucket):
+            prune_trend_counters(curs, today() - timedelta(days=RETENTION - 1))
+        get_trend_counters(curs, bucket)
+        rows = curs.fetchall()
+
+        sketch = SpaceSaving(rows=rows)
+        for term in terms:
+            sketch.add(term)
+        sketch.save(curs, bucket)
+
+def get_trends(curs, days, limit=TOP_K):
+    """Returns the (term, count) of the top hashtags of the last days
+
+    :param curs: cursor object
+    :param days: number of days up to today
+    :param limit (optional): number of hashtags
+    """
+    since = today() - timedelta(days=days - 1)
+    return [(term.rstrip(), cnt) for term, cnt in top_trends(curs, since, limit)]
+
+def display_trending(session):
+    """Prints one line of trending hashtags per window
+
+    :param session: Twitter object
+    """
+    curs = session.get_curs()
+    for title, days in WINDOWS:
+        trends = get_trends(curs, days)
+        if len(trends) == 0:
+            continue
+        line = "TRENDING %s:" % (title.upper())
+        for term, cnt in trends:
+            item = " #%s (%d)" % (term, cnt)
+            if len(line) + len(item) > BORDER_LEN - 2:
+                break
+            line += item
+        print_string(line)
+        print_border(thick=False)
+
+def rebuild_trending(conn):
+    """Creates the trend_counters table if needed and counts the mentions of
+    the days kept, one day at a time
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migration(conn, 'trend_counters')
+    curs = conn.cursor()
+    curs.execute("delete from trend_counters")
+    curs.execute("delete from trend_days")
+
+    since = today() - timedelta(days=RETENTION - 1)
+    read = conn.cursor()
+    mention_dates(read, since)
+    bucket, sketch = None, None
+    count = 0
+    for tdate, term in fetch_rows(read):
+        if bucket != day(tdate):
+            if sketch is not None:
+                sketch.save(curs, bucket)
+            bucket, sketch = day(tdate), SpaceSaving()
+            lock_trend_day(curs, bucket)
+        sketch.add(term.rstrip().lower())
+        count += 1
+
+    if sketch is not None:
+        sketch.save(curs, bucket)
+    read.close()
+    curs.close()
+    conn.commit()
+    return count
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) != 1 or args[0] not in ['rebuild', 'show']:
+        print("Usage: python trending.py rebuild | show [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    if args[0] == 'rebuild':
+        count = rebuild_trending(conn)
+        print("Trending hashtags rebuilt from %d mention(s)." % (count))
+    else:
+        curs = conn.cursor()
+        for title, days in WINDOWS:
+            trends = get_trends(curs, days)
+            print("Trending %s: %s" % (title, ', '.join("#%s (%d)" % (term, cnt)
+                for term, cnt in trends) or 'none'))
+        curs.close()
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 from utils import *
 from queries import * 
+from unit_of_work import UnitOfWork
+from analyzer import analyze, split_text
+from navigation import Screen, push, go_back, go_home
+
+# Number of tweets per result page and number of pages kept in memory
+PAGE_SIZE = 5
+PAGE_WINDOW = 3
+
+# Number of related tweets listed for a tweet
+RELATED_LIMIT = 20
 
 def compose_tweet(session, menu_func=None, replyto=None):
     """ Generates a new tweet and inserts it into the database
@@ -16,8 +26,10 @@ def compose_tweet(session, menu_func=None, replyto=None):
         print("Tweet cancelled.")
         return None if menu_func is None else menu_func() 
              
-    insert_tweet(session.get_conn(), new_tweet.get_values())
-    new_tweet.insert_terms()
+    work = UnitOfWork(session)
+    work.add_tweet(new_tweet.get_values())
+    new_tweet.insert_terms(work)
+    work.commit()
 
     print("Tweet %d created - %s." % (new_tweet.tid(), new_tweet.tdate()))
     print("Hashtags mentioned: %s" % (new_tweet.get_terms()))
@@ -37,12 +49,12 @@ def create_tweet(session, menu_func, replyto):
   
     print_border(thick=False)
     writer = session.get_username()
-    tid = generate_tid(session.get_conn())
-    date = TODAY
+    tid = generate_tid(session)
+    date = datetime.today()
     replyto = replyto
     rt_user = None
     data = [tid, writer, date, text, replyto, rt_user]
-    new_tweet = Tweet(session, data)
+    new_tweet = hydrate_tweets(session, [data])[0]
     new_tweet.display(result="Tweet")
     print_border(thick=False)
     new_tweet.set_terms()
@@ -53,20 +65,108 @@ def create_tweet(session, menu_func, replyto):
     return new_tweet
 
    
-def generate_tid(conn):
+def generate_tid(session):
     """Generates a new unique tweet id
     
-    :param conn: session connection
+    :param session: Session object
     """
-    curs = conn.cursor()
-    select(curs, 'tweets')
-    new_tid = len(curs.fetchall()) + 1
-    
-    while tid_exists(curs, new_tid): 
-        new_tid += 1
-    curs.close()
+    return session.next_id('tweets')
+
+
+def get_tweet_details(session, rows, curs=None):
+    """Loads the writer names, hashtags and reply info for a page of tweet
+    rows through the session's entity cache, with at most one set-based query
+    per kind of entity
+    Returns a dictionary mapping tweet id to a details dictionary
+
+    :param session: Session object
+    :param rows: row values from tweets table
+    :param curs (optional): cursor to query with (default: the session's)
+    """
+    if session.get_snapshot() is not None:
+        return session.get_snapshot().tweet_details(rows)
+
+    curs = session.get_curs() if curs is None else curs
+    cache = session.get_cache()
+    tids = [row[0] for row in rows]
+    replies = cache.get_tweets(curs, [row[4] for row in rows if row[4]])
+    users = [row[1] for row in rows] + [reply[0] for reply in replies.values()]
+    users.extend(row[5] for row in rows if len(row) > 5 and row[5] is not None)
+    names = cache.get_names(curs, users)
+    terms = cache.get_terms(curs, tids)
+
+    details = {}
+    for row in rows:
+        info = {'writer_name': names[row[1]], 'terms': list(terms.get(row[0], []))}
+        if row[4] in replies:
+            reply_user, reply_text = replies[row[4]]
+            info['reply_user'] = reply_user
+            info['reply_name'] = names[reply_user]
+            info['reply_text'] = reply_text
+        if len(row) > 5 and row[5] is not None:
+            info['rt_name'] = names[row[5]]
+        details[row[0]] = info
+    return details
+
+
+def hydrate_tweets(session, rows, curs=None):
+    """Creates Tweet objects for a page of tweet rows 
+    The number of queries does not depend on the number of rows
+
+    :param session: Session object
+    :param rows: row values from tweets table
+    :param curs (optional): cursor to query with (default: the session's)
+    """
+    rows = list(rows)
+    if len(rows) == 0:
+        return []
+
+    details = get_tweet_details(session, rows, curs)
+    return [Tweet(session, row, details[row[0]]) for row in rows]
+
+
+def tweet_key(row):
+    """Returns the (tdate, tid) pagination key of a tweet row"""
+    return (row[2], row[0])
+
+
+def related_tweets(session, tweet):
+    """Returns the rows of the tweets sharing the most hashtags with a tweet,
+    newest first among equals
+    With the term index, only the RELATED_SCAN newest tweets of each hashtag
+    are considered
 
-    return new_tid
+    :param session: Session object
+    :param tweet: Tweet object
+    """
+    curs = session.get_curs()
+    if session.use_term_index():
+        shared = {}
+        for term, tid, tdate in related_posts(curs, tweet.get_terms()):
+            if tid != tweet.tid():
+                count, date = shared.get(tid, (0, tdate))
+                shared[tid] = (count + 1, date)
+        # Newest first, then (stable sort) most shared terms first
+        ranked = sorted(shared.items(), key=lambda item: (item[1][1], item[0]), reverse=True)
+        ranked.sort(key=lambda item: item[1][0], reverse=True)
+        tids = [tid for tid, value in ranked[:RELATED_LIMIT]]
+    else:
+        match_related(curs, tweet.tid())
+        tids = [row[0] for row in curs.fetchmany(RELATED_LIMIT)]
+
+    rows = get_tweets(curs, tids)
+    return [rows[tid] for tid in tids if tid in rows]
+
+
+def list_related(session, tweet):
+    """Lists the tweets related to a tweet by their hashtags
+
+    :param session: Session object
+    :param tweet: Tweet object
+    """
+    r_tweets = TweetSearch(session, related=tweet)
+    r_tweets.first_page()
+    return r_tweets
 
 
 def search_tweets(session):
@@ -74,7 +174,7 @@ def search_tweets(session):
 
     :param session: session connection
     """
-    search_input = validate_str("Enter keywords for tweet search: ", session, session.home, null=False)
+    search_input = validate_str("Enter keywords for tweet search: ", session, session.quit_to_home, null=False)
     s_tweets = TweetSearch(session, search_input)
     s_tweets.get_search_tweets()
     return s_tweets 
@@ -82,11 +182,14 @@ def search_tweets(session):
 
 class Tweet:
 
-    def __init__(self, session, data):
+    def __init__(self, session, data, details=None):
         """ Represents a single tweet, helps to display tweets to console
+        Use hydrate_tweets to build several tweets at once
        
         param session: Twitter object 
         param data: row values from tweets table corresponding to columns 
+        param details (optional): writer name, hashtags and reply info from
+            get_tweet_details (looked up if not given)
         """
         self.session = session
         self.conn = session.get_conn() 
@@ -97,6 +200,7 @@ class Tweet:
         self.writer = data[1]
         self.date = data[2]
         self.text = data[3].rstrip()
+        self.analysis = analyze(self.text)
         self.replyto = data[4]
 
         if len(data) > 5: 
@@ -104,19 +208,20 @@ class Tweet:
         else:
             self.rt_user = None
 
-        if self.replyto:
-            self.reply_user = get_user_from_tid(self.curs, self.replyto)
-            self.reply_name = get_name(self.curs, self.reply_user)
-            self.reply_text = get_text_from_tid(self.curs, self.replyto)
+        if details is None:
+            details = get_tweet_details(session, [data])[self.id]
+
+        self.reply_user = details.get('reply_user')
+        self.reply_name = details.get('reply_name')
+        self.reply_text = details.get('reply_text')
+        self.rt_name = details.get('rt_name')
 
         self.date_str = convert_date(self.date)
         self.rep_cnt = None 
         self.ret_cnt = None 
-        self.writer_name = get_name(self.curs, self.writer)
-        
-        self.terms = get_hashtags(self.curs, self.id)
-        if self.terms is None: 
-            self.terms = []
+        self.sim_cnt = None
+        self.writer_name = details['writer_name']
+        self.terms = details['terms']
 
     def author(self):
         """Return the tweet writer"""
@@ -152,6 +257,11 @@ class Tweet:
         Returns the selected option from the tweet menu
         """
         choices = ["Reply", "Retweet", "Go back", "Search for other tweets", "Home", "Logout"]
+        if len(self.terms) > 0:
+            choices.insert(2, "Related tweets")
+        if self.session.read_only():
+            choices = [choice for choice in choices if choice not in 
+                ["Reply", "Retweet", "Related tweets"]]
         print_border(thick=True)
         display_selections(choices)
 
@@ -166,6 +276,17 @@ class Tweet:
         :param result (optional): row title
         :param width (optional): row width for text
         """
+        lines = self.session.get_cache().get_card(('tweet', self.id), 
+            (index, rt_user, result, width), lambda: self.card(index, rt_user, result, width))
+
+        for line in lines:
+            print_string(line)
+
+    def card(self, index, rt_user, result, width):
+        """Returns the formatted lines displaying the tweet
+        Tweets never change, so display caches them in the session's entity
+        cache per layout
+        """
         if index is not None: 
             tweet_index = "%s %d" % (result, index + 1)
         else:
@@ -182,7 +303,7 @@ class Tweet:
         else:
             text_str = self.text
 
-        text1, text2 = self.split_text(text_str, max_width=width)
+        text1, text2 = split_text(text_str, max_width=width)
         date_line = "%s" % (self.date_str)
         info = "%s @%d - %s" % (self.writer_name, self.writer, date_line)
  
@@ -197,87 +318,69 @@ class Tweet:
 
         # Adjust lines if tweet is a retweet
         if rt_user is not None:
-            user_name = get_name(self.curs, rt_user)
+            if rt_user == self.rt_user and self.rt_name is not None:
+                user_name = self.rt_name
+            elif self.session.get_snapshot() is not None:
+                user_name = self.session.get_snapshot().get_names([rt_user]).get(rt_user)
+            else:
+                user_name = self.session.get_cache().get_name(self.curs, rt_user)
             retweeted = "%s Retweeted" % user_name
             line4_2 = line3_2
             line3_2 = line2_2
             line2_2 = line1_2
             line1_2 = "  {:{width}}".format(retweeted, width=col2_width)
 
-        # Print to the console
-        print_string(line1_1 + line1_2)
-        print_string(blank + line2_2)
+        lines = [line1_1 + line1_2, blank + line2_2]
         if line3_2[2] != " ": 
-            print_string(blank + line3_2)
+            lines.append(blank + line3_2)
         if line4_2[2] != " ":
-            print_string(blank + line4_2)
-
-    def split_text(self, text, max_width=65):
-        """Splits up tweets text into 2 separate lines if too long
-
-        :param text: text string
-        :param max_width: row width of text
-        """
-        space_index = -1
-        text = text + " "
-        text1 = text
-        text2 = ""
-
-        if len(text) > max_width:
-            space_index = text.find(' ', max_width-5)
-        
-        if space_index >= max_width:
-            space_index = 0
-
-            i = max_width
-            while text[i] != ' ': 
-                i -= 1
-            space_index = i
-        
-        if space_index > 0:    
-            text1 = text[:space_index]
-            text2 = text[space_index + 1:]
-
-        return (text1, text2)
+            lines.append(blank + line4_2)
+        return lines
 
     def display_stats(self):
         """ Displays statistics on a tweet after the tweet has been selected
         From here, the user can decide to reply/retweet the tweet.
         """
-        print_newline() 
-        print_border(thick=True)
-        print_string("Tweet Statistics".upper())
-        print_border(thick=True, sign='|')
-
-        # Print tweet text first
-        text1, text2 = self.split_text(self.text, max_width=75)
-        print_string(text1)
-        if len(text2) > 1: 
-            print_string(text2)
-        print_newline(no_border=False)
-
-        # Tweet stats
-        self.rep_cnt = get_rep_cnt(self.curs, self.id)
-        self.ret_cnt = get_ret_cnt(self.curs, self.id)
-        print_string("Tweet ID: %d" % (self.id))
-        print_string("Written by: %s @%d" % (self.writer_name, self.writer)) 
-        print_string("Posted: %s" % (self.date_str))
-        print_string("Number of replies: %s" % (self.rep_cnt))
-        print_string("Number of retweets: %s" % (self.ret_cnt))
-
-        # Display what the tweet is replying to 
-        if (self.replyto):
-            rep_str = "%s @%d - %s" % (self.reply_name, self.reply_user, self.reply_text)
-            text1, text2 = self.split_text(rep_str)
-            print_string("In reply to: %s" % (text1))
-            if len(text2) > 1:
-                print_string(text2)
+        if self.session.get_snapshot() is not None:
+            self.rep_cnt, self.ret_cnt, self.sim_cnt = self.session.get_snapshot().tweet_stats(self.id)
         else:
-            print_string("In reply to: None")
+            self.rep_cnt, self.ret_cnt, self.sim_cnt = get_tweet_stats(self.curs, self.id)
+        if self.session.use_term_index():
+            self.sim_cnt = similar_count(self.curs, self.id, self.terms)
+        with screen():
+            print_newline() 
+            print_border(thick=True)
+            print_string("Tweet Statistics".upper())
+            print_border(thick=True, sign='|')
+
+            # Print tweet text first
+            text1, text2 = split_text(self.text, max_width=75)
+            print_string(text1)
+            if len(text2) > 1: 
+                print_string(text2)
+            print_newline(no_border=False)
+
+            # Tweet stats
+            print_string("Tweet ID: %d" % (self.id))
+            print_string("Written by: %s @%d" % (self.writer_name, self.writer)) 
+            print_string("Posted: %s" % (self.date_str))
+            print_string("Number of replies: %s" % (self.rep_cnt))
+            print_string("Number of retweets: %s" % (self.ret_cnt))
+            print_string("Number of similar tweets: %s" % (self.sim_cnt))
+
+            # Display what the tweet is replying to 
+            if (self.replyto):
+                rep_str = "%s @%d - %s" % (self.reply_name, self.reply_user, self.reply_text)
+                text1, text2 = split_text(rep_str)
+                print_string("In reply to: %s" % (text1))
+                if len(text2) > 1:
+                    print_string(text2)
+            else:
+                print_string("In reply to: None")
 
-        # Display menu to follow, etc. 
-        choices = self.tweet_menu()
-        choice = validate_num(SELECT, self.session, self.session.home, size=len(choices))
+            # Display menu to follow, etc. 
+            choices = self.tweet_menu()
+        choice = validate_num(SELECT, self.session, self.session.quit_to_home, size=len(choices))
         return choices[choice-1]
 
     def reply(self, menu_func=None):
@@ -308,7 +411,9 @@ class Tweet:
         else:
             print("Retweeted - %s" % (convert_date(TODAY)))
             data_list = [self.user, self.id, TODAY]
-            insert_retweet(self.conn, data_list)
+            work = UnitOfWork(self.session)
+            work.add_retweet(data_list)
+            work.commit()
 
             press_enter(self.session)
 
@@ -321,22 +426,17 @@ class Tweet:
         return self.terms
 
     def set_terms(self):
-        """Finds the hashtags in a tweet and returns the terms""" 
-        hashtags = self.find_hashtags() 
-
-        for tag in hashtags:
-            term = self.extract_term(tag).lower()
-            if len(term) > 0:
+        """Adds the hashtags found in the tweet text to its terms""" 
+        for term in self.analysis.hashtags:
+            if term not in self.terms:
                 self.terms.append(term)
         
-    def insert_terms(self):
-        """Inserts all hashtag terms into the hashtags table"""
-        for term in self.terms:
-            if not hashtag_exists(self.curs, term):
-                insert_hashtag(self.conn, term)      
- 
-            if not mention_exists(self.curs, self.id, term):
-                insert_mention(self.conn, [self.id, term])
+    def insert_terms(self, work):
+        """Adds all hashtag terms to the hashtags and mentions tables
+
+        :param work: UnitOfWork that also holds the tweet
+        """
+        work.add_terms(self.id, self.terms)
  
     def valid_terms(self):
         """Returns True if all terms do not exceed restriction length"""
@@ -349,62 +449,39 @@ class Tweet:
 
     def get_nohash(self):
         """Return tweet text without the hashtags"""
-        text_str = self.text.lower()
-        for word in self.terms:
-            word = '#' + word
-            text_str = text_str.replace(word, '')
-        return text_str
-
-    def extract_term(self, index):
-        """Gets the hashtag term in the tweet based on the index
-        
-        :param index: the index of the hashtag in the tweet text
-        Returns the hashtag term
-        """
-        if index + 1 >= len(self.text):
-            return "" 
-
-        i = index
-        while i < len(self.text) - 1 and self.text[i + 1].isalnum():
-            i += 1
-
-        if i + 1 == len(self.text):
-            return self.text[index+1:]
-        else:
-            return self.text[index+1:i+1]
-
-    def find_hashtags(self):
-        """ Returns a list of all indexes of found hashtags"""
-        index_list = []
-        for i, ch in enumerate(self.text):
-            if ch == '#':
-                index_list.append(i)
-        return index_list
+        return self.analysis.nohash
 
 class TweetSearch:
 
-    def __init__(self, session, keywords=''):
+    def __init__(self, session, keywords='', related=None):
         """Can be used for getting tweets of users being 
         followed or searching for specific tweets based on keywords
          
         param session: database session connection
         param keywords: input string for tweet search 
+        param related (optional): Tweet object to list the related tweets of
         """ 
         self.session = session
         self.conn = session.get_conn() 
         self.user = session.get_username() 
         self.tweetCurs = self.session.get_curs() 
-        self.all_tweets = []
         self.tweets = []
         self.more_exist = False
-        self.tweet_index = 5
+        self.page = 0
+        self.pages = {}
+        self.page_keys = [None]
         self.rows = None
         self.searched = keywords
         self.keywords = convert_keywords(keywords)
+        self.related = related
+        self.related_rows = None
  
         if len(self.keywords) > 0: 
             self.category = "TweetSearch"
             self.search = True
+        elif related is not None:
+            self.category = "Related"
+            self.search = False
         else:
             self.category = "Home"
             self.search = False
@@ -414,12 +491,12 @@ class TweetSearch:
         return self.search
 
     def get_category(self):
-        """Return either TweetSearch or Home"""
+        """Return either TweetSearch, Home or Related"""
         return self.category 
  
     def is_first_page(self):
         """Return True if the current tweets are the first 5 tweets"""
-        return self.tweet_index <= 10 
+        return self.page == 0
 
     def get_searched(self):
         """Return user's search keywords"""
@@ -431,48 +508,134 @@ class TweetSearch:
 
     def reset(self):
         """Reset the home page to the first 5 tweets"""
-        self.all_tweets = []
         self.tweets = []
         self.more_exist = False
         self.rows = None
-        self.tweet_index = 5
 
-        if not self.search: 
+        if self.related is not None:
+            self.first_page()
+        elif not self.search: 
             self.get_user_tweets()
         else:
             self.get_search_tweets()
         return self 
 
+    def release(self):
+        """Drop the loaded pages once no screen shows these tweets"""
+        self.session.cancel_prefetch(self)
+        self.tweets = []
+        self.more_exist = False
+        self.pages = {}
+        self.page_keys = [None]
+        self.rows = None
+        self.related_rows = None
+
     def get_search_tweets(self):
         """Find tweets matching keywords"""
-        match_tweet(self.tweetCurs, self.keywords, 'tdate')
-        self.add_filtered_results()
-        self.more_results()
+        self.first_page()
 
     def get_user_tweets(self):
         """Find tweets/retweets from users who are being followed"""
-        follows_tweets(self.tweetCurs, self.user)
-        self.add_results()
+        self.first_page()
+
+    def first_page(self):
+        """Forget all loaded pages and show the first one"""
+        if self.related is not None:
+            self.related_rows = related_tweets(self.session, self.related)
+        self.session.cancel_prefetch(self)
+        self.pages = {}
+        self.page_keys = [None]
+        self.page = -1
         self.more_results()
 
-    def add_results(self):
-        """Adds tweets from the query resuls into the all_tweets list"""
-        for row in self.tweetCurs.fetchall():
-            tweet = Tweet(self.session, row)
-            self.all_tweets.append(tweet)
+    def execute(self, after, curs=None):
+        """Run the home or search query for the tweets after a page boundary
+        Returns the cursor (or snapshot ResultSet) to fetch the rows from
 
-    def add_filtered_results(self):
-        """Remove tweets from all_tweets list if the tweet does not match
-        a keyword
+        :param after: (tdate, tid) of the last tweet on the previous page or None
+        :param curs (optional): cursor to run it on (default: the session's)
         """
-        for row in self.tweetCurs.fetchall():
-            tweet = Tweet(self.session, data=row)
-            valid_tweet = True
-            if len(self.keywords) > 0:
-                valid_tweet = self.validate_tweet(tweet)
+        snapshot = self.session.get_snapshot()
+        if snapshot is not None and self.search:
+            return snapshot.match_tweet(self.keywords, after)
+        elif snapshot is not None:
+            return snapshot.follows_tweets(self.user, after)
+
+        curs = self.tweetCurs if curs is None else curs
+        if self.search and self.session.use_search_index():
+            match_indexed(curs, self.keywords, after)
+        elif self.search:
+            match_tweet(curs, self.keywords, after)
+        elif self.session.use_timeline():
+            timeline_tweets(curs, self.user, after)
+        else:
+            follows_tweets(curs, self.user, after)
+        return curs
 
-            if valid_tweet:
-                self.all_tweets.append(tweet)
+    def fetch_tweets(self, after, curs=None):
+        """Fetches and hydrates the tweets of the page after a page boundary
+        Returns the tweets, True if more tweets follow and the boundary after
+        the page
+
+        :param after: (tdate, tid) of the last tweet on the previous page or None
+        :param curs (optional): cursor to query with (default: the session's)
+        """
+        tweets = []
+        more = True
+
+        # Search results are filtered after hydration, so a page
+        # may need several round trips to fill up
+        while more and len(tweets) < PAGE_SIZE:
+            rows, more = fetch_page(self.execute(after, curs), PAGE_SIZE - len(tweets), tweet_key)
+            if len(rows) == 0:
+                break
+            after = tweet_key(rows[-1])
+            tweets.extend(self.filter_results(hydrate_tweets(self.session, rows, curs)))
+        return tweets, more, after
+
+    def load_page(self, number):
+        """Fetches and hydrates a single page of tweets, unless it was
+        prefetched while the previous page was shown
+        Only PAGE_WINDOW pages are kept in memory
+        Returns the tweets and True if more tweets follow
+
+        :param number: page number starting from 0
+        """
+        if number in self.pages:
+            return self.pages[number]
+
+        if self.related_rows is not None:
+            start = number * PAGE_SIZE
+            rows = self.related_rows[start:start + PAGE_SIZE]
+            self.pages[number] = (hydrate_tweets(self.session, rows),
+                len(self.related_rows) > start + PAGE_SIZE)
+            return self.pages[number]
+
+        page = None
+        if number > 0:
+            page = self.session.prefetched(self, number)
+        if page is None:
+            page = self.fetch_tweets(self.page_keys[number])
+        tweets, more, after = page
+
+        if more and len(self.page_keys) == number + 1:
+            self.page_keys.append(after)
+
+        self.pages[number] = (tweets, more)
+        while len(self.pages) > PAGE_WINDOW:
+            del self.pages[max(self.pages, key=lambda page: abs(page - number))]
+        return self.pages[number]
+
+    def filter_results(self, tweets):
+        """Remove tweets that do not match a keyword
+        Results from the search index are only candidates, so they are
+        filtered as well
+
+        :param tweets: list of Tweet objects
+        """
+        if len(self.keywords) == 0:
+            return tweets
+        return [tweet for tweet in tweets if self.validate_tweet(tweet)]
 
     def validate_tweet(self, tweet):
         """Returns true if a keyword is not a hashtag and the tweet does not mention it
@@ -489,11 +652,22 @@ class TweetSearch:
 
     def more_results(self):
         """Gets the next 5 tweets from users who are being followed"""
-        assert(self.tweetCurs is not None), 'Unable to select more tweets'
+        assert(self.tweetCurs is not None or self.session.read_only()), 'Unable to select more tweets'
+
+        self.page += 1
+        self.tweets, self.more_exist = self.load_page(self.page)
+        if self.more_exist:
+            self.prefetch(self.page + 1)
+
+    def prefetch(self, number):
+        """Loads a page in the background while the current one is shown
 
-        self.tweets = self.all_tweets[self.tweet_index - 5:self.tweet_index]
-        self.more_exist = len(self.all_tweets) - self.tweet_index > 0
-        self.tweet_index += 5
+        :param number: page number starting from 0
+        """
+        if number in self.pages or self.related_rows is not None or number >= len(self.page_keys):
+            return
+        after = self.page_keys[number]
+        self.session.prefetch(self, number, lambda curs: self.fetch_tweets(after, curs))
   
     def display_results(self):
         """Display resulting tweets 5 at a time ordered by date"""
@@ -501,6 +675,8 @@ class TweetSearch:
         if self.search: 
             title = "SEARCH RESULTS FOR %s" % (self.get_searched().upper())
             print_string(title)
+        elif self.related is not None:
+            print_string("TWEETS RELATED TO TWEET %d" % (self.related.tid()))
         else: 
             title = "HOME"
             split_title(title, self.session.get_name().upper())
@@ -528,12 +704,15 @@ class TweetSearch:
         if len(self.tweets) == 0:
             if self.search: 
                 print_string("Sorry, there are no tweets that match that query.")
+            elif self.related is not None:
+                print_string("There are no related tweets.")
             else:
                 print_string("You are not following anyone.")
             print_border(thick=False, sign='|')
 
     def select_result(self, tweet):
-        """Prompt user to choose one of the displayed tweets
+        """Shows the statistics of a selected tweet and handles its menu
+        Returns the transition to the next screen (None to show it again)
         
         param tweet: The tweet that the user selected 
         """
@@ -541,33 +720,32 @@ class TweetSearch:
 
         if option == "Reply":
             tweet.reply()
-            self.select_result(tweet)
         elif option == "Retweet":
             tweet.retweet()         
-            self.select_result(tweet)                
+        elif option == "Related tweets":
+            related = list_related(self.session, tweet)
+            return push(self.session.results_screen(related))
         elif option == "Go back":
-            self.session.home(self, reset=False) 
+            return go_back()
         elif option == "Search for other tweets":
             new_search = search_tweets(self.session)
-            self.session.home(new_search, reset=False)
+            return push(self.session.results_screen(new_search))
         elif option == "Home":
-            self.session.home()
+            return go_home()
         elif option == "Logout":
-            self.session.logout()
-
-        self.session.home(self)
+            return self.session.logout()
             
     def choose_result(self):
-        """Returns the number of the tweet the user wants to select"""
+        """Prompts for one of the displayed tweets
+        Returns the transition to the selected tweet (None if cancelled)
+        """
         prompt = "Enter the result number to select: "
         choice = validate_num(prompt, self.session, size=len(self.tweets))
         if check_quit(choice):
-            self.session.home(self)
-        else:
-            choice -= 1
+            return None
 
-        tweet = self.tweets[choice]
-        self.select_result(tweet)
+        tweet = self.tweets[choice - 1]
+        return push(Screen(self.select_result, tweet, results=self))
 
     def results_exist(self):
         """Return true if user has tweets to display"""
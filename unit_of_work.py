@@ -0,0 +1,270 @@
+from queries import fanout_tweet, fanout_retweet, backfill_timeline, tweet_tokens, user_grams, \
+    count_tweets, count_retweets, count_mentions, count_users, count_follows, count_writers, \
+    mark_stale, mark_followers_stale, count_term_sets, insert_term_posts, get_term_users, \
+    get_list_members
+from suggestions import refresh_user, MAX_GROUP
+from trending import count_trends
+
+"""
+Collects the rows written by one user action and writes them with array DML
+(executemany) in a single transaction with a single commit
+"""
+
+# Insert statements in foreign key order. Hashtags and mentions are only
+# inserted if missing (char columns compare blank-padded, so binds are padded)
+INSERTS = [
+    ('users', "insert into users(usr,pwd,name,email,city,timezone) "
+        "values(:1,:2,:3,:4,:5,:6)"),
+    ('follows', "insert into follows(flwer,flwee,start_date) values(:1,:2,:3)"),
+    ('tweets', "insert into tweets(tid,writer,tdate,text,replyto) "
+        "values(:1,:2,:3,:4,:5)"),
+    ('hashtags', "insert into hashtags(term) select :1 from dual "
+        "where not exists (select * from hashtags where term = :2)"),
+    ('mentions', "insert into mentions(tid,term) select :1, :2 from dual "
+        "where not exists (select * from mentions where tid = :3 and term = :4)"),
+    ('retweets', "insert into retweets(usr,tid,rdate) values(:1,:2,:3)"),
+    ('lists', "insert into lists(lname,owner) values(:1,:2)"),
+    ('includes', "insert into includes(lname,member) values(:1,:2)"),
+    ('search_terms', "insert into search_terms(token,kind,tid) values(:1,:2,:3)"),
+    ('user_grams', "insert into user_grams(gram,field,usr) values(:1,:2,:3)")
+]
+
+DELETES = [
+    ('includes', "delete from includes where lname = :1 and member = :2")
+]
+
+# Width of the char(10) hashtag term columns and char(12) list name columns
+TERM_LEN = 10
+LNAME_LEN = 12
+
+class UnitOfWork:
+
+    def __init__(self, session):
+        """Pending writes of one user action
+
+        :param session: Twitter object
+        """
+        self.session = session
+        self.conn = session.get_conn()
+        self.cache = session.get_cache()
+        self.graph = session.follow_graph(load=False)
+        self.timeline = session.use_timeline()
+        self.search_index = session.use_search_index()
+        self.user_index = session.use_user_index()
+        self.suggestions = session.use_suggestions()
+        self.trending = session.use_trending()
+        self.term_index = session.use_term_index()
+        self.inserts = dict((table, []) for table, q in INSERTS)
+        self.deletes = dict((table, []) for table, q in DELETES)
+
+    def add_user(self, data_list):
+        """Add a new user
+
+        :param data_list: list of usr, pwd, name, email, city, timezone values
+        """
+        self.inserts['users'].append(data_list)
+
+    def add_follow(self, data_list):
+        """Add a new follow relationship
+
+        :param data_list: list of flwer, flwee, start_date values
+        """
+        self.inserts['follows'].append(data_list)
+
+    def add_tweet(self, data_list):
+        """Add a new tweet
+
+        :param data_list: list of tid, writer, tdate, text, replyto values
+        """
+        self.inserts['tweets'].append(data_list)
+
+    def add_terms(self, tid, terms):
+        """Add the hashtags mentioned by a tweet
+
+        :param tid: tweet id
+        :param terms: list of hashtag terms
+        """
+        for term in terms:
+            term = term.lower()
+            padded = term.ljust(TERM_LEN)
+            if [term, padded] not in self.inserts['hashtags']:
+                self.inserts['hashtags'].append([term, padded])
+            if [tid, term, tid, padded] not in self.inserts['mentions']:
+                self.inserts['mentions'].append([tid, term, tid, padded])
+
+    def add_retweet(self, data_list):
+        """Add a new retweet
+
+        :param data_list: list of usr, tid, rdate values
+        """
+        self.inserts['retweets'].append(data_list)
+
+    def add_list(self, data_list):
+        """Add a new list
+
+        :param data_list: list of lname, owner values
+        """
+        self.inserts['lists'].append(data_list)
+
+    def add_include(self, data_list):
+        """Add a member to a list
+
+        :param data_list: list of lname, member values
+        """
+        self.inserts['includes'].append(data_list)
+
+    def remove_include(self, data_list):
+        """Remove a member from a list
+
+        :param data_list: list of lname, member values
+        """
+        lname, member = data_list
+        self.deletes['includes'].append([lname.strip().ljust(LNAME_LEN), member])
+
+    def index_tweets(self):
+        """Queue the search_terms rows of the new tweets"""
+        terms = {}
+        for row in self.inserts['mentions']:
+            terms.setdefault(row[0], []).append(row[1])
+
+        for tweet in self.inserts['tweets']:
+            tokens = tweet_tokens(tweet[0], tweet[3], terms.get(tweet[0], []))
+            self.inserts['search_terms'].extend(tokens)
+
+    def index_users(self):
+        """Queue the user_grams rows of the new users"""
+        for usr, pwd, name, email, city, timezone in self.inserts['users']:
+            self.inserts['user_grams'].extend(user_grams(usr, name, city))
+
+    def count(self, curs):
+        """Update the tweet_stats and user_stats counters for the new rows
+
+        :param curs: cursor object
+        """
+        users = [row[0] for row in self.inserts['users']]
+        if len(users) > 0:
+            count_users(curs, users)
+
+        follows = self.inserts['follows']
+        if len(follows) > 0:
+            count_follows(curs, follows)
+
+        tweets = self.inserts['tweets']
+        if len(tweets) > 0:
+            count_tweets(curs, tweets)
+            count_writers(curs, [tweet[1] for tweet in tweets])
+
+        # The term_sets index replaces the similar tweet counters
+        mentioned = set(row[0] for row in self.inserts['mentions'])
+        tagged = [tweet[0] for tweet in tweets if tweet[0] in mentioned]
+        if len(tagged) > 0 and not self.term_index:
+            count_mentions(curs, tagged)
+
+        retweets = [row[1] for row in self.inserts['retweets']]
+        if len(retweets) > 0:
+            count_retweets(curs, retweets)
+
+    def index_terms(self, curs):
+        """Count the term sets and post the terms of the new tweets
+
+        :param curs: cursor object
+        """
+        dates = dict((row[0], row[2]) for row in self.inserts['tweets'])
+        terms = {}
+        for row in self.inserts['mentions']:
+            if row[0] in dates:
+                terms.setdefault(row[0], []).append(row[1])
+
+        count_term_sets(curs, list(terms.values()))
+        insert_term_posts(curs, [[term, dates[tid], tid] for tid in sorted(terms)
+            for term in terms[tid]])
+
+    def queue_suggestions(self, curs):
+        """Queue the users whose suggestions the new rows change: the users
+        of the new tweets' hashtags and the members of the changed lists,
+        whose shared hashtag and list counts changed, and the followers of
+        new followers, whose friends-of-friends changed
+
+        :param curs: cursor object
+        """
+        tids = set(row[0] for row in self.inserts['tweets'])
+        terms = set(row[3] for row in self.inserts['mentions'] if row[0] in tids)
+        users = [writer for writer, term in get_term_users(curs, sorted(terms), MAX_GROUP)]
+
+        changed = self.inserts['includes'] + self.deletes['includes']
+        lnames = set(lname.strip().ljust(LNAME_LEN) for lname, member in changed)
+        users.extend(member for lname, member in get_list_members(curs, sorted(lnames), MAX_GROUP))
+        users.extend(member for lname, member in changed)
+        mark_stale(curs, users)
+
+        for flwer, flwee, start_date in self.inserts['follows']:
+            mark_followers_stale(curs, flwer)
+
+    def write(self, curs):
+        """Run every pending statement on a cursor without committing
+
+        :param curs: cursor object
+        """
+        if self.search_index:
+            self.index_tweets()
+        if self.user_index:
+            self.index_users()
+
+        for table, q in INSERTS:
+            if len(self.inserts[table]) > 0:
+                curs.executemany(q, self.inserts[table])
+
+        self.count(curs)
+
+        for table, q in DELETES:
+            if len(self.deletes[table]) > 0:
+                curs.executemany(q, self.deletes[table])
+
+        if self.timeline:
+            for tid, writer, tdate, text, replyto in self.inserts['tweets']:
+                fanout_tweet(curs, tid, writer, tdate)
+            for usr, tid, rdate in self.inserts['retweets']:
+                fanout_retweet(curs, usr, tid)
+            for flwer, flwee, start_date in self.inserts['follows']:
+                backfill_timeline(curs, flwer, flwee)
+
+        if self.suggestions:
+            self.queue_suggestions(curs)
+
+        if self.term_index:
+            self.index_terms(curs)
+
+        if self.trending:
+            dates = dict((row[0], row[2]) for row in self.inserts['tweets'])
+            count_trends(curs, [(dates[row[0]], row[1]) for row in self.inserts['mentions']
+                if row[0] in dates])
+
+    def commit(self):
+        """Write all pending rows in one transaction"""
+        curs = self.conn.cursor()
+        try:
+            self.write(curs)
+        except:
+            self.conn.rollback()
+            raise
+        finally:
+            curs.close()
+        self.conn.commit()
+        self.invalidate()
+
+        # A user who follows someone sees their new suggestions right away
+        if self.suggestions:
+            for flwer in set(row[0] for row in self.inserts['follows']):
+                refresh_user(self.conn, flwer)
+
+    def invalidate(self):
+        """Drop the written users and tweets from the session's entity cache
+        and add the written follows to the follow graph
+        """
+        for row in self.inserts['users']:
+            self.cache.invalidate_user(row[0])
+        for row in self.inserts['tweets'] + self.inserts['mentions']:
+            self.cache.invalidate_tweet(row[0])
+        if self.graph is not None:
+            for flwer, flwee, start_date in self.inserts['follows']:
+                self.graph.add_follow(flwer, flwee)
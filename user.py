@@ -1,13 +1,23 @@
 from queries import *
 from utils import *
-from tweet import Tweet
+from tweet import hydrate_tweets, tweet_key
+from unit_of_work import UnitOfWork
+from analyzer import split_text
+from suggestions import user_suggestions
+from navigation import Screen, push, go_back, go_home
+
+# Number of recent tweets shown per page of user statistics
+TWEETS_PER_PAGE = 3
+
+# Typos tolerated when an indexed user search finds nothing (0 to disable)
+FUZZY_EDITS = 1
 
 def search_users(session):
     """Matches users/cities to keywords
 
     :param session: Twitter object 
     """
-    search_input = validate_str("Enter keyword for user search: ", session, session.home, null=False)
+    search_input = validate_str("Enter keyword for user search: ", session, session.quit_to_home, null=False)
     s_users = UserSearch(session, keywords=search_input)
     s_users.get_results()
     return s_users
@@ -23,6 +33,44 @@ def list_followers(session):
     return f_users
 
 
+def list_mutual_followers(session, user):
+    """Gets the followers the logged in user has in common with another user
+
+    :param session: Twitter object
+    :param user: User object
+    """
+    m_users = UserSearch(session, other=user)
+    m_users.get_follows()
+    return m_users
+
+
+def list_suggestions(session):
+    """Gets the accounts suggested to the logged in user
+
+    :param session: Twitter object
+    """
+    s_users = UserSearch(session, suggest=True)
+    s_users.get_follows()
+    return s_users
+
+
+def suggestion_reason(friends, tags, lists):
+    """Returns why an account is suggested, e.g. 'Followed by 2 you follow'
+
+    :param friends: number of followed users that follow the account
+    :param tags: number of hashtags both have used
+    :param lists: number of lists both are members of
+    """
+    reasons = []
+    if friends > 0:
+        reasons.append("Followed by %d you follow" % (friends))
+    if tags > 0:
+        reasons.append("%d shared hashtag%s" % (tags, "s" if tags > 1 else ""))
+    if lists > 0:
+        reasons.append("%d shared list%s" % (lists, "s" if lists > 1 else ""))
+    return ", ".join(reasons)
+
+
 class User:
 
     def __init__(self, session, data):
@@ -49,15 +97,18 @@ class User:
         self.followers = None 
         self.num_tweets = None 
 
-        self.index = 3
-        self.all_tweets = [] 
-        self.tweets = []
+        # Tweets are only loaded when the statistics are shown
+        self.tweets = None
+        self.after = None
         self.more_exist = False
-        self.get_tweets()
 
     def user_menu(self):
         """Displays menu for user selection"""
         choices = ["Follow", "Go back", "Home", "Logout"]
+        if self.session.read_only():
+            choices.remove("Follow")
+        if self.id != self.logged_user:
+            choices.insert(1, "Mutual followers")
         if self.search: 
             choices.insert(1, "Do another search")
         if self.more_exist: 
@@ -69,26 +120,28 @@ class User:
         return choices
 
     def get_stats(self):
-        """Gets the stats from uStats view"""
-        rows = get_user_stats(self.curs, self.id)
-        self.following = rows[0][1]
-        self.followers = rows[0][2]
-        self.num_tweets = rows[0][3]
+        """Gets the stats from the user_stats table (or the snapshot)"""
+        if self.session.get_snapshot() is not None:
+            self.following, self.followers, self.num_tweets = self.session.get_snapshot().user_stats(self.id)
+        else:
+            self.following, self.followers, self.num_tweets = get_user_stats(self.curs, self.id)
 
     def get_tweets(self):
-        """Get the user's tweets"""
-        get_user_tweets(self.curs, self.id)
-        for row in self.curs.fetchall():
-            tweet = Tweet(self.session, row)
-            self.all_tweets.append(tweet)
-
-        self.more_tweets()
+        """Get the user's first page of tweets the first time it is needed"""
+        if self.tweets is None:
+            self.more_tweets()
 
     def more_tweets(self): 
         """Get the next 3 tweets for user"""
-        self.tweets = self.all_tweets[self.index - 3:self.index]
-        self.more_exist = len(self.all_tweets) - self.index > 0
-        self.index += 3
+        if self.session.get_snapshot() is not None:
+            curs = self.session.get_snapshot().user_tweets(self.id, self.after)
+        else:
+            curs = self.curs
+            get_user_tweets(curs, self.id, self.after)
+        rows, self.more_exist = fetch_page(curs, TWEETS_PER_PAGE, tweet_key)
+        self.tweets = hydrate_tweets(self.session, rows)
+        if len(rows) > 0:
+            self.after = tweet_key(rows[-1])
 
     def display(self, index=None, result="Result"):
         """Display user name and city
@@ -96,6 +149,14 @@ class User:
         :param index: number for user selection
         :param result: row title
         """
+        lines = self.session.get_cache().get_card(('user', self.id), (index, result),
+            lambda: self.card(index, result))
+
+        for line in lines:
+            print_string(line)
+
+    def card(self, index, result):
+        """Returns the formatted lines displaying the user"""
         if index is not None:
             user_index = "%s %d" % (result, index + 1)
         else:
@@ -111,38 +172,38 @@ class User:
         line1_1 = "{:{width}}".format(user_index, width=col1_width)
         line1_2 = "  {:{width}}".format(user_str, width=col2_width)
         line2_2 = "  {:{width}}".format(city_str, width=col2_width)
-        line3_2 = "  {:{width}}".format(self.email, width=col2_width)
 
-        print_string(line1_1 + line1_2)
-        print_string(blank + line2_2)
+        return [line1_1 + line1_2, blank + line2_2]
 
     def display_stats(self):
         """Display user statistics"""
         self.get_stats()
-        print_newline()
-        print_border(thick=True)
-        print_string("User Statistics".upper())
-        print_border(thick=True, sign='|')
-
-        print_string("Username: @%d" % (self.id))
-        print_string("Name: %s" % (self.name))
-        print_string("City: %s UTC (%s)" % (self.city, self.tz_str))
-        print_string("Email: %s" % (self.email))
-        print_string("Following: %d" % (self.following))
-        print_string("Followers: %d" % (self.followers))
-        print_string("Number of tweets: %d" % (self.num_tweets))
+        self.get_tweets()
+        with screen():
+            print_newline()
+            print_border(thick=True)
+            print_string("User Statistics".upper())
+            print_border(thick=True, sign='|')
+
+            print_string("Username: @%d" % (self.id))
+            print_string("Name: %s" % (self.name))
+            print_string("City: %s UTC (%s)" % (self.city, self.tz_str))
+            print_string("Email: %s" % (self.email))
+            print_string("Following: %d" % (self.following))
+            print_string("Followers: %d" % (self.followers))
+            print_string("Number of tweets: %d" % (self.num_tweets))
  
-        print_newline(no_border=False)
-        print_string("RECENT TWEETS")
+            print_newline(no_border=False)
+            print_string("RECENT TWEETS")
 
-        if len(self.tweets) == 0:
-            print_string("%s does not have any tweets yet." % (self.name))
-        else:
-            for tweet in self.tweets:
-                self.display_tweet(tweet) 
+            if len(self.tweets) == 0:
+                print_string("%s does not have any tweets yet." % (self.name))
+            else:
+                for tweet in self.tweets:
+                    self.display_tweet(tweet) 
 
-        choices = self.user_menu()
-        choice = validate_num(SELECT, self.session, self.session.home, size=len(choices))
+            choices = self.user_menu()
+        choice = validate_num(SELECT, self.session, self.session.quit_to_home, size=len(choices))
         return choices[choice-1]
 
     def display_tweet(self, tweet):
@@ -154,7 +215,7 @@ class User:
         reply = tweet.replyer()
         if reply is not None:
             text = "@%d %s" % (reply, text)
-        text1, text2 = tweet.split_text(text, max_width=77)
+        text1, text2 = split_text(text, max_width=77)
         
         print_border(thick=False, sign='|')
         print_string(text1)
@@ -164,12 +225,16 @@ class User:
 
     def follow(self):
         """Follow this user"""
+        # A single pair is checked in the database, which also sees the
+        # follows of other clients that the follow graph does not
         if not follows_exists(self.curs, self.logged_user, self.id):
             prompt = "Are you sure you want to follow %s? y/n: " % (self.name)
             confirm = validate_yn(prompt, self.session)
 
             if confirm in ['y', 'yes']:
-                insert_follow(self.conn, [self.logged_user, self.id, TODAY])
+                work = UnitOfWork(self.session)
+                work.add_follow([self.logged_user, self.id, TODAY])
+                work.commit()
                 print("You are now following %s." % (self.name))
                 press_enter(self.session)
         else:
@@ -179,11 +244,13 @@ class User:
 
 class UserSearch:
 
-    def __init__(self, session, keywords=''):
+    def __init__(self, session, keywords='', other=None, suggest=False):
         """Used for returning search results or listing user's followers
 
         :param session: Twitter object
         :param keywords: keywords for user search
+        :param other (optional): User object to list the followers in common with
+        :param suggest (optional): if True, list the accounts suggested to the user
         """
         self.session = session
         self.conn = session.get_conn()
@@ -191,15 +258,26 @@ class UserSearch:
         self.user = session.get_username()
         self.all_results = []
         self.all_users = []
+        self.result_ids = None
+        self.match_columns = []
+        self.after = None
         self.users = []
         self.index = 5
         self.more_exist = False
         self.searched = keywords
         self.keywords = keywords.lower() 
+        self.other = other
+        self.reasons = {}
 
         if len(self.keywords) > 0: 
             self.category = "UserSearch"
             self.search = True
+        elif other is not None:
+            self.category = "Mutual"
+            self.search = False
+        elif suggest:
+            self.category = "Suggestions"
+            self.search = False
         else:
             self.category = "Follows"
             self.search = False
@@ -209,7 +287,7 @@ class UserSearch:
         return self.search
 
     def get_category(self):
-        """Return either UserSearch or Follows"""
+        """Return either UserSearch, Follows, Mutual or Suggestions"""
         return self.category 
 
     def get_searched(self):
@@ -222,8 +300,12 @@ class UserSearch:
 
     def reset(self):
         """Reset the users to the first 5 users"""
+        self.session.cancel_prefetch(self)
         self.all_results = []
         self.all_users = []
+        self.result_ids = None
+        self.match_columns = []
+        self.after = None
         self.users = []
         self.more_exist = False
         self.index = 5
@@ -232,46 +314,134 @@ class UserSearch:
             self.get_results()
         else:
             self.get_follows()
+        return self
+
+    def release(self):
+        """Drop the loaded users once no screen shows them"""
+        self.session.cancel_prefetch(self)
+        self.all_results = []
+        self.all_users = []
+        self.result_ids = None
+        self.match_columns = []
+        self.after = None
+        self.users = []
+        self.more_exist = False
+        self.reasons = {}
 
     def get_follows(self):
-        """Get the rows from the follows table"""
-        get_followers(self.curs, self.user)
-        for row in self.curs.fetchall():
-            self.all_results.append(row)
+        """Get the user's followers (or the followers in common with another
+        user) from the follow graph, newest first, or the suggested accounts
+        """
+        graph = self.session.follow_graph()
+        if self.category == "Suggestions":
+            rows = user_suggestions(self.session)
+            self.result_ids = [row[0] for row in rows]
+            self.reasons = dict((row[0], row[2:]) for row in rows)
+        elif self.other is None:
+            self.result_ids = graph.followers(self.user)
+        else:
+            self.result_ids = graph.mutual_followers(self.user, self.other.id)
 
-        self.add_results()
         self.more_results()
 
     def get_results(self):
         """Get search results of user search"""
-        match_name(self.curs, self.keywords)
-        for row in self.curs.fetchall():
-            self.all_results.append(row)
-
-        match_city(self.curs, self.keywords)
-        for row in self.curs.fetchall():
-            self.all_results.append(row)
+        if self.session.get_snapshot() is not None:
+            self.all_results = self.session.get_snapshot().match_users(self.keywords)
+        else:
+            # Name matches come before city matches, a page at a time
+            self.match_columns = ['name', 'city']
+            self.after = None
 
-        self.add_results()
         self.more_results()
 
+    def fetch_matches(self):
+        """Fetches the matching rows of the search until the shown page is 
+        full and one more row tells whether more follow. Each fetch starts 
+        after the last row fetched (keyset pagination on the length of the 
+        matched column and the user id). With the user_grams index, typos are
+        allowed if nothing matches exactly
+        """
+        indexed = self.session.use_user_index()
+        while len(self.match_columns) > 0 and len(self.all_results) <= self.index:
+            column = self.match_columns[0]
+            if column == 'name' and indexed:
+                match_name_indexed(self.curs, self.keywords, self.after)
+            elif column == 'name':
+                match_name(self.curs, self.keywords, self.after)
+            elif indexed:
+                match_city_indexed(self.curs, self.keywords, self.after)
+            else:
+                match_city(self.curs, self.keywords, self.after)
+
+            wanted = self.index + 1 - len(self.all_results)
+            rows = self.curs.fetchmany(wanted)
+            self.all_results.extend(rows)
+            if len(rows) < wanted:
+                self.match_columns.pop(0)
+                self.after = None
+            else:
+                value = rows[-1][2] if column == 'name' else rows[-1][4]
+                self.after = (len(value.strip()), rows[-1][0])
+
+        if indexed and len(self.match_columns) == 0 and len(self.all_results) == 0 \
+                and FUZZY_EDITS > 0:
+            self.all_results = match_users_fuzzy(self.curs, self.keywords, FUZZY_EDITS)
+
     def add_results(self):
-        """Create User objects"""
-        for row in self.all_results:
-            user = User(self.session, row)
+        """Create User objects for the rows that are shown
+        Rows of users listed from the follow graph are fetched a page at a
+        time, the next page in the background (see prefetch), and so are
+        the rows of searches (see fetch_matches)
+        """
+        if self.result_ids is not None and len(self.all_results) < self.index:
+            start = len(self.all_results)
+            ids = self.result_ids[start:self.index]
+            rows = None
+            if start > 0:
+                rows = self.session.prefetched(self, start)
+            if rows is None and self.session.get_snapshot() is not None:
+                rows = self.session.get_snapshot().get_users(ids)
+            elif rows is None:
+                rows = get_users(self.curs, ids)
+            self.all_results.extend(rows[usr] for usr in ids)
+        elif len(self.match_columns) > 0:
+            self.fetch_matches()
+
+        while len(self.all_users) < min(self.index, len(self.all_results)):
+            user = User(self.session, self.all_results[len(self.all_users)])
             self.all_users.append(user) 
 
+    def result_count(self):
+        """Return the total number of results"""
+        if self.result_ids is not None:
+            return len(self.result_ids)
+        return len(self.all_results)
+
     def more_results(self):
         """Get the next 5 users"""
+        self.add_results()
         self.users = self.all_users[self.index - 5:self.index]
-        self.more_exist = len(self.all_results) - self.index > 0
+        self.more_exist = self.result_count() - self.index > 0
         self.index += 5 
+        self.prefetch()
+
+    def prefetch(self):
+        """Fetches the rows of the next page of listed users in the background"""
+        if self.more_exist and self.result_ids is not None:
+            start = len(self.all_results)
+            ids = self.result_ids[start:self.index]
+            self.session.prefetch(self, start, lambda curs: get_users(curs, ids))
 
     def display_results(self):
         """Display users"""
         print_border(thick=True)
         if self.search: 
             title = "SEARCH RESULTS FOR %s" % (self.get_searched().upper())
+        elif self.other is not None:
+            title = "FOLLOWERS YOU SHARE WITH %s" % (self.other.name.upper())
+        elif self.category == "Suggestions":
+            title = "WHO TO FOLLOW"
         else:
             title = "YOUR FOLLOWERS"
         print_string(title)
@@ -284,6 +454,8 @@ class UserSearch:
 
         for i, user in enumerate(self.users):
             user.display(index=i, result=result)
+            if user.id in self.reasons:
+                print_string(" " * 5 + suggestion_reason(*self.reasons[user.id]))
             if i == len(self.users) - 1:
                 print_border(thick=False, sign='+')
             else:
@@ -292,12 +464,17 @@ class UserSearch:
         if len(self.users) == 0:
             if self.search: 
                 print_string("Sorry, there are no users that match that query.")
+            elif self.other is not None:
+                print_string("You have no followers in common.")
+            elif self.category == "Suggestions":
+                print_string("No suggestions yet. Follow some users to get suggestions.")
             else:
                 print_string("You have no followers.")
             print_border(thick=False)
 
     def select_result(self, user):
-        """Get options for user functionality
+        """Shows the statistics of a selected user and handles its menu
+        Returns the transition to the next screen (None to show it again)
  
         :param user: The user that was selected
         """
@@ -305,33 +482,32 @@ class UserSearch:
     
         if option == "Follow": 
             user.follow()
-            self.select_result(user)
         elif option == "See more tweets": 
             user.more_tweets()
-            self.select_result(user)
+        elif option == "Mutual followers":
+            mutual = list_mutual_followers(self.session, user)
+            return push(self.session.results_screen(mutual))
         elif option == "Go back": 
-            self.session.home(self, reset=False)
+            return go_back()
         elif option == "Do another search": 
             new_search = search_users(self.session)
-            self.session.home(new_search, reset=False)
+            return push(self.session.results_screen(new_search))
         elif option == "Home": 
-            self.session.home()
+            return go_home()
         elif option == "Logout": 
-            self.session.logout()
-
-        self.session.home(self)
+            return self.session.logout()
 
     def choose_result(self):
-        """Get input for user selection"""
+        """Prompts for one of the displayed users
+        Returns the transition to the selected user (None if cancelled)
+        """
         prompt = "Enter the result number to select: "
         choice = validate_num(prompt, self.session, size=len(self.users))
         if check_quit(choice):
-            self.session.home(self)
-        else:
-            choice -= 1
+            return None
  
-        user = self.users[choice]
-        self.select_result(user)
+        user = self.users[choice - 1]
+        return push(Screen(self.select_result, user, results=self))
 
     def results_exist(self):
         """Return True if user results exist"""
@@ -0,0 +1,56 @@
+import sys
+
+from queries import *
+from backends import split_args, open_database
+from migrations import apply_migration
+
+"""
+Maintenance command for the optional user search index
+
+Usage:
+python user_index.py rebuild   creates and fills the user_grams table
+"""
+
+# Number of users indexed per insert batch
+BATCH_SIZE = 1000
+
+def rebuild_user_index(conn):
+    """Creates the user_grams table if needed and refills it from the
+    users table
+
+    :param conn: connection (not cursor object)
+    """
+    apply_migration(conn, 'user_grams')
+    curs = conn.cursor()
+    curs.execute("delete from user_grams")
+    conn.commit()
+
+    curs.execute("select usr, name, city from users")
+    while True:
+        rows = curs.fetchmany(BATCH_SIZE)
+        if len(rows) == 0:
+            break
+
+        grams = []
+        for usr, name, city in rows:
+            grams.extend(user_grams(usr, name, city))
+        insert_user_grams(conn, grams)
+    curs.close()
+
+def main():
+    args, sqlite_path = split_args(sys.argv[1:])
+    if len(args) != 1 or args[0] != 'rebuild':
+        print("Usage: python user_index.py rebuild [--sqlite PATH]")
+        sys.exit(1)
+
+    conn = open_database(sqlite_path)
+
+    if conn is None:
+        sys.exit(1)
+
+    rebuild_user_index(conn)
+    print("User index rebuilt.")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,106 @@
+import sys
+from contextlib import contextmanager
 from datetime import datetime
 
 BORDER_LEN = 80
 SELECT = "Enter your selection: "
 TODAY = datetime.today()
 
+class TrackedOutput:
+
+    def __init__(self, stream):
+        """Wraps an output stream to record whether anything was written to
+        it other than the frames
+
+        :param stream: stream written to (sys.stdout)
+        """
+        self.stream = stream
+        self.written = False
+
+    def write(self, text):
+        self.written = True
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Frame:
+
+    def __init__(self):
+        """Collects the lines of a screen so that it is written to the
+        terminal at once instead of one print per line
+        """
+        self.lines = None
+        self.depth = 0
+        self.last = None
+        self.out = None
+
+    def begin(self):
+        """Start composing a screen (screens may be nested)"""
+        if self.depth == 0:
+            self.lines = []
+        self.depth += 1
+
+    def end(self):
+        """Write the composed screen with a single write and flush
+        A screen identical to the last one written is skipped if nothing 
+        was printed or typed since
+        """
+        self.depth -= 1
+        if self.depth > 0:
+            return
+
+        text = ''.join(line + '\n' for line in self.lines)
+        self.lines = None
+        if text == self.last and sys.stdout is self.out and not self.out.written:
+            return
+
+        # Prints outside of the frames go through the tracked stdout
+        if not isinstance(sys.stdout, TrackedOutput):
+            sys.stdout = TrackedOutput(sys.stdout)
+        self.out = sys.stdout
+        self.out.stream.write(text)
+        self.out.stream.flush()
+        self.out.written = False
+        self.last = text
+
+    def write(self, line):
+        """Add a line to the screen being composed, or print it right away"""
+        if self.lines is None:
+            print(line)
+        else:
+            self.lines.append(line)
+
+    def touch(self):
+        """Record that the terminal changed outside of a frame"""
+        self.last = None
+
+FRAME = Frame()
+
+@contextmanager
+def screen():
+    """Buffers every print_* call made inside the with block into one write"""
+    FRAME.begin()
+    try:
+        yield
+    finally:
+        FRAME.end()
+
+def read_input(prompt):
+    """input() that stops the next screen from being skipped, since the
+    prompt and the typed answer are written outside of the frames
+    """
+    FRAME.touch()
+    return input(prompt)
+
 # Util methods
 def print_border(length=BORDER_LEN, thick=False, sign='+'):
     """Prints border with different length"""
     if thick:
-        print(sign + '=' * length + sign)
+        FRAME.write(sign + '=' * length + sign)
     else:
-        print(sign + '-' * length + sign)
+        FRAME.write(sign + '-' * length + sign)
 
 def print_newline(length=BORDER_LEN, no_border=True):
     """Prints a blank space with borders"""
@@ -26,7 +116,7 @@ def format_string(string, no_border=False, length=BORDER_LEN):
 
 def print_string(string, no_border=False, length=BORDER_LEN):
     """Prints a string with border lines"""
-    print(format_string(string, no_border, length))
+    FRAME.write(format_string(string, no_border, length))
 
 def split_title(title, string):
     """Prints a title and another string justified to the right"""
@@ -128,7 +218,7 @@ def press_enter(session, prompt="Press Enter to continue."):
     :param: string message
     """
     try:
-        input(prompt)
+        read_input(prompt)
     except KeyboardInterrupt:
         session.exit()
 
@@ -148,7 +238,7 @@ def validate_str(prompt, session, menu_func=None, length=None, null=True):
 
     while not valid:
         try:
-            usr_input = input(prompt)
+            usr_input = read_input(prompt)
         except KeyboardInterrupt:
             session.exit() 
         if check_quit(usr_input):
@@ -193,7 +283,7 @@ def validate_num(prompt, session, menu_func=None, size=None, num_type='int', rng
 
     while not valid:
         try:
-            choice = input(prompt)
+            choice = read_input(prompt)
 
             if check_quit(choice):
                 return exit_input(choice, menu_func) 
@@ -234,7 +324,7 @@ def validate_yn(prompt, session):
     
     while not valid:
         try:
-            choice = input(prompt)
+            choice = read_input(prompt)
         except KeyboardInterrupt:
             session.exit()
         if choice.lower() not in ['y', 'n', 'yes', 'no']: